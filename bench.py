@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import contextlib
+import glob
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+
+import orjson
+
+from pitwall import PitWallClient
+from pitwall.adapters import CaptureAdapter
+from pitwall.adapters.abstract import PitWallAdapter, Update
+from pitwall.capture import read_capture
+from pitwall.util import TimingTower, subscribe_all
+from replay import RealtimeReplayAdapter
+
+class ListAdapter(PitWallAdapter):
+    def __init__(self, updates: List[Update]):
+        super().__init__()
+        self.updates = updates
+
+    async def run(self) -> None:
+        for update in self.updates:
+            await self._message(update)
+
+def load(filename: str) -> List[Update]:
+    """Reads a capture afresh, so that every run starts with undecoded payloads"""
+
+    return list(read_capture(filename))
+
+def best(repeat: int, run: Callable[[], float]) -> float:
+    """Runs a measurement several times and keeps the fastest, which is the one least disturbed by everything else"""
+
+    return min(run() for _ in range(repeat))
+
+def bench_parse_line(files: List[str], repeat: int) -> Dict[str, float]:
+    lines = list()
+    for filename in files:
+        with open(filename, "rb") as f:
+            lines.extend(line for line in f.read().split(b"\n") if len(line.strip()) > 0)
+    parse_line = CaptureAdapter("-").parse_line
+
+    def run():
+        start = time.perf_counter()
+        for line in lines:
+            # payloads are decoded lazily, so reading one is what includes the JSON decoding
+            parse_line(line).data
+        return time.perf_counter() - start
+
+    return {"parse_line.updates_per_s": len(lines) / best(repeat, run)}
+
+def bench_update(files: List[str], repeat: int) -> Dict[str, float]:
+    """Time spent in PitWallClient._update for each topic, with every event subscribed to"""
+
+    totals: Dict[str, List[float]] = defaultdict(lambda: [math.inf, 0])
+
+    for _ in range(repeat):
+        spent = defaultdict(float)
+        counts = defaultdict(int)
+        for filename in files:
+            updates = load(filename)
+            client = PitWallClient()
+            subscribe_all(client)
+
+            async def run(updates=updates, client=client, spent=spent, counts=counts):
+                clock = time.perf_counter
+                for update in updates:
+                    start = clock()
+                    await client._update(update)
+                    spent[update.src] += clock() - start
+                    counts[update.src] += 1
+
+            asyncio.run(run())
+
+        for topic, seconds in spent.items():
+            totals[topic] = [min(totals[topic][0], seconds), counts[topic]]
+
+    metrics = dict()
+    for topic, (seconds, count) in sorted(totals.items()):
+        metrics[f"update.{topic}.us_per_update"] = seconds / count * 1000000
+    all_seconds = sum(seconds for seconds, _ in totals.values())
+    metrics["update.all.updates_per_s"] = sum(count for _, count in totals.values()) / all_seconds
+    return metrics
+
+def bench_timing_tower(files: List[str], repeat: int) -> Dict[str, float]:
+    """Time spent inside TimingTower's own callbacks, separately from the client parsing that feeds them"""
+
+    def run():
+        spent = 0.0
+        for filename in files:
+            updates = load(filename)
+            client = PitWallClient()
+            tower = TimingTower(client)
+
+            def timed(callback):
+                def wrapper(payload):
+                    nonlocal spent
+                    start = time.perf_counter()
+                    callback(payload)
+                    spent += time.perf_counter() - start
+                return wrapper
+
+            for name in dir(client):
+                callbacks = getattr(client, name)
+                if name.endswith("_callbacks") and isinstance(callbacks, list):
+                    callbacks[:] = [timed(c) if getattr(c, "__self__", None) is tower else c for c in callbacks]
+            client.ingest(updates)
+        return spent
+
+    count = sum(len(load(filename)) for filename in files)
+    return {"timing_tower.us_per_update": best(repeat, run) / count * 1000000}
+
+def bench_replay(files: List[str], repeat: int) -> Dict[str, float]:
+    """Cost of scheduling each update through RealtimeReplayAdapter, over dispatching the same list directly"""
+
+    updates = [u for filename in files for u in load(filename)]
+
+    def run(wrap: bool):
+        adapter = ListAdapter(updates)
+        if wrap:
+            adapter = RealtimeReplayAdapter(adapter, math.inf)
+        adapter.on_message(lambda _: None)
+        start = time.perf_counter()
+        asyncio.run(adapter.run())
+        return time.perf_counter() - start
+
+    direct = best(repeat, lambda: run(False))
+    replayed = best(repeat, lambda: run(True))
+    return {"replay.updates_per_s": len(updates) / replayed,
+            "replay.overhead_us_per_update": max(0.0, replayed - direct) / len(updates) * 1000000}
+
+def peak_rss(filename: str) -> float:
+    """Ingests one capture into a client with every event and a TimingTower, returning the process's peak RSS in MB"""
+
+    client = PitWallClient()
+    subscribe_all(client)
+    TimingTower(client)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        client.ingest(filename)
+    # kilobytes on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def bench_memory(files: List[str]) -> Dict[str, float]:
+    # each file in a process of its own, so that one's peak doesn't hide the next
+    context = multiprocessing.get_context("spawn")
+    peaks = list()
+    for filename in files:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            peaks.append(pool.submit(peak_rss, filename).result())
+    return {"memory.peak_rss_mb": max(peaks)}
+
+def compare(baseline: Dict[str, float], current: Dict[str, float], threshold: float) -> List[str]:
+    """Prints each metric against the baseline, returning the names of any that got worse by more than `threshold`"""
+
+    regressions = list()
+    width = max(len(name) for name in current)
+    for name, value in current.items():
+        if name not in baseline:
+            print(f"{name:<{width}}  {'':>12}  {value:>12.3f}  (new)")
+            continue
+
+        old = baseline[name]
+        change = (value - old) / old if old != 0 else 0.0
+        # rates are better higher; times and sizes are better lower
+        worse = -change if name.endswith("_per_s") else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<{width}}  {old:>12.3f}  {value:>12.3f}  {change:>+8.1%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures parsing and dispatch throughput over recorded sessions")
+    parser.add_argument("files", nargs="*", help="captures to run over (default: data/*.txt)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs of each measurement, keeping the best")
+    parser.add_argument("-o", "--output", help="write the results to this file as well as stdout")
+    parser.add_argument("-c", "--compare", help="baseline results to compare against; exits with an error on any regression")
+    parser.add_argument("-t", "--threshold", type=float, default=0.1, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    files = args.files if len(args.files) > 0 else sorted(glob.glob("data/*.txt"))
+    metrics = dict()
+    # TimingTower's commentary would get mixed up with the results
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for stage in (bench_parse_line, bench_update, bench_timing_tower, bench_replay):
+            print(f"Running {stage.__name__}", file=sys.stderr)
+            metrics.update(stage(files, args.repeat))
+    print("Running bench_memory", file=sys.stderr)
+    metrics.update(bench_memory(files))
+
+    results = {"python": platform.python_version(),
+               "machine": platform.machine(),
+               "files": files,
+               "metrics": metrics}
+    output = orjson.dumps(results, option=orjson.OPT_INDENT_2)
+    if args.output is not None:
+        with open(args.output, "wb") as f:
+            f.write(output)
+
+    if args.compare is None:
+        print(output.decode("utf-8"))
+    else:
+        with open(args.compare, "rb") as f:
+            baseline = orjson.loads(f.read())
+        if baseline["files"] != files:
+            print("Warning: the baseline was measured over different files", file=sys.stderr)
+        regressions = compare(baseline["metrics"], metrics, args.threshold)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -8,13 +8,15 @@ import os
 
 from pysignalr.client import SignalRClient
 
+from pitwall.capture import COMPRESSION_EXTENSIONS, CaptureWriter, FSYNC_POLICIES
+
 logging.basicConfig(
     format="%(asctime)s %(name)s: %(message)s",
     level=logging.INFO,
 )
 
 last_update = time.time()
-out_file = None
+writer: CaptureWriter = None # ty: ignore[invalid-assignment]
 current_session_key = None
 
 class Cancel(Exception):
@@ -31,36 +33,30 @@ async def on_error(x):
 
 async def on_feed(update):
     global last_update
-    global out_file
     global current_session_key
 
     last_update = time.time()
 
     now = time.time_ns()
     source = update[0]
-    data = orjson.dumps(update[1]).decode('utf-8')
+    data = orjson.dumps(update[1])
 
     if source == "SessionInfo" and args.continuous:
         if update[1]["Key"] != current_session_key:
             current_session_key = update[1]["Key"]
             print("Switching to " + update[1]["Meeting"]["Name"] + " " + update[1]["Name"])
+            open_output(os.path.join(args.output, update[1]["Meeting"]["Name"] + " - " + update[1]["Name"]))
 
-            if out_file is not None:
-                out_file.close()
-            out_file = open(os.path.join(args.output, update[1]["Meeting"]["Name"] + " - " + update[1]["Name"] + ".txt"), "a")
-
-    write(f'{now}:{source}:{data}')
+    write(now, source, data)
 
     if source == "SessionStatus" and update[1]["Status"] == "Finalised":
         if args.continuous:
             print("Session complete")
-            out_file.close() # ty: ignore[possibly-unbound-attribute]
-            out_file = None
+            writer.end()
         else:
             raise Cancel()
 
 async def on_subscribe(snapshot):
-    global out_file
     global current_session_key
 
     now = time.time_ns()
@@ -73,12 +69,11 @@ async def on_subscribe(snapshot):
         else:
             return
 
-    if args.continuous and out_file is None:
+    if args.continuous and writer.path is None:
         current_session_key = snapshot.result["SessionInfo"]["Key"]
-        out_file = open(os.path.join(args.output, snapshot.result["SessionInfo"]["Meeting"]["Name"] + " - " + snapshot.result["SessionInfo"]["Name"] + ".txt"), "a")
+        open_output(os.path.join(args.output, snapshot.result["SessionInfo"]["Meeting"]["Name"] + " - " + snapshot.result["SessionInfo"]["Name"]))
 
-    snapshot = orjson.dumps(snapshot.result).decode('utf-8')
-    write(f"{now}:init:{snapshot}")
+    write(now, "init", orjson.dumps(snapshot.result))
 
     print("Subscribed")
 
@@ -89,12 +84,16 @@ async def timeout():
             print("5 minutes since last update, done!")
             raise Cancel()
 
-def write(line):
-    if out_file is None:
-        return
+def open_output(path: str, extension: bool = True):
+    if extension:
+        path += ".pwc" if args.format == "binary" else ".txt"
+        if args.compress is not None:
+            path += COMPRESSION_EXTENSIONS[args.compress]
+    writer.open(path)
 
-    out_file.write(line + '\n')
-    out_file.flush()
+def write(ts: int, source: str, data: bytes):
+    # only queues it; the writer's thread does the rest
+    writer.write(ts, source, data)
 
 async def main():
     timing_client = SignalRClient("wss://livetiming.formula1.com/signalrcore", connection_timeout=30)
@@ -116,10 +115,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-o", "--output", required=True)
     parser.add_argument("-c", "--continuous", action="store_true")
+    parser.add_argument("-f", "--format", choices=["text", "binary"], default="text")
+    parser.add_argument("--commit-interval", type=float, default=1.0, help="seconds between writes to disk")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="commit", help="when to wait for writes to reach the disk")
+    parser.add_argument("--max-size", type=int, help="start a new file once one reaches this many MB")
+    parser.add_argument("-z", "--compress", choices=list(COMPRESSION_EXTENSIONS), help="compress the output (zstd needs the zstd extra)")
     args = parser.parse_args()
 
+    writer = CaptureWriter(binary=args.format == "binary", commit_interval=args.commit_interval, fsync=args.fsync,
+                           max_bytes=args.max_size * 1000000 if args.max_size is not None else None, compression=args.compress)
     if not args.continuous:
-        out_file = open(args.output, "a")
+        open_output(args.output, extension=False)
 
     try:
         asyncio.run(main())
@@ -128,5 +134,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         ...
     finally:
-        if out_file is not None:
-            out_file.close()
+        writer.close()
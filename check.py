@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+import argparse
+import sys
+import time
+
+from pitwall.util import final_order, run_corpus
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parses every capture given, across all cores, and reports how each one finished")
+    parser.add_argument("captures", nargs="+")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_corpus(args.captures, final_order, args.jobs)
+
+    for result in results:
+        if result.ok:
+            print(f"{result.filename}: {result.updates} updates in {result.seconds:.2f}s, finishing order {result.result}")
+        else:
+            print(f"{result.filename}: failed after {result.updates} updates\n{result.error}")
+
+    failed = [r for r in results if not r.ok]
+    print(f"Checked {len(results)} captures in {time.perf_counter() - start:.2f}s, {len(failed)} failed")
+    sys.exit(1 if len(failed) > 0 else 0)
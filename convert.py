@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+import argparse
+import os
+import time
+
+from pitwall.capture import convert_text_capture
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=True)
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args()
+
+    if args.output is None:
+        args.output = os.path.splitext(args.input)[0] + ".pwc"
+
+    start = time.time_ns()
+    count = convert_text_capture(args.input, args.output)
+    print(f"Wrote {count} records to {args.output} in {(time.time_ns() - start) / 1000000000:.3f}s "
+          f"({os.path.getsize(args.input)} -> {os.path.getsize(args.output)} bytes)")
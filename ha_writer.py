@@ -1,11 +1,12 @@
 import asyncio
 from dataclasses import dataclass
+import logging
 import os
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 
 import homeassistant_api
 from homeassistant_api import State
-from homeassistant_api.rawclient import RawClient as HomeAssistantClient
+from homeassistant_api.rawasyncclient import RawAsyncClient as HomeAssistantClient
 
 from pitwall import PitWallClient
 from pitwall.adapters import CaptureAdapter
@@ -13,18 +14,101 @@ from pitwall.events import SessionStatus, LapSessionProgress, QualifyingSessionP
 from pitwall.events.drivers import Driver
 from pitwall.util.timing_tower import TimingLine, TimingTower
 
+logging.basicConfig(
+    format="%(asctime)s %(name)s: %(message)s",
+    level=logging.INFO,
+)
+
 @dataclass
 class SessionState:
     status: str
     lap: int
     q: int
 
-ha: HomeAssistantClient = None # ty: ignore[invalid-assignment]
+class HomeAssistantSink:
+    """
+    Pushes entity states to Home Assistant in the background, so that callbacks never wait on a request.
+
+    `set` only records the latest value of an entity. Values equal to what Home Assistant already has
+    are dropped, and a burst of changes to one entity (like the order shuffling on lap 1) is coalesced
+    so that each entity is pushed at most once per `interval` seconds, with whatever its value is by
+    then. All requests share the client's session, and so its pooled connections.
+    """
+
+    _ha: HomeAssistantClient
+    _interval: float
+    _pushed: Dict[str, Tuple[str, Dict[str, Any]]]
+    _pending: Dict[str, Tuple[str, Dict[str, Any]]]
+    _available: asyncio.Event
+
+    def __init__(self, ha: HomeAssistantClient, interval: float = 1.0):
+        self._ha = ha
+        self._interval = interval
+        self._pushed = dict()
+        self._pending = dict()
+        self._available = asyncio.Event()
+        self._log = logging.getLogger(__name__)
+
+    def set(self, entity_id: str, state: str, attributes: Dict[str, Any] | None = None) -> None:
+        value = (state, attributes if attributes is not None else dict())
+        if self._pushed.get(entity_id) == value:
+            # changed and changed back before it was sent; either way there's nothing to do
+            self._pending.pop(entity_id, None)
+            return
+
+        self._pending[entity_id] = value
+        self._available.set()
+
+    async def run(self) -> None:
+        while True:
+            while len(self._pending) == 0:
+                self._available.clear()
+                await self._available.wait()
+            await self._push()
+            await asyncio.sleep(self._interval)
+
+    async def flush(self, attempts: int = 3) -> None:
+        """Pushes anything still pending, giving up on whatever hasn't gone after `attempts` tries"""
+
+        for attempt in range(attempts):
+            if len(self._pending) == 0:
+                return
+            if attempt > 0:
+                await asyncio.sleep(self._interval)
+            await self._push()
+
+        if len(self._pending) > 0:
+            self._log.error("Gave up on pushing %s", ", ".join(self._pending.keys()))
+            self._pending.clear()
+
+    async def _push(self) -> None:
+        pending = self._pending
+        self._pending = dict()
+        try:
+            await asyncio.gather(*[self._send(entity_id, value) for entity_id, value in pending.items()])
+        except asyncio.CancelledError:
+            # put back whatever didn't get there, so that a flush() afterwards still sends it
+            for entity_id, value in pending.items():
+                if self._pushed.get(entity_id) != value:
+                    self._pending.setdefault(entity_id, value)
+            raise
+
+    async def _send(self, entity_id: str, value: Tuple[str, Dict[str, Any]]) -> None:
+        try:
+            await self._ha.async_set_state(State(entity_id=entity_id, state=value[0], attributes=value[1]))
+            self._pushed[entity_id] = value
+        except Exception as e:
+            self._log.warning("Setting %s failed (%s), retrying", entity_id, e)
+            # unless it's been superseded in the meantime
+            self._pending.setdefault(entity_id, value)
+            self._available.set()
+
+sink: HomeAssistantSink = None # ty: ignore[invalid-assignment]
 session = SessionState("", 0, 0)
 drivers: Dict[int, Driver] = dict()
 
 async def main():
-    global ha
+    global sink
     client = PitWallClient(CaptureAdapter("-"))
     client.on_driver_data(on_driver_data)
     client.on_session_status(on_session_status)
@@ -34,8 +118,15 @@ async def main():
     timing = TimingTower(client)
     timing.on_position_change(on_position_change)
 
-    with homeassistant_api.Client(os.environ["HOMEASSISTANT_URL"], os.environ["HOMEASSISTANT_TOKEN"]) as ha:
-        await client.go()
+    # an uncached session, so that every push reuses the same connection pool
+    async with homeassistant_api.Client(os.environ["HOMEASSISTANT_URL"], os.environ["HOMEASSISTANT_TOKEN"],
+                                        use_async=True, async_cache_session=False) as ha:
+        sink = HomeAssistantSink(ha, float(os.environ.get("HOMEASSISTANT_INTERVAL", "1")))
+        async with asyncio.TaskGroup() as tasks:
+            pushing = tasks.create_task(sink.run())
+            await client.go()
+            pushing.cancel()
+        await sink.flush()
 
 def on_driver_data(data: List[Driver]):
     for driver in data:
@@ -43,9 +134,9 @@ def on_driver_data(data: List[Driver]):
 
 def on_session_change(update: SessionChange):
     if update.status == "Generating":
-        ha.set_state(State(entity_id="calendar.f1", state="On"))
+        sink.set("calendar.f1", "On")
     elif update.status == "Complete":
-        ha.set_state(State(entity_id="calendar.f1", state="Off"))
+        sink.set("calendar.f1", "Off")
 
 def on_session_status(update: SessionStatus):
     session.status = update.status
@@ -62,13 +153,11 @@ def on_session_progress(update: SessionProgress):
 def on_position_change(line: TimingLine):
     if line.position == 1:
         driver = drivers[line.driver_number]
-        ha.set_state(State(entity_id="sensor.f1_leader",
-                           state=driver.broadcast_name,
-                           attributes={"number": driver.number,
-                                       "color": driver.team_color,
-                                       "team": driver.team_name}))
+        sink.set("sensor.f1_leader", driver.broadcast_name,
+                 {"number": driver.number, "color": driver.team_color, "team": driver.team_name})
 
 def update_session():
+    progress = None
     if session.lap > 0:
         progress = f"Lap {session.lap}"
     elif session.q > 0:
@@ -76,10 +165,10 @@ def update_session():
 
     status = session.status if session.status is not None else "Unknown"
 
-    ha.set_state(State(entity_id="sensor.f1_session", state=status, attributes={"progress": progress}))
+    sink.set("sensor.f1_session", status, {"progress": progress})
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        pass
\ No newline at end of file
+        pass
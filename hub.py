@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import logging
+
+from pysignalr.client import SignalRClient
+
+from pitwall.adapters import CaptureAdapter, WebsocketAdapter
+from pitwall.hub import HubServer
+from pitwall.metrics import Metrics
+from replay import RealtimeReplayAdapter
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s: %(message)s",
+    level=logging.INFO,
+)
+
+async def main():
+    if str.startswith(args.input, "ws://") or str.startswith(args.input, "wss://"):
+        adapter = WebsocketAdapter(SignalRClient(args.input))
+    else:
+        adapter = CaptureAdapter(args.input, args.start, args.save_index)
+        if args.multiplier is not None:
+            adapter = RealtimeReplayAdapter(adapter, args.multiplier)
+
+    server = HubServer(adapter, args.buffer)
+    if args.metrics_port is not None:
+        metrics = Metrics()
+        adapter.instrument(metrics)
+        metrics.watch(server)
+        await metrics.serve(args.metrics_port)
+
+    await server.serve(args.listen)
+
+if __name__ == "__main__":
+    global args
+
+    parser = argparse.ArgumentParser(description="Shares one feed with any number of local consumers, e.g. watch.py -i unix:///tmp/pitwall.sock")
+    parser.add_argument("-i", "--input", default="-", help="capture file, - for stdin, or a SignalR websocket URL")
+    parser.add_argument("-l", "--listen", default="unix:///tmp/pitwall.sock", help="unix:///path or tcp://host:port")
+    parser.add_argument("-f", "--from", dest="start", help="lap number, ISO-8601 time or session status to start from")
+    parser.add_argument("--save-index", action="store_true", help="cache the index used by --from next to the capture")
+    parser.add_argument("-x", "--multiplier", type=float, help="replay a capture in real time, at this speed")
+    parser.add_argument("-b", "--buffer", type=int, default=10000, help="updates a consumer can fall behind before it's disconnected")
+    parser.add_argument("-m", "--metrics-port", type=int, help="serve Prometheus metrics on this local port")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        ...
@@ -1,43 +1,161 @@
+#!/usr/bin/env python
+
+import argparse
 import asyncio
-import queue
-import pika
 import logging
-import orjson
 import os
-import sys
+from collections import deque
+from typing import Deque
 
-from replay import BufferedReplayAdapter
-# from pitwall.adapters import WebsocketAdapter
-# from pysignalr.client import SignalRClient
-from pika.adapters.blocking_connection import BlockingChannel
-from pika.exchange_type import ExchangeType
+import aio_pika
+from aio_pika.abc import AbstractExchange, AbstractRobustConnection
+from aio_pika.exceptions import CONNECTION_EXCEPTIONS, DeliveryError
+from pysignalr.client import SignalRClient
 
-channel: BlockingChannel
-updates: queue.Queue = queue.Queue()
+from pitwall.adapters import CaptureAdapter, HubAdapter, WebsocketAdapter
+from pitwall.adapters.abstract import Update
+from pitwall.hub import is_hub_address
 
 logging.basicConfig(
     format="%(asctime)s %(name)s: %(message)s",
     level=logging.INFO,
 )
 
-async def main():
-    global channel
+class RabbitSink:
+    """
+    Publishes updates to a RabbitMQ topic exchange, routed by topic name, without ever blocking the
+    adapter that feeds it.
+
+    Updates are queued by `publish` and sent with publisher confirms by a fixed pool of `window`
+    workers, so that up to that many can be waiting for their confirm at once. If the connection
+    drops, unconfirmed messages are kept and retried ahead of everything else once it's back (so a
+    consumer may see one twice); if more than `buffer` updates pile up meanwhile, the oldest are
+    dropped. Anything the broker refuses is logged and dropped.
+    """
+
+    _url: str
+    _exchange_name: str
+    _queue: Deque[Update]
+    _retry: Deque[Update]
+    _buffer: int
+    _window: int
+    _available: asyncio.Event
+    _sending: int
+    "Updates taken off the queues and not yet confirmed, refused or put back"
+    _connection: AbstractRobustConnection | None
+    _exchange: AbstractExchange | None
+    dropped: int
+    "Updates discarded because the buffer overflowed, the broker refused them or flush() gave up on them"
+
+    def __init__(self, url: str, exchange: str = "pitwall", window: int = 512, buffer: int = 100000):
+        self._url = url
+        self._exchange_name = exchange
+        self._queue = deque()
+        self._retry = deque()
+        self._buffer = buffer
+        self._window = window
+        self._available = asyncio.Event()
+        self._sending = 0
+        self._connection = None
+        self._exchange = None
+        self.dropped = 0
+        self._log = logging.getLogger(__name__)
+
+    def publish(self, update: Update) -> None:
+        """Queues an update to be published; suitable for passing straight to `on_message`"""
+
+        if len(self._queue) + len(self._retry) >= self._buffer:
+            if len(self._retry) > 0:
+                self._retry.popleft()
+            else:
+                self._queue.popleft()
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                self._log.warning("Publishing has fallen behind, %d updates dropped so far", self.dropped)
+
+        self._queue.append(update)
+        self._available.set()
+
+    async def run(self) -> None:
+        self._connection = await aio_pika.connect_robust(self._url)
+        async with self._connection:
+            channel = await self._connection.channel(publisher_confirms=True)
+            self._exchange = await channel.declare_exchange(self._exchange_name, aio_pika.ExchangeType.TOPIC)
 
-    rabbit = pika.BlockingConnection(pika.URLParameters(os.environ["RABBITMQ_URL"]))
-    channel = rabbit.channel()
-    channel.exchange_declare("pitwall", exchange_type=ExchangeType.topic)
+            async with asyncio.TaskGroup() as tasks:
+                for _ in range(self._window):
+                    tasks.create_task(self._work())
 
-    #adapter = WebsocketAdapter(SignalRClient("wss://livetiming.formula1.com/signalrcore"))
-    adapter = BufferedReplayAdapter(sys.argv[1])
-    adapter.on_message(lambda u: channel.basic_publish(exchange='pitwall',
-                                                       routing_key=u.src,
-                                                       body=orjson.dumps(u.data),
-                                                       properties=pika.BasicProperties(timestamp = int(u.ts / 1000000000))))
+    async def flush(self, timeout: float = 30) -> None:
+        """Waits until everything queued so far has been confirmed, giving up on the rest after `timeout` seconds"""
 
-    await adapter.run()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while len(self._queue) > 0 or len(self._retry) > 0 or self._sending > 0:
+            if asyncio.get_running_loop().time() >= deadline:
+                abandoned = len(self._queue) + len(self._retry) + self._sending
+                self._log.error("Gave up on publishing %d updates", abandoned)
+                self.dropped += abandoned
+                self._queue.clear()
+                self._retry.clear()
+                return
+            await asyncio.sleep(0.01)
+
+    async def _work(self) -> None:
+        while True:
+            # nothing is taken off the queues while the connection is down, so that it all waits in order
+            await self._connection.connected.wait()
+            while len(self._queue) == 0 and len(self._retry) == 0:
+                self._available.clear()
+                await self._available.wait()
+
+            # anything that failed goes first, so that a reconnect doesn't reorder more than it has to
+            update = self._retry.popleft() if len(self._retry) > 0 else self._queue.popleft()
+            self._sending += 1
+            try:
+                await self._send(update)
+            finally:
+                self._sending -= 1
+
+    async def _send(self, update: Update) -> None:
+        message = aio_pika.Message(update.raw, content_type="application/json", timestamp=int(update.ts / 1000000000))
+        try:
+            await self._exchange.publish(message, routing_key=update.src, mandatory=False)
+        except DeliveryError as e:
+            # nacked or returned; resending would most likely get the same answer. This has to come first,
+            # since it's an AMQPError and so counted among the connection exceptions
+            self._log.error("Broker refused %s (%s), dropping it", update.src, e)
+            self.dropped += 1
+        except CONNECTION_EXCEPTIONS as e:
+            self._log.warning("Publishing %s failed (%s), retrying once reconnected", update.src, e)
+            self._retry.append(update)
+            self._available.set()
+
+async def main():
+    sink = RabbitSink(os.environ["RABBITMQ_URL"])
+
+    if str.startswith(args.input, "ws://") or str.startswith(args.input, "wss://"):
+        adapter = WebsocketAdapter(SignalRClient(args.input))
+    elif is_hub_address(args.input):
+        adapter = HubAdapter(args.input)
+    else:
+        adapter = CaptureAdapter(args.input)
+    adapter.on_message(sink.publish)
+
+    # if the sink can't connect, the task group stops reading too
+    async with asyncio.TaskGroup() as tasks:
+        publishing = tasks.create_task(sink.run())
+        await adapter.run()
+        await sink.flush()
+        publishing.cancel()
 
 if __name__ == "__main__":
+    global args
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", default="-", help="capture file, - for stdin, a hub address or a SignalR websocket URL")
+    args = parser.parse_args()
+
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, asyncio.exceptions.CancelledError):
-        ...
\ No newline at end of file
+        ...
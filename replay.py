@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+import bisect
 import copy
+import math
 import sys
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 from anyio import run
 import asyncio
 import os
@@ -10,23 +12,33 @@ import time
 import argparse
 import logging
 
-import orjson
 from pitwall.adapters.abstract import EOS, PitWallAdapter, Update
 from pitwall.adapters.captureadapter import CaptureAdapter
+from pitwall.state import SessionState
 
 class BufferingAdapter(PitWallAdapter):
     _adapter: PitWallAdapter
     _write_lock: asyncio.Lock
     _history: List[Update]
     _queues: List[asyncio.Queue]
+    _state: SessionState
+    _keyframe_interval: int
+    _keyframes: List[List[Update]]
+    "The catch-up updates for the state at each keyframe"
+    _keyframe_positions: List[int]
+    "Number of history entries each keyframe covers, for bisecting"
 
-    def __init__(self, adapter: PitWallAdapter):
+    def __init__(self, adapter: PitWallAdapter, keyframe_interval: int = 1000):
         super().__init__()
         self._adapter = adapter
         adapter.on_message(self._on_message)
         self._write_lock = asyncio.Lock()
         self._history = list()
         self._queues = list()
+        self._state = SessionState()
+        self._keyframe_interval = keyframe_interval
+        self._keyframes = list()
+        self._keyframe_positions = list()
         self._log = logging.getLogger(__name__)
 
     async def run(self):
@@ -38,6 +50,10 @@ class BufferingAdapter(PitWallAdapter):
             for q in self._queues:
                 q.put_nowait(update)
 
+            self._state.apply(update)
+            if len(self._history) % self._keyframe_interval == 0 and self._state.can_init():
+                self._take_keyframe(update)
+
         self._last_message = update
         await self._message(update)
     
@@ -46,7 +62,8 @@ class BufferingAdapter(PitWallAdapter):
             Begins a new queue consuming the wrapped adapter's updates from a specific point in its lifetime.
             
             Returns a tuple containing:
-            - a list of updates prior to the given sequence to replay
+            - a list of updates that bring a client up to the given sequence: the state at the nearest
+              keyframe as an init message and the running order, followed by the updates since
             - a queue containing all updates after the given sequence, which will also receive future updates
         """
 
@@ -60,11 +77,24 @@ class BufferingAdapter(PitWallAdapter):
             if sequence is None:
                 to_replay = []
             else:
-                to_replay = self._history[0:sequence]
+                to_replay = self._history_to(sequence)
                 for msg in self._history[sequence:]:
                     new_queue.put_nowait(msg)
 
             return (to_replay, QueueAdapter(new_queue))
+
+    def _take_keyframe(self, update: Update):
+        keyframe = self._state.catch_up(update.ts)
+        for catch_up in keyframe:
+            catch_up.seq = update.seq
+        self._keyframes.append(keyframe)
+        self._keyframe_positions.append(len(self._history))
+
+    def _history_to(self, sequence: int) -> List[Update]:
+        i = bisect.bisect_right(self._keyframe_positions, sequence) - 1
+        if i < 0:
+            return self._history[0:sequence]
+        return self._keyframes[i] + self._history[self._keyframe_positions[i]:sequence]
         
 class QueueAdapter(PitWallAdapter):
     _queue: asyncio.Queue
@@ -78,62 +108,152 @@ class QueueAdapter(PitWallAdapter):
             update = await self._queue.get()
             await self._message(update)
 
+    def queue_depths(self) -> Dict[str, int]:
+        return {**super().queue_depths(), "QueueAdapter": self._queue.qsize()}
+
 class RealtimeReplayAdapter(PitWallAdapter):
+    """
+    Replays another adapter's updates at the pace they were originally received, or `multiplier` times
+    faster (fractional speeds slow it down).
+
+    Updates are scheduled against a timeline anchored to the monotonic clock rather than by sleeping
+    between one update and the next, so time spent in callbacks is absorbed instead of accumulating
+    into drift. Everything that's due is released in one go. Quiet periods longer than `max_gap`
+    seconds of capture time are cut short. Speed can be changed at any point with `set_speed` (`math.inf`
+    releases updates as fast as they can be processed), and playback can be paused and resumed.
+    """
+
     _inner_adapter: PitWallAdapter
-    _multiplier: int
     _log: logging.Logger
     _queue: asyncio.Queue
+    _speed: float
+    _paused: bool
+    _changed: asyncio.Event
+    _wall_anchor: int
+    "Monotonic time (ns) at which the timeline was last re-anchored"
+    _stream_anchor: int | None
+    "Capture time (ns) the timeline was at, at `_wall_anchor`"
+
+    max_gap: float | None
+    "Longest stretch of capture time, in seconds, to spend waiting for the next update"
 
-    def __init__(self, inner_adapter: PitWallAdapter, multiplier = 1):
+    def __init__(self, inner_adapter: PitWallAdapter, multiplier: float = 1, max_gap: float | None = 5):
         super().__init__()
         self._inner_adapter = inner_adapter
         self._inner_adapter.on_message(self._on_message)
-        self._multiplier = multiplier
         self._log = logging.getLogger(__name__)
         self._queue = asyncio.Queue()
+        self._speed = float(multiplier)
+        self._paused = False
+        self._changed = asyncio.Event()
+        self._wall_anchor = time.monotonic_ns()
+        self._stream_anchor = None
+        self.max_gap = max_gap
+
+    @property
+    def speed(self) -> float:
+        return self._speed
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @property
+    def position(self) -> int | None:
+        """Capture time (ns) playback has reached, or None before the first update"""
+
+        if self._stream_anchor is None:
+            return None
+        if self._paused:
+            return self._stream_anchor
+        if self._speed == math.inf:
+            # anything queued is due, so there's no meaningful position beyond the anchor
+            return self._stream_anchor
+        return self._stream_anchor + int((time.monotonic_ns() - self._wall_anchor) * self._speed)
+
+    def set_speed(self, speed: float) -> None:
+        if speed <= 0:
+            raise ValueError("Speed must be positive; use pause() to stop playback")
+        self._rebase(self.position)
+        self._speed = float(speed)
+        self._changed.set()
+
+    def pause(self) -> None:
+        self._rebase(self.position)
+        self._paused = True
+        self._changed.set()
+
+    def resume(self) -> None:
+        if not self._paused:
+            # rebasing to the anchor would lose however far playback has got since it was set
+            return
+        self._paused = False
+        self._rebase(self._stream_anchor)
+        self._changed.set()
+
+    def _rebase(self, position: int | None) -> None:
+        self._stream_anchor = position
+        self._wall_anchor = time.monotonic_ns()
 
     def _on_message(self, update: Update):
         self._queue.put_nowait(update)
 
+    def queue_depths(self) -> Dict[str, int]:
+        return {**super().queue_depths(), "RealtimeReplayAdapter": self._queue.qsize()}
+
     async def run(self):
-        await asyncio.gather(self._inner_adapter.run(),
-                             self._inner_run())
-        
+        await asyncio.gather(self._run_inner(), self._inner_run())
+
+    async def _run_inner(self):
+        try:
+            await self._inner_adapter.run()
+        finally:
+            # playback stops once everything before this is out
+            self._queue.put_nowait(_END_OF_STREAM)
+
     async def _inner_run(self):
-        last_ts = None
+        update = await self._queue.get()
+        while update is not _END_OF_STREAM:
+            if self._stream_anchor is None:
+                self._rebase(update.ts)
+            elif self.max_gap is not None and update.ts - self.position > self.max_gap * 1000000000:
+                self._log.debug("Skipping ahead %.3fs", (update.ts - self.position) / 1000000000)
+                self._rebase(update.ts - int(self.max_gap * 1000000000))
 
-        while True:
-            self._log.debug("Fetching next update")
-            next_update: Update = await self._queue.get()
+            await self._wait_until(update.ts)
 
-            if last_ts is None: # or if we spent any amount of time waiting on the queue (i.e. it's already realtime)
-                ...
-            else:
-                wait_s = (next_update.ts - last_ts) / 1000000000
-                # helps get through waiting forever
-                if wait_s > 5:
-                    wait_s = 5
-                wait_s = wait_s / self._multiplier
-                if wait_s > 0:
-                    self._log.debug("Need to wait %.3fs for next update", wait_s)
-                    await asyncio.sleep(wait_s)
-
-            # measure the amount of time spent processing the message callbacks
-            # and add it to the current update's timestamp, so that the next
-            # computed wait period is that much shorter. This only really matters
-            # if the inner adapter always has data available, like a replay from
-            # a captured event; otherwise, we'll spend more time waiting for
-            # the next message.
-            offset_time = time.time_ns()
-
-            # also, some other adapters do shenanigans with the message timestamps,
-            # so fire a copy to avoid them breaking our timing calculations
-            await self._message(copy.copy(next_update))
-            
-            offset_time = time.time_ns() - offset_time
-            if offset_time < 0:
-                offset_time = 0
-            last_ts = next_update.ts + offset_time
+            # release everything else that's due in the same batch, rather than going back to the clock for
+            # each one; copies are sent because some consumers adjust the timestamps they're given
+            await self._message(copy.copy(update))
+            released = update.ts
+            position = self.position
+            update = None
+            while not self._queue.empty():
+                update = self._queue.get_nowait()
+                if update is _END_OF_STREAM or (self._speed != math.inf and update.ts > position):
+                    break
+                await self._message(copy.copy(update))
+                released = update.ts
+                update = None
+
+            if self._speed == math.inf:
+                # the timeline doesn't move by itself at this speed, so keep it where playback has got to
+                self._rebase(released)
+            # let anything else (like whatever is feeding the queue) run between batches
+            await asyncio.sleep(0)
+            if update is None:
+                update = await self._queue.get()
+
+    async def _wait_until(self, ts: int):
+        while self._paused or (self._speed != math.inf and ts > self.position):
+            self._changed.clear()
+            timeout = None if self._paused else (ts - self.position) / self._speed / 1000000000
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except TimeoutError:
+                pass
+
+_END_OF_STREAM = object()
 
 async def main():
     if args.output is not None:
@@ -141,12 +261,13 @@ async def main():
             os.remove(args.output)
 
         os.mkfifo(args.output)
-        output = open(args.output, "a")
+        output = open(args.output, "ab")
     else:
-        output = sys.stdout
+        output = sys.stdout.buffer
 
-    adapter = RealtimeReplayAdapter(CaptureAdapter(args.input), args.multiplier)
-    adapter.on_message(lambda u: output.write(f"{u.ts}:{u.src}:{orjson.dumps(u.data).decode()}\n"))
+    adapter = RealtimeReplayAdapter(CaptureAdapter(args.input, args.start, args.save_index), args.multiplier, args.max_gap)
+    # u.raw is the payload exactly as it was read, so it's passed through without being decoded
+    adapter.on_message(lambda u: output.write(f"{u.ts}:{u.src}:".encode("utf-8") + u.raw + b"\n"))
     await adapter.run()
 
 if __name__ == "__main__":
@@ -155,12 +276,11 @@ if __name__ == "__main__":
         parser = argparse.ArgumentParser()
         parser.add_argument("-i", "--input", required=True)
         parser.add_argument("-o", "--output")
-        parser.add_argument("-x", "--multiplier")
+        parser.add_argument("-x", "--multiplier", type=float, default=1, help="playback speed, such as 20, 0.5 or inf")
+        parser.add_argument("-g", "--max-gap", type=float, default=5, help="longest pause between updates, in capture seconds")
+        parser.add_argument("-f", "--from", dest="start", help="lap number, ISO-8601 time or session status to start from")
+        parser.add_argument("--save-index", action="store_true", help="cache the index used by --from next to the capture")
         args = parser.parse_args()
-        if args.multiplier is not None:
-            args.multiplier = int(args.multiplier)
-        else:
-            args.multiplier = 1
 
         run(main)
     except (KeyboardInterrupt,BrokenPipeError,EOS):
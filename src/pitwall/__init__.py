@@ -1 +1,3 @@
-from .client import PitWallClient as PitWallClient
\ No newline at end of file
+from .client import PitWallClient as PitWallClient
+from .state import SessionState as SessionState
+from .metrics import Metrics as Metrics
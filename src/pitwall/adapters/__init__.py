@@ -1,2 +1,3 @@
 from .captureadapter import CaptureAdapter as CaptureAdapter # ruff said so
-from .websocketadapter import WebsocketAdapter as WebsocketAdapter
\ No newline at end of file
+from .websocketadapter import WebsocketAdapter as WebsocketAdapter
+from .hubadapter import HubAdapter as HubAdapter
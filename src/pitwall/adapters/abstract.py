@@ -1,50 +1,204 @@
+import asyncio
+import logging
 from abc import ABC, abstractmethod
-from asyncio import gather
-from dataclasses import dataclass
+from collections.abc import Callable
 from typing import Any, Awaitable, Coroutine, Dict, List
 
+import orjson
+
+from pitwall.metrics import Metrics
+
+_logger = logging.getLogger(__name__)
+
 class EOS(Exception):
     """Raised when the client reaches the end of the given event stream"""
     pass
 
-@dataclass
 class Update:
-    """A single event consumed from the backing adapter's stream"""
+    """
+    A single event consumed from the backing adapter's stream.
+
+    Adapters that read serialized events (e.g. from a capture) can pass the raw JSON payload instead of
+    decoding it, in which case it's only decoded the first time `data` is read. Likewise, `raw` is only
+    encoded on demand, so an update can be forwarded without ever being decoded or re-encoded.
+    """
+
+    __slots__ = ("src", "ts", "seq", "_data", "_raw")
 
     src: str
     "The event type"
-    
-    # TODO: make this not Any
-    data: Dict[str, Any]
-    "The event payload"
 
     ts: int
     "The time that the event was originally received, in Unix time"
 
+    seq: int
+    "Position in the adapter's stream, assigned when the update is dispatched"
+
+    def __init__(self, src: str, data: Dict[str, Any] | None, ts: int, raw: bytes | None = None):
+        self.src = src
+        self.ts = ts
+        self._data = data
+        self._raw = raw
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        "The event payload"
+        # TODO: make this not Any
+
+        if self._data is None and self._raw is not None:
+            self._data = orjson.loads(self._raw)
+        return self._data
+
+    @data.setter
+    def data(self, value: Dict[str, Any]) -> None:
+        self._data = value
+        self._raw = None
+
+    @property
+    def raw(self) -> bytes:
+        "The event payload as JSON, exactly as it was received if it was read from a capture"
+
+        if self._raw is None:
+            # handlers normalize some lists into int-keyed dicts in place
+            self._raw = orjson.dumps(self._data, option=orjson.OPT_NON_STR_KEYS)
+        return self._raw
+
+    @property
+    def decoded(self) -> bool:
+        "Whether the payload has been decoded yet"
+        return self._data is not None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Update):
+            return NotImplemented
+        return self.src == other.src and self.ts == other.ts and self.data == other.data
+
+    def __repr__(self) -> str:
+        return f"Update(src={self.src!r}, ts={self.ts}, data={self.data!r})"
+
+type MessageCallback = Callable[[Update], Awaitable[None] | None]
+
+class Subscriber:
+    """A message callback that runs in its own worker tasks, fed through a bounded queue"""
+
+    callback: MessageCallback
+    queue: asyncio.Queue
+    concurrency: int
+    workers: List[asyncio.Task]
+
+    def __init__(self, callback: MessageCallback, buffer: int, concurrency: int):
+        self.callback = callback
+        self.queue = asyncio.Queue(buffer)
+        self.concurrency = concurrency
+        self.workers = list()
+
+    def __repr__(self) -> str:
+        return f"Subscriber({self.callback!r}, {self.queue.qsize()}/{self.queue.maxsize} queued)"
+
 class PitWallAdapter(ABC):
-    message_callbacks: List[Awaitable[Update]]
+    message_callbacks: List[MessageCallback]
+    "Callbacks called inline, in the order they were registered"
+    subscribers: List[Subscriber]
+    "Callbacks with their own queue and workers"
     last_sequence: int
+    metrics: Metrics | None
+    "Where updates are counted, if instrumented"
 
     def __init__(self):
         self.message_callbacks = list()
+        self.subscribers = list()
         self.last_sequence = 0
-    
+        self.metrics = None
+        self._stopped = None
+
     @abstractmethod
     async def run(self) -> None:
         ...
-    
-    # bug: if callback doesn't match the expected signature, stuff silently blows up
-    def on_message(self, callback: Awaitable[Update]) -> None:
-        self.message_callbacks.append(callback)
+
+    def on_message(self, callback: MessageCallback, buffer: int | None = None, concurrency: int = 1) -> None:
+        """
+        Registers a callback for every update, which may be a coroutine function.
+
+        By default it's called inline: each update waits for it (including any coroutine it returns)
+        before the next one is dispatched, so callbacks see updates in order and a slow one slows the
+        stream down rather than falling behind it.
+
+        With `buffer`, it's instead fed through a queue of up to that many updates and run by its own
+        worker task, so it can lag behind without holding up the other callbacks until the queue fills.
+        With `concurrency` above 1, that many workers handle updates at once, and ordering is given up.
+
+        Exceptions raised by a callback are logged and don't affect any other callback, except for EOS,
+        which ends the stream.
+        """
+
+        if buffer is None:
+            self.message_callbacks.append(callback)
+        else:
+            self.subscribers.append(Subscriber(callback, buffer, concurrency))
+
+    def instrument(self, metrics: Metrics) -> None:
+        """Counts every update dispatched, and reports the depth of this adapter's queues, in `metrics`"""
+
+        self.metrics = metrics
+        metrics.watch(self)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Number of updates waiting in each of this adapter's queues, by name"""
+
+        return dict((f"{type(self).__name__}.subscriber[{i}]", subscriber.queue.qsize()) for i, subscriber in enumerate(self.subscribers))
 
     async def _message(self, update: Update):
+        if self._stopped is not None:
+            raise self._stopped
+        if self.metrics is not None:
+            # encoding an update that arrived decoded just to measure it would add to the cost being measured
+            self.metrics.count(update.src, len(update._raw) if update._raw is not None else None)
+
         update.seq = self.last_sequence
         self.last_sequence += 1
-        futures = list()
         for callback in self.message_callbacks:
-            # if this raises, it'll get eaten?
-            future = callback(update)
-            if not isinstance(future, Coroutine):
-                continue
-            futures.append(future)
-        gather(*futures)
\ No newline at end of file
+            await _call(callback, update)
+
+        for subscriber in self.subscribers:
+            if len(subscriber.workers) == 0:
+                subscriber.workers = [asyncio.create_task(self._work(subscriber)) for _ in range(subscriber.concurrency)]
+            await subscriber.queue.put(update)
+
+    async def _work(self, subscriber: Subscriber):
+        while True:
+            update = await subscriber.queue.get()
+            try:
+                await _call(subscriber.callback, update)
+            except EOS as e:
+                # stop the stream at the next update, since there's no way to reach into run() from here
+                self._stopped = e
+            finally:
+                subscriber.queue.task_done()
+
+    async def drain(self) -> None:
+        """Waits for every queued subscriber to catch up, then stops their workers"""
+
+        for subscriber in self.subscribers:
+            await subscriber.queue.join()
+        self.close()
+
+        if self._stopped is not None:
+            raise self._stopped
+
+    def close(self) -> None:
+        """Stops every subscriber's workers, dropping anything still queued"""
+
+        for subscriber in self.subscribers:
+            for worker in subscriber.workers:
+                worker.cancel()
+            subscriber.workers = list()
+
+async def _call(callback: MessageCallback, update: Update) -> None:
+    try:
+        result = callback(update)
+        if isinstance(result, Coroutine):
+            await result
+    except EOS:
+        raise
+    except Exception:
+        _logger.exception("Message callback %r failed on %s update %d", callback, update.src, update.seq)
@@ -1,42 +1,180 @@
 import logging
+import mmap
+import os
+import stat
 import sys
-import orjson
-from anyio import open_file, wrap_file
+from typing import AsyncIterator
+
+from anyio import open_file, to_thread
+from anyio.lowlevel import checkpoint
 from pitwall.adapters.abstract import EOS, PitWallAdapter, Update
+from pitwall.capture.compression import HEADER_SIZE, ChunkPrefetcher, detect_compression, open_capture, skip
+from pitwall.capture.format import MAGIC, RECORD_HEADER, BinaryCaptureReader, is_binary_capture
+from pitwall.capture.index import CaptureIndex
+from pitwall.capture.reader import parse_line
+
+CHUNK_SIZE = 1 << 20
 
 class CaptureAdapter(PitWallAdapter):
+    start: str | None
+    "Where to start reading from, in any format understood by CaptureIndex.find()"
+    index: CaptureIndex | None
+    save_index: bool
+    "Whether to cache the index next to the capture, when one is needed for `start`"
+    compression: str | None
+    "Compression the capture file uses (gzip, xz or zstd), which is detected when it's opened"
 
-    def __init__(self, filename):
+    def __init__(self, filename, start: str | None = None, save_index: bool = False):
         super().__init__()
         self.filename = filename
+        self.start = start
+        self.index = None
+        self.save_index = save_index
+        self.compression = None
+        self._truncated = False
         self._log = logging.getLogger(__name__)
 
     async def run(self) -> None:
         self._log.info("Starting")
+        offset = 0
+        binary = False
+
         if self.filename == "-":
-            in_file = wrap_file(sys.stdin)
-        else:
-            in_file = await open_file(self.filename, "r")
+            if self.start is not None:
+                raise ValueError("Can't seek when reading from stdin")
+        elif stat.S_ISREG(os.stat(self.filename).st_mode):
+            async with await open_file(self.filename, "rb") as probe:
+                header = await probe.read(max(len(MAGIC), HEADER_SIZE))
+            self.compression = detect_compression(header)
+            if self.compression is not None:
+                header = await to_thread.run_sync(_read_header, self.filename)
+            binary = is_binary_capture(header)
 
-        async with in_file:
-            self._log.debug("Opened %s", self.filename)
-            async for line in in_file:
+            if self.start is not None:
+                offset = await self._seek(binary)
+
+        try:
+            if binary:
+                await self._run_binary(offset)
+            else:
+                await self._run_text(offset)
+        except EOS:
+            # a callback has seen all it needs, which ends the stream as cleanly as reaching the end of it
+            self._log.info("Stopped by a callback")
+
+        self._log.info("End of stream")
+
+    async def _run_text(self, offset: int) -> None:
+        tail = b""
+        async for chunk in self._read_chunks(offset):
+            lines = (tail + chunk).split(b"\n") if tail else chunk.split(b"\n")
+            # the last piece is either empty or a line that continues in the next chunk
+            tail = lines.pop()
+
+            for line in lines:
                 try:
-                    await self._message(self.parse_line(line))
+                    update = self.parse_line(line)
                 except EOS:
-                    self._log.info("End of stream")
-                    break
-                except:
-                    print(line) # TODO: remove this
-                    raise
-
-    def parse_line(self, line: str) -> Update:
-        line = line.rstrip()
-        if len(line) == 0:
-            print("EOF")
-            raise EOS()
-
-        (ts, src, data) = line.split(":", 2)
-        ts = int(ts)
-        data = orjson.loads(data)
-        return Update(src, data, ts)
\ No newline at end of file
+                    self._log.debug("Reached the blank line at the end of the capture")
+                    return
+                await self._message(update)
+
+            # mapped chunks never suspend, so give other tasks (such as buffered subscribers) a chance to run
+            await checkpoint()
+
+        # a compressed capture that was cut off probably ends with part of a line
+        if len(tail.strip()) > 0 and not self._truncated:
+            await self._message(self.parse_line(tail))
+
+    async def _run_binary(self, offset: int) -> None:
+        reader = BinaryCaptureReader(offset, self.index.topics if offset > 0 else None)
+        async for chunk in self._read_chunks(offset):
+            for update in reader.feed(chunk):
+                await self._message(update)
+            await checkpoint()
+
+            if reader.done:
+                break
+
+    async def _read_chunks(self, offset: int) -> AsyncIterator[bytes]:
+        """
+        Yields the input in large blocks. Regular files are memory-mapped and sliced without leaving
+        the event loop; pipes (stdin or a FIFO from replay.py) are read off-thread, taking whatever
+        is available so that a live stream isn't held back waiting for a full block. Compressed files are
+        decompressed on a background thread.
+        """
+
+        if self.compression is not None:
+            async for chunk in self._read_compressed(offset):
+                yield chunk
+            return
+
+        if self.filename == "-":
+            fd = sys.stdin.fileno()
+            close = False
+        else:
+            fd = await to_thread.run_sync(os.open, self.filename, os.O_RDONLY)
+            close = True
+
+        try:
+            self._log.debug("Opened %s", self.filename)
+            if stat.S_ISREG(os.fstat(fd).st_mode):
+                size = os.fstat(fd).st_size
+                if size <= offset:
+                    return
+
+                with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapped:
+                    for position in range(offset, size, CHUNK_SIZE):
+                        yield mapped[position:position + CHUNK_SIZE]
+            else:
+                while chunk := await to_thread.run_sync(os.read, fd, CHUNK_SIZE):
+                    yield chunk
+        finally:
+            if close:
+                os.close(fd)
+
+    async def _read_compressed(self, offset: int) -> AsyncIterator[bytes]:
+        # decompressed on another thread, which works ahead while the chunk before is being parsed
+        prefetcher = ChunkPrefetcher(await to_thread.run_sync(open_capture, self.filename), CHUNK_SIZE)
+        try:
+            while chunk := await to_thread.run_sync(prefetcher.get):
+                if offset >= len(chunk):
+                    offset -= len(chunk)
+                    continue
+                yield chunk[offset:] if offset > 0 else chunk
+                offset = 0
+            self._truncated = prefetcher.truncated
+        finally:
+            prefetcher.close()
+
+    async def _seek(self, binary: bool) -> int:
+        """Replays the state needed to start at self.start, then returns the offset to continue reading from"""
+
+        self.index = await to_thread.run_sync(CaptureIndex.load, self.filename, self.save_index)
+        point = self.index.find(self.start)
+        self._log.info("Starting at offset %d (lap %s, %s)", point.offset, point.lap, point.status)
+
+        if self.index.init_offset is not None:
+            await self._message(await to_thread.run_sync(self._read_init, binary))
+        elif len(self.index.drivers) > 0:
+            await self._message(Update("DriverList", self.index.drivers, point.ts))
+
+        for update in point.catch_up():
+            await self._message(update)
+
+        return point.offset
+
+    def _read_init(self, binary: bool) -> Update:
+        with open_capture(self.filename) as in_file:
+            skip(in_file, self.index.init_offset)
+            if binary:
+                (length, _, ts) = RECORD_HEADER.unpack(in_file.read(RECORD_HEADER.size))
+                return Update("init", None, ts, in_file.read(length))
+            return self.parse_line(in_file.readline())
+
+    def parse_line(self, line: str | bytes) -> Update:
+        return parse_line(line)
+
+def _read_header(filename: str) -> bytes:
+    with open_capture(filename) as f:
+        return f.read(len(MAGIC))
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+
+from pitwall.adapters.abstract import PitWallAdapter
+from pitwall.capture.format import BinaryCaptureReader
+from pitwall.hub import parse_address
+
+CHUNK_SIZE = 1 << 16
+
+class HubAdapter(PitWallAdapter):
+    """Consumes the updates served by a HubServer, starting with a snapshot of the session so far"""
+
+    address: str
+
+    def __init__(self, address: str):
+        super().__init__()
+        self.address = address
+        self._log = logging.getLogger(__name__)
+
+    async def run(self) -> None:
+        (scheme, location) = parse_address(self.address)
+        if scheme == "unix":
+            (reader, writer) = await asyncio.open_unix_connection(location)
+        else:
+            (reader, writer) = await asyncio.open_connection(*location)
+        self._log.info("Connected to %s", self.address)
+
+        try:
+            records = BinaryCaptureReader()
+            while chunk := await reader.read(CHUNK_SIZE):
+                for update in records.feed(chunk):
+                    await self._message(update)
+        finally:
+            writer.close()
+
+        self._log.info("Hub closed the connection")
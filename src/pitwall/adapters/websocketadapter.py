@@ -1,29 +1,78 @@
-import asyncio
+import logging
 import time
+from typing import Any, Dict, List
 
 import pysignalr.client
 
 from pitwall.adapters.abstract import PitWallAdapter, Update
+from pitwall.state import SessionState, diff
+
+TOPICS = ("SessionInfo", "Heartbeat", "DriverList", "ExtrapolatedClock", "RaceControlMessages", "SessionStatus", "TeamRadio", "TimingAppData",
+          "TimingStats", "TrackStatus", "WeatherData", "Position.z", "CarData.z", "SessionData", "TimingData")
+"""Topics subscribed to"""
+
+KEYFRAME_TOPICS = ("SessionInfo", "SessionStatus", "TrackStatus", "ExtrapolatedClock")
+"""Topics that are only understood whole, so a resync sends them in full rather than as a delta"""
 
 class WebsocketAdapter(PitWallAdapter):
+    """
+    Reads the live feed from a SignalR connection, subscribing to every topic each time it (re)connects.
+
+    The first subscription's snapshot is dispatched as an `init` update. After a reconnect, the new
+    snapshot is instead compared against everything dispatched so far, and only what changed while the
+    connection was down is dispatched, as an ordinary update for each topic, so that consumers don't see
+    the whole session again. The Heartbeat in a snapshot is left out, since it's stale by then.
+    """
+
     client: pysignalr.client.SignalRClient
+    state: SessionState
+    "Everything dispatched so far, merged"
 
     def __init__(self, websocketclient : pysignalr.client.SignalRClient):
         super().__init__()
         self.client = websocketclient
         self.client.on("feed", self.on_feed)
+        self.client.on_open(self.on_open)
+        self.state = SessionState()
+        self._log = logging.getLogger(__name__)
+
+    async def on_open(self):
+        await self.client.send("Subscribe", [list(TOPICS)], self.on_subscribe)
 
     async def on_feed(self, message):
         source = message[0]
         data = message[1]
-        await self._message(Update(source, data, time.time_ns()))
+        await self._dispatch(Update(source, data, time.time_ns()))
 
     async def on_subscribe(self, message):
-        await self._message(Update("init", message.result, time.time_ns()))
+        ts = time.time_ns()
+        if len(self.state.topics) == 0:
+            await self._dispatch(Update("init", message.result, ts))
+            return
+
+        updates = self._resync(message.result, ts)
+        self._log.info("Resubscribed, %d topics changed since the connection dropped", len(updates))
+        for update in updates:
+            await self._dispatch(update)
 
     async def run(self) -> None:
-        await asyncio.gather(
-            self.client.send("Subscribe",
-                             [["SessionInfo", "Heartbeat", "DriverList", "ExtrapolatedClock", "RaceControlMessages", "SessionStatus", "TeamRadio", "TimingAppData", "TimingStats", "TrackStatus", "WeatherData", "Position.z", "CarData.z", "SessionData", "TimingData"]],
-                             self.on_subscribe),
-            self.client.run())
\ No newline at end of file
+        await self.client.run()
+
+    async def _dispatch(self, update: Update) -> None:
+        # merged first, since consumers may modify the data in place
+        self.state.apply(update)
+        await self._message(update)
+
+    def _resync(self, snapshot: Dict[str, Any], ts: int) -> List[Update]:
+        updates = list()
+        for topic, value in snapshot.items():
+            if topic == "Heartbeat":
+                continue
+
+            delta = diff(self.state.topics.get(topic), value)
+            if delta is None:
+                continue
+            if topic in KEYFRAME_TOPICS and isinstance(value, dict):
+                delta = {**value, "_kf": True}
+            updates.append(Update(topic, delta, ts))
+        return updates
@@ -0,0 +1,8 @@
+from .compression import COMPRESSION_EXTENSIONS as COMPRESSION_EXTENSIONS, ChunkPrefetcher as ChunkPrefetcher, \
+    detect_compression as detect_compression, open_capture as open_capture, open_compressed as open_compressed
+from .format import BinaryCaptureReader as BinaryCaptureReader, BinaryCaptureWriter as BinaryCaptureWriter, \
+    CaptureFormatError as CaptureFormatError, convert_text_capture as convert_text_capture, is_binary_capture as is_binary_capture, \
+    read_footer as read_footer
+from .index import CaptureIndex as CaptureIndex, SeekPoint as SeekPoint
+from .reader import parse_line as parse_line, read_capture as read_capture
+from .writer import CaptureWriter as CaptureWriter, FSYNC_POLICIES as FSYNC_POLICIES, TextCaptureWriter as TextCaptureWriter
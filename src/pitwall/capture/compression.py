@@ -0,0 +1,134 @@
+import gzip
+import io
+import logging
+import lzma
+import queue
+import threading
+from typing import BinaryIO, Dict
+
+COMPRESSION_MAGIC: Dict[str, bytes] = {"gzip": b"\x1f\x8b", "xz": b"\xfd7zXZ\x00", "zstd": b"\x28\xb5\x2f\xfd"}
+"""Leading bytes of each supported compression format"""
+
+COMPRESSION_EXTENSIONS: Dict[str, str] = {"gzip": ".gz", "xz": ".xz", "zstd": ".zst"}
+
+HEADER_SIZE = max(len(x) for x in COMPRESSION_MAGIC.values())
+"""Number of bytes detect_compression() needs to see"""
+
+def detect_compression(header: bytes) -> str | None:
+    """Returns the compression format a file starting with `header` uses, or None if it isn't compressed"""
+
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if header[:len(magic)] == magic:
+            return compression
+    return None
+
+def open_compressed(path: str, compression: str, mode: str = "rb") -> BinaryIO:
+    """
+    Opens a file compressed with one of COMPRESSION_MAGIC's formats, for reading (`rb`) or writing (`wb`
+    or `ab`). Writing xz is supported, but it can only make data readable a block at a time, so gzip or
+    zstd suit a live recording better.
+    """
+
+    if compression == "gzip":
+        # level 6 compresses nearly as well as the default 9 at a fraction of the CPU time
+        return gzip.open(path, mode, compresslevel=6)
+    elif compression == "xz":
+        return lzma.open(path, mode)
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd captures need the zstandard package; install pitwall[zstd]") from None
+        file = zstandard.open(path, mode)
+        # its reader can't readline() or peek() on its own
+        return io.BufferedReader(file) if "r" in mode else file
+    raise ValueError(f"Unknown compression {compression}; use one of {', '.join(COMPRESSION_MAGIC)}")
+
+def open_capture(path: str) -> BinaryIO:
+    """Opens a capture for reading, decompressing it on the fly if needed"""
+
+    with open(path, "rb") as probe:
+        compression = detect_compression(probe.read(HEADER_SIZE))
+    if compression is None:
+        return open(path, "rb")
+    return open_compressed(path, compression)
+
+def skip(file: BinaryIO, count: int) -> None:
+    """Moves `count` bytes forward, by reading them if the file can't seek (as compressed ones often can't)"""
+
+    if file.seekable():
+        file.seek(count, io.SEEK_CUR)
+        return
+
+    while count > 0:
+        chunk = file.read(min(count, 1 << 20))
+        if len(chunk) == 0:
+            return
+        count -= len(chunk)
+
+class ChunkPrefetcher:
+    """
+    Reads a file in chunks on a background thread, staying up to `depth` chunks ahead of the consumer,
+    so that decompression overlaps with whatever is being done with the data. A compressed file cut short
+    (because its recorder was killed) ends at the last complete chunk rather than raising.
+    """
+
+    _file: BinaryIO
+    _chunks: queue.Queue
+    _stopped: threading.Event
+    truncated: bool
+    "Set if the file turned out to be cut short, in which case its last line or record is probably incomplete"
+
+    def __init__(self, file: BinaryIO, chunk_size: int = 1 << 20, depth: int = 4):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._chunks = queue.Queue(depth)
+        self._stopped = threading.Event()
+        self._finished = False
+        self.truncated = False
+        self._log = logging.getLogger(__name__)
+        self._thread = threading.Thread(target=self._run, name="ChunkPrefetcher", daemon=True)
+        self._thread.start()
+
+    def get(self) -> bytes:
+        """Returns the next chunk, blocking until it's ready, or an empty one at the end of the file"""
+
+        if self._finished:
+            return b""
+
+        chunk = self._chunks.get()
+        if isinstance(chunk, BaseException):
+            self._finished = True
+            raise chunk
+        if len(chunk) == 0:
+            self._finished = True
+        return chunk
+
+    def close(self) -> None:
+        """Stops reading early; the thread closes the file once it notices, without being waited for"""
+
+        self._stopped.set()
+
+    def _run(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                try:
+                    chunk = self._file.read(self._chunk_size)
+                except EOFError:
+                    self._log.warning("Compressed capture ends partway through, stopping there")
+                    self.truncated = True
+                    chunk = b""
+                except Exception as e:
+                    chunk = e
+
+                while not self._stopped.is_set():
+                    try:
+                        self._chunks.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+
+                if not isinstance(chunk, bytes) or len(chunk) == 0:
+                    return
+        finally:
+            self._file.close()
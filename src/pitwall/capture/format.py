@@ -0,0 +1,277 @@
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+
+import orjson
+
+from pitwall.adapters.abstract import Update
+from pitwall.capture.compression import open_capture
+
+MAGIC = b"PWCAP\x00\x01\n"
+"""Written at the start of every binary capture"""
+
+TRAILER_MAGIC = b"PWIDX\x00\x01\n"
+
+RECORD_HEADER = struct.Struct("<IHq")
+"""Payload length, topic id, receive timestamp (ns)"""
+
+TRAILER = struct.Struct("<Q8s")
+"""Offset of the index record, TRAILER_MAGIC"""
+
+TOPIC_DEFINITION = 0xFFFF
+"""Record that assigns a topic id: the payload is the topic name, and the timestamp field carries the id"""
+
+INDEX = 0xFFFE
+"""Footer record written on close, which also marks the end of the record stream"""
+
+INDEX_INTERVAL = 1024
+"""Number of records between footer index entries"""
+
+class CaptureFormatError(Exception):
+    """Raised when a binary capture is corrupted in a way that can't be recovered"""
+    pass
+
+def is_binary_capture(header: bytes) -> bool:
+    return header[:len(MAGIC)] == MAGIC
+
+class BinaryCaptureReader:
+    """
+    Incrementally decodes the records of a binary capture.
+
+    Chunks of any size can be passed to feed(); a record split across chunks is held back until
+    the rest of it arrives.
+    """
+
+    topics: Dict[int, str]
+    offset: int
+    "Absolute file offset of the first byte that hasn't been decoded yet"
+    done: bool
+    "Set once the footer index has been reached"
+
+    def __init__(self, offset: int = 0, topics: Dict[int, str] | None = None):
+        """To start partway through a file, pass the offset of a record and the topic table in effect there"""
+
+        self.topics = topics if topics is not None else dict()
+        self.offset = offset
+        self.done = False
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> List[Update]:
+        if self.done:
+            return []
+
+        buffer = self._buffer + chunk if self._buffer else chunk
+        position = 0
+
+        if self.offset == 0:
+            if len(buffer) < len(MAGIC):
+                self._buffer = buffer
+                return []
+            if not is_binary_capture(buffer):
+                raise CaptureFormatError("Not a binary capture")
+            position = len(MAGIC)
+
+        updates = list()
+        unpack = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        end = len(buffer)
+        topics = self.topics
+
+        while end - position >= header_size:
+            (length, topic_id, ts) = unpack(buffer, position)
+            start = position + header_size
+            if end - start < length:
+                break
+
+            if topic_id == INDEX:
+                self.done = True
+                break
+
+            payload = buffer[start:start + length]
+            position = start + length
+
+            if topic_id == TOPIC_DEFINITION:
+                topics[ts] = payload.decode("utf-8")
+            else:
+                updates.append(Update(topics[topic_id], None, ts, payload))
+
+        self.offset += position
+        self._buffer = buffer[position:]
+        return updates
+
+class BinaryCaptureWriter:
+    """
+    Writes updates as length-prefixed records, assigning each new topic a small id the first time
+    it's seen. close() appends a footer containing the topic table and a sparse (offset, timestamp)
+    index; files without one (e.g. the recorder was killed) are still readable front to back.
+    """
+
+    _file: BinaryIO
+    _topics: Dict[str, int]
+    _entries: List[Tuple[int, int]]
+    _count: int
+    _offset: int
+
+    def __init__(self, file: BinaryIO, topics: Dict[str, int] | None = None, entries: List[Tuple[int, int]] | None = None, count: int = 0):
+        self._file = file
+        self._topics = topics if topics is not None else dict()
+        self._entries = entries if entries is not None else list()
+        self._count = count
+
+        # kept track of here rather than asked for, since a compressed file would give the wrong answer
+        self._offset = self._file.tell()
+        if self._offset == 0:
+            self._file.write(MAGIC)
+            self._offset = len(MAGIC)
+
+    @classmethod
+    def open(cls, path: str) -> "BinaryCaptureWriter":
+        """Opens a capture for writing, appending to it (and replacing its footer) if it already exists"""
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return cls(open(path, "wb"))
+
+        file = open(path, "r+b")
+        footer = read_footer(file)
+        if footer is not None:
+            (index_offset, index) = footer
+            topics = dict([(name, int(topic_id)) for topic_id, name in index["topics"].items()])
+            entries = [(x[0], x[1]) for x in index["entries"]]
+            count = index["records"]
+        else:
+            # no footer, so rebuild what it would have contained and drop any partially-written record
+            names = dict()
+            entries = list()
+            count = 0
+            file.seek(0)
+            for (offset, _, ts, _) in iter_records(file, names):
+                if count % INDEX_INTERVAL == 0:
+                    entries.append((offset, ts))
+                count += 1
+            topics = dict([(name, topic_id) for topic_id, name in names.items()])
+
+            # the end of the last whole record, which may be a topic definition rather than one iter_records yields
+            reader = BinaryCaptureReader()
+            file.seek(0)
+            while chunk := file.read(1 << 20):
+                reader.feed(chunk)
+            index_offset = reader.offset
+
+        file.seek(index_offset)
+        file.truncate()
+        return cls(file, topics, entries, count)
+
+    def write(self, src: str, payload: bytes, ts: int) -> None:
+        topic_id = self._topics.get(src)
+        if topic_id is None:
+            topic_id = len(self._topics)
+            self._topics[src] = topic_id
+            name = src.encode("utf-8")
+            self._file.write(RECORD_HEADER.pack(len(name), TOPIC_DEFINITION, topic_id))
+            self._file.write(name)
+            self._offset += RECORD_HEADER.size + len(name)
+
+        if self._count % INDEX_INTERVAL == 0:
+            self._entries.append((self._offset, ts))
+        self._count += 1
+
+        self._file.write(RECORD_HEADER.pack(len(payload), topic_id, ts))
+        self._file.write(payload)
+        self._offset += RECORD_HEADER.size + len(payload)
+
+    def write_update(self, update: Update) -> None:
+        self.write(update.src, update.raw, update.ts)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def sync(self) -> None:
+        """Flushes and waits until everything written so far is on disk"""
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, sync: bool = False) -> None:
+        """Writes the footer and closes the file, first waiting for it to reach the disk if `sync` is set"""
+
+        index_offset = self._offset
+        index = orjson.dumps({"topics": dict([(str(topic_id), name) for name, topic_id in self._topics.items()]),
+                              "records": self._count,
+                              "entries": self._entries})
+        self._file.write(RECORD_HEADER.pack(len(index), INDEX, 0))
+        self._file.write(index)
+        self._file.write(TRAILER.pack(index_offset, TRAILER_MAGIC))
+        if sync:
+            self.sync()
+        self._file.close()
+
+def iter_records(file: BinaryIO, topics: Dict[int, str] | None = None) -> Iterator[Tuple[int, str, int, bytes]]:
+    """
+    Yields the (offset, topic, timestamp, raw payload) of every record in a binary capture, without decoding them.
+    If given, `topics` is filled in with the capture's topic table as it's read.
+    """
+
+    contents = file.read()
+    if not is_binary_capture(contents):
+        raise CaptureFormatError("Not a binary capture")
+
+    if topics is None:
+        topics = dict()
+    position = len(MAGIC)
+    end = len(contents)
+    while end - position >= RECORD_HEADER.size:
+        (length, topic_id, ts) = RECORD_HEADER.unpack_from(contents, position)
+        start = position + RECORD_HEADER.size
+        if topic_id == INDEX or end - start < length:
+            return
+
+        payload = contents[start:start + length]
+        if topic_id == TOPIC_DEFINITION:
+            topics[ts] = payload.decode("utf-8")
+        else:
+            yield (position, topics[topic_id], ts, payload)
+        position = start + length
+
+def read_footer(file: BinaryIO) -> Tuple[int, Dict[str, Any]] | None:
+    """Returns the offset and contents of a binary capture's footer index, or None if it doesn't have one"""
+
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    if size < len(MAGIC) + RECORD_HEADER.size + TRAILER.size:
+        return None
+
+    file.seek(size - TRAILER.size)
+    (index_offset, magic) = TRAILER.unpack(file.read(TRAILER.size))
+    if magic != TRAILER_MAGIC or index_offset >= size:
+        return None
+
+    file.seek(index_offset)
+    (length, topic_id, _) = RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))
+    if topic_id != INDEX:
+        raise CaptureFormatError(f"Footer points to a non-index record at {index_offset}")
+
+    return (index_offset, orjson.loads(file.read(length)))
+
+def convert_text_capture(input_path: str, output_path: str) -> int:
+    """Converts a `ts:src:json` text capture into the binary format, returning the number of records written"""
+
+    writer = BinaryCaptureWriter(open(output_path, "wb"))
+    count = 0
+    try:
+        with open_capture(input_path) as in_file:
+            for line in in_file:
+                line = line.rstrip()
+                if len(line) == 0:
+                    break
+
+                (ts, src, data) = line.split(b":", 2)
+                # the payload is already compact JSON, so it can be copied over without decoding it
+                writer.write(src.decode("utf-8"), data, int(ts))
+                count += 1
+    finally:
+        writer.close()
+
+    return count
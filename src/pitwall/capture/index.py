@@ -0,0 +1,315 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+import orjson
+
+from pitwall.adapters.abstract import Update
+from pitwall.capture.compression import open_capture
+from pitwall.capture.format import MAGIC, RECORD_HEADER, is_binary_capture, iter_records
+
+INDEX_VERSION = 2
+
+FINGERPRINT_BLOCK = 1 << 16
+"""Bytes hashed from each end of a capture to tell whether it's the one an index was built from"""
+
+TIME_INTERVAL = 30 * 1000000000
+"""Wall-clock spacing of timestamp seek points, in ns"""
+
+@dataclass
+class SeekPoint:
+    """A position in a capture file that playback can start from"""
+
+    offset: int
+    "Byte offset of the first record to read"
+
+    ts: int
+    "Receive time of that record"
+
+    lap: int | None
+    "Lap (or qualifying part) in progress, according to SessionData"
+
+    status: str | None
+    "Session status in effect"
+
+    state: Dict[str, Any]
+    """
+    Condensed state at this point, keyed by topic and in that topic's delta format, so that it can be
+    replayed as ordinary updates before reading resumes
+    """
+
+    def catch_up(self) -> List[Update]:
+        return [Update(src, data, self.ts) for src, data in self.state.items()]
+
+class CaptureIndex:
+    """
+    Sidecar index mapping laps, session status changes and wall-clock times to byte offsets in a capture.
+
+    Built with a single pass over the capture, and optionally cached next to it as `<capture>.idx`; a
+    cached index is only used while the capture's size and fingerprint still match.
+    """
+
+    size: int
+    "Size of the capture when it was indexed"
+
+    fingerprint: str
+    "Hash of the capture's first and last blocks when it was indexed"
+
+    init_offset: int | None
+    "Offset of the initial subscription snapshot, if the capture has one"
+
+    drivers: Dict[str, Any]
+    "Merged DriverList, for captures that don't start with a snapshot"
+
+    topics: Dict[int, str] | None
+    "Topic table of a binary capture"
+
+    laps: List[SeekPoint]
+    statuses: List[SeekPoint]
+    times: List[SeekPoint]
+
+    def __init__(self, size: int, fingerprint: str, init_offset: int | None, drivers: Dict[str, Any], topics: Dict[int, str] | None,
+                 laps: List[SeekPoint], statuses: List[SeekPoint], times: List[SeekPoint]):
+        self.size = size
+        self.fingerprint = fingerprint
+        self.init_offset = init_offset
+        self.drivers = drivers
+        self.topics = topics
+        self.laps = laps
+        self.statuses = statuses
+        self.times = times
+
+    @staticmethod
+    def path_for(filename: str) -> str:
+        return filename + ".idx"
+
+    @classmethod
+    def load(cls, filename: str, save: bool = False) -> "CaptureIndex":
+        """
+        Returns the capture's cached index, or builds it if that's missing or stale. The index is only
+        written next to the capture if `save` is set.
+        """
+
+        size = os.path.getsize(filename)
+        index_path = cls.path_for(filename)
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                contents = orjson.loads(f.read())
+            # the size alone would miss a capture that was rewritten with different contents
+            if contents.get("version") == INDEX_VERSION and contents["size"] == size and contents["fingerprint"] == _fingerprint(filename):
+                return cls._from_dict(contents)
+
+        index = cls.build(filename)
+        if not save:
+            return index
+        try:
+            with open(index_path, "wb") as f:
+                f.write(orjson.dumps(index._to_dict()))
+        except OSError:
+            # read-only directory; the index still works, it just won't be cached
+            pass
+        return index
+
+    @classmethod
+    def build(cls, filename: str) -> "CaptureIndex":
+        with open_capture(filename) as f:
+            binary = is_binary_capture(f.read(len(MAGIC)))
+        # offsets are into the decompressed data, for a compressed capture
+        with open_capture(filename) as f:
+            if binary:
+                topics = dict()
+                return cls._build(os.path.getsize(filename), _fingerprint(filename), _binary_records(f, topics), topics)
+            else:
+                return cls._build(os.path.getsize(filename), _fingerprint(filename), _text_records(f), None)
+
+    @classmethod
+    def _build(cls, size: int, fingerprint: str, records: Iterator[Tuple[int, int, str, int, bytes]], topics: Dict[int, str] | None) -> "CaptureIndex":
+        tracker = _StateTracker()
+        init_offset = None
+        laps = list()
+        statuses = list()
+        times = list()
+        next_time = None
+
+        for (offset, end, src, ts, payload) in records:
+            # a new point applies to the record it starts at, so capture the state before applying it
+            if next_time is None or ts >= next_time:
+                times.append(tracker.seek_point(offset, ts))
+                next_time = ts - ts % TIME_INTERVAL + TIME_INTERVAL
+
+            if src not in _TRACKED:
+                continue
+
+            data = orjson.loads(payload)
+            if src == "init":
+                if init_offset is None:
+                    init_offset = offset
+                tracker.apply_init(data)
+                continue
+
+            previous = (tracker.lap, tracker.status)
+            tracker.apply(src, data)
+
+            # these point at the record *after* the change, so that the change itself is part of the catch-up state
+            if tracker.lap != previous[0]:
+                laps.append(tracker.seek_point(end, ts))
+            if tracker.status != previous[1]:
+                statuses.append(tracker.seek_point(end, ts))
+
+        return cls(size, fingerprint, init_offset, tracker.drivers, topics, laps, statuses, times)
+
+    def at_lap(self, lap: int) -> SeekPoint:
+        """Returns the point where the given lap (or qualifying part) starts"""
+
+        for point in self.laps:
+            if point.lap is not None and point.lap >= lap:
+                return point
+        raise KeyError(f"Capture doesn't reach lap {lap}")
+
+    def at_time(self, ts: int) -> SeekPoint:
+        """Returns the latest point at or before the given Unix time (in ns)"""
+
+        candidates = [p for p in self.times + self.laps + self.statuses if p.ts <= ts]
+        if len(candidates) == 0:
+            raise KeyError("Capture starts after the requested time")
+        return max(candidates, key=lambda p: (p.ts, p.offset))
+
+    def at_status(self, status: str) -> SeekPoint:
+        for point in self.statuses:
+            if point.status == status:
+                return point
+        raise KeyError(f"Session never became {status}")
+
+    def find(self, position: str) -> SeekPoint:
+        """
+        Resolves a command-line seek target: a lap number, an ISO-8601 time (UTC unless it has an offset),
+        or a session status such as `Started`
+        """
+
+        if position.isdigit():
+            return self.at_lap(int(position))
+
+        try:
+            when = datetime.fromisoformat(position)
+        except ValueError:
+            return self.at_status(position)
+
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return self.at_time(int(when.timestamp() * 1000000000))
+
+    def _to_dict(self) -> Dict[str, Any]:
+        def points(x: List[SeekPoint]):
+            return [[p.offset, p.ts, p.lap, p.status, p.state] for p in x]
+
+        return {"version": INDEX_VERSION,
+                "size": self.size,
+                "fingerprint": self.fingerprint,
+                "init": self.init_offset,
+                "drivers": self.drivers,
+                "topics": dict([(str(k), v) for k, v in self.topics.items()]) if self.topics is not None else None,
+                "laps": points(self.laps),
+                "statuses": points(self.statuses),
+                "times": points(self.times)}
+
+    @classmethod
+    def _from_dict(cls, contents: Dict[str, Any]) -> "CaptureIndex":
+        def points(x: List[List[Any]]):
+            return [SeekPoint(*p) for p in x]
+
+        topics = contents["topics"]
+        return cls(contents["size"],
+                   contents["fingerprint"],
+                   contents["init"],
+                   contents["drivers"],
+                   dict([(int(k), v) for k, v in topics.items()]) if topics is not None else None,
+                   points(contents["laps"]),
+                   points(contents["statuses"]),
+                   points(contents["times"]))
+
+_TRACKED = {"init", "SessionInfo", "SessionStatus", "TrackStatus", "SessionData", "ExtrapolatedClock", "DriverList", "TimingAppData", "TimingData"}
+
+class _StateTracker:
+    """Follows just enough of a session to rebuild it from a seek point"""
+
+    def __init__(self):
+        self.lap = None
+        self.status = None
+        self.drivers = dict()
+        self._latest = dict()
+        self._series = None
+        self._positions = dict()
+        self._stints = dict()
+
+    def apply_init(self, data: Dict[str, Any]) -> None:
+        for src in ("SessionInfo", "SessionStatus", "TrackStatus", "SessionData", "ExtrapolatedClock", "DriverList", "TimingAppData", "TimingData"):
+            if src in data:
+                self.apply(src, data[src])
+
+    def apply(self, src: str, data: Dict[str, Any]) -> None:
+        if src in ("SessionInfo", "TrackStatus", "ExtrapolatedClock"):
+            self._latest[src] = data
+        elif src == "SessionStatus":
+            self._latest[src] = data
+            self.status = data.get("Status", self.status)
+        elif src == "SessionData":
+            series = data.get("Series")
+            if series:
+                latest = series[-1] if isinstance(series, list) else list(series.values())[-1]
+                self._series = latest
+                self.lap = latest.get("Lap", latest.get("QualifyingPart", self.lap))
+        elif src == "DriverList":
+            for driver_id, driver in data.items():
+                if isinstance(driver, dict):
+                    self.drivers.setdefault(driver_id, dict()).update(driver)
+        elif src == "TimingAppData":
+            for driver_id, line in data.get("Lines", {}).items():
+                stints = line.get("Stints")
+                if isinstance(stints, list):
+                    stints = dict([(str(i), x) for i, x in enumerate(stints)])
+                if isinstance(stints, dict):
+                    for stint_number, stint in stints.items():
+                        if isinstance(stint, dict) and "Compound" in stint:
+                            self._stints[driver_id] = (stint_number, stint["Compound"])
+        elif src == "TimingData":
+            for driver_id, line in data.get("Lines", {}).items():
+                if line.get("Position", "") != "":
+                    self._positions[driver_id] = line["Position"]
+
+    def seek_point(self, offset: int, ts: int) -> SeekPoint:
+        state = dict(self._latest)
+        if self._series is not None:
+            state["SessionData"] = {"Series": [self._series]}
+        if len(self._stints) > 0:
+            state["TimingAppData"] = {"Lines": dict([(driver_id, {"Stints": {number: {"Compound": compound}}})
+                                                     for driver_id, (number, compound) in self._stints.items()])}
+        if len(self._positions) > 0:
+            # in position order, so that applying them one at a time never needs to shuffle anyone twice
+            ordered = sorted(self._positions.items(), key=lambda x: int(x[1]))
+            state["TimingData"] = {"Lines": dict([(driver_id, {"Position": position}) for driver_id, position in ordered])}
+
+        return SeekPoint(offset, ts, self.lap, self.status, state)
+
+def _fingerprint(filename: str) -> str:
+    # of the file as stored, so that nothing has to be decompressed
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BLOCK))
+        f.seek(max(0, os.path.getsize(filename) - FINGERPRINT_BLOCK))
+        digest.update(f.read(FINGERPRINT_BLOCK))
+    return digest.hexdigest()
+
+def _text_records(file) -> Iterator[Tuple[int, int, str, int, bytes]]:
+    offset = 0
+    for line in file:
+        if len(line.rstrip()) == 0:
+            return
+        (ts, src, data) = line.split(b":", 2)
+        yield (offset, offset + len(line), src.decode("utf-8"), int(ts), data)
+        offset += len(line)
+
+def _binary_records(file, topics: Dict[int, str]) -> Iterator[Tuple[int, int, str, int, bytes]]:
+    for (offset, src, ts, payload) in iter_records(file, topics):
+        yield (offset, offset + RECORD_HEADER.size + len(payload), src, ts, payload)
@@ -0,0 +1,87 @@
+import mmap
+import os
+from typing import Iterator
+
+import orjson
+
+from pitwall.adapters.abstract import EOS, Update
+from pitwall.capture.compression import HEADER_SIZE, ChunkPrefetcher, detect_compression, open_capture
+from pitwall.capture.format import BinaryCaptureReader, is_binary_capture, MAGIC
+
+CHUNK_SIZE = 1 << 20
+
+def parse_line(line: str | bytes) -> Update:
+    """Parses one `ts:src:json` line of a text capture, raising EOS for the blank line that ends it"""
+
+    line = line.rstrip()
+    if len(line) == 0:
+        raise EOS()
+
+    (ts, src, data) = line.split(b":" if isinstance(line, bytes) else ":", 2)
+    if isinstance(src, bytes):
+        src = src.decode("utf-8")
+    if isinstance(data, bytes):
+        return Update(src, None, int(ts), data)
+    return Update(src, orjson.loads(data), int(ts))
+
+def read_capture(filename: str) -> Iterator[Update]:
+    """Synchronously yields every update in a text or binary capture file"""
+
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+
+        if detect_compression(f.read(HEADER_SIZE)) is not None:
+            yield from _read_compressed(filename)
+            return
+
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            if is_binary_capture(mapped[:len(MAGIC)]):
+                reader = BinaryCaptureReader()
+                for position in range(0, size, CHUNK_SIZE):
+                    yield from reader.feed(mapped[position:position + CHUNK_SIZE])
+                    if reader.done:
+                        return
+                return
+
+            tail = b""
+            for position in range(0, size, CHUNK_SIZE):
+                chunk = mapped[position:position + CHUNK_SIZE]
+                lines = (tail + chunk).split(b"\n") if tail else chunk.split(b"\n")
+                tail = lines.pop()
+                for line in lines:
+                    try:
+                        yield parse_line(line)
+                    except EOS:
+                        return
+
+            if len(tail.strip()) > 0:
+                yield parse_line(tail)
+
+def _read_compressed(filename: str) -> Iterator[Update]:
+    prefetcher = ChunkPrefetcher(open_capture(filename), CHUNK_SIZE)
+    try:
+        chunk = prefetcher.get()
+        if is_binary_capture(chunk):
+            reader = BinaryCaptureReader()
+            while len(chunk) > 0 and not reader.done:
+                yield from reader.feed(chunk)
+                chunk = prefetcher.get()
+            return
+
+        tail = b""
+        while len(chunk) > 0:
+            lines = (tail + chunk).split(b"\n") if tail else chunk.split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                try:
+                    yield parse_line(line)
+                except EOS:
+                    return
+            chunk = prefetcher.get()
+
+        if len(tail.strip()) > 0 and not prefetcher.truncated:
+            yield parse_line(tail)
+    finally:
+        prefetcher.close()
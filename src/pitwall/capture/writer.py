@@ -0,0 +1,236 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import BinaryIO
+
+from pitwall.capture.compression import COMPRESSION_EXTENSIONS, open_compressed
+from pitwall.capture.format import BinaryCaptureWriter
+
+FSYNC_POLICIES = ("commit", "close", "never")
+"""When CaptureWriter forces data to disk: after every group commit, only when a file is closed, or never (leaving it to the OS)"""
+
+class TextCaptureWriter:
+    """Appends `ts:src:json` lines to a text capture"""
+
+    _file: BinaryIO
+    _offset: int
+
+    def __init__(self, file: BinaryIO, offset: int = 0):
+        self._file = file
+        self._offset = offset
+
+    @classmethod
+    def open(cls, path: str, compression: str | None = None) -> "TextCaptureWriter":
+        """
+        Opens a capture for appending, first dropping the last line if it was only partly written.
+        A compressed capture is always started afresh.
+        """
+
+        if compression is not None:
+            return cls(open_compressed(path, compression, "wb"))
+
+        file = open(path, "a+b")
+        size = file.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - (1 << 16))
+            file.seek(start)
+            newline = file.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            file.truncate(end)
+        return cls(file, file.seek(0, os.SEEK_END))
+
+    def write(self, src: str, payload: bytes, ts: int) -> None:
+        line = f"{ts}:{src}:".encode("utf-8") + payload + b"\n"
+        self._file.write(line)
+        self._offset += len(line)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, sync: bool = False) -> None:
+        if sync:
+            self.sync()
+        self._file.close()
+
+class CaptureWriter:
+    """
+    Writes a capture on a background thread, so that whatever is receiving updates never waits on the disk.
+
+    Records queued by `write` are committed in groups: once `commit_bytes` of them have piled up, or
+    `commit_interval` seconds after the first uncommitted one, whichever comes first. `fsync` is one of
+    FSYNC_POLICIES. A file that grows past `max_bytes` is continued in a new part (`name.1.txt`,
+    `name.2.txt` and so on), and `open` switches to another file altogether, such as for a new session.
+    Captures can be written with any `compression` in COMPRESSION_EXTENSIONS, in which case `max_bytes`
+    counts the data before compression.
+
+    Opening a capture that already exists appends to its latest part, after dropping anything a crash
+    left half-written, so a recorder that's restarted carries on where it left off. (A compressed stream
+    that was cut off can't be appended to, so those continue in a new part instead.) If writing fails,
+    the error is raised from the next call to `write`.
+    """
+
+    path: str | None
+    "Capture being written, as of the last call to `open` or `end` (the thread may not have caught up yet)"
+
+    binary: bool
+    commit_bytes: int
+    commit_interval: float
+    fsync: str
+    max_bytes: int | None
+    compression: str | None
+
+    def __init__(self, path: str | None = None, binary: bool = False, commit_bytes: int = 1 << 20, commit_interval: float = 1.0,
+                 fsync: str = "commit", max_bytes: int | None = None, compression: str | None = None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync}; use one of {', '.join(FSYNC_POLICIES)}")
+        if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression {compression}; use one of {', '.join(COMPRESSION_EXTENSIONS)}")
+
+        self.path = None
+        self.binary = binary
+        self.commit_bytes = commit_bytes
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._base = None
+        self._part = 0
+        self._error = None
+        self._log = logging.getLogger(__name__)
+
+        self._thread = threading.Thread(target=self._run, name="CaptureWriter", daemon=True)
+        self._thread.start()
+        if path is not None:
+            self.open(path)
+
+    def open(self, path: str) -> None:
+        """Closes the current capture, if any, and starts writing to `path`"""
+
+        self.path = path
+        self._queue.put((_OPEN, path))
+
+    def end(self) -> None:
+        """Closes the current capture; records written before the next `open` are discarded"""
+
+        self.path = None
+        self._queue.put((_END,))
+
+    def write(self, ts: int, src: str, payload: bytes) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put((ts, src, payload))
+
+    def close(self) -> None:
+        """Writes out everything queued so far, closes the capture and stops the thread"""
+
+        self.path = None
+        self._queue.put((_STOP,))
+        self._thread.join()
+
+    def _run(self) -> None:
+        uncommitted = 0
+        deadline = None
+
+        while True:
+            try:
+                item = self._queue.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            try:
+                if item is None:
+                    pass
+                elif len(item) == 3:
+                    if self._file is None:
+                        continue
+                    if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+                        self._close_file()
+                        self._open_part(self._part + 1)
+
+                    (ts, src, payload) = item
+                    self._file.write(src, payload, ts)
+                    uncommitted += len(payload)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.commit_interval
+                    if uncommitted < self.commit_bytes:
+                        continue
+                elif item[0] == _OPEN:
+                    self._close_file()
+                    self._open(item[1])
+                elif item[0] == _END:
+                    self._close_file()
+                else:
+                    self._close_file()
+                    return
+
+                if self._file is not None and uncommitted > 0:
+                    if self.fsync == "commit":
+                        self._file.sync()
+                    else:
+                        self._file.flush()
+                uncommitted = 0
+                deadline = None
+            except Exception as e:
+                self._log.exception("Writing %s failed", self._base)
+                self._error = e
+                return
+
+    def _open(self, path: str) -> None:
+        # resume the latest part of an existing capture rather than overwriting the first
+        self._base = path
+        part = 0
+        while os.path.exists(self._part_path(part + 1)):
+            part += 1
+        if self.compression is not None and os.path.exists(self._part_path(part)) and os.path.getsize(self._part_path(part)) > 0:
+            part += 1
+        self._open_part(part)
+
+    def _open_part(self, part: int) -> None:
+        self._part = part
+        path = self._part_path(part)
+        if not self.binary:
+            self._file = TextCaptureWriter.open(path, self.compression)
+        elif self.compression is not None:
+            self._file = BinaryCaptureWriter(open_compressed(path, self.compression, "wb"))
+        else:
+            self._file = BinaryCaptureWriter.open(path)
+        self._log.info("Writing to %s", path)
+
+    def _part_path(self, part: int) -> str:
+        if part == 0:
+            return self._base
+        # name.1.txt.gz rather than name.txt.1.gz
+        suffix = COMPRESSION_EXTENSIONS.get(self.compression, "")
+        path = self._base
+        if len(suffix) > 0 and path.endswith(suffix):
+            path = path[:-len(suffix)]
+        else:
+            suffix = ""
+        (root, extension) = os.path.splitext(path)
+        return f"{root}.{part}{extension}{suffix}"
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            file = self._file
+            self._file = None
+            file.close(sync=self.fsync != "never")
+
+_OPEN = "open"
+_END = "end"
+_STOP = "stop"
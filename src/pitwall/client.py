@@ -1,30 +1,52 @@
+import base64
 import logging
-from typing import Any, Dict, List
-from collections.abc import Callable
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+from collections.abc import Callable, Coroutine, Iterable
 
-from pitwall.adapters.abstract import PitWallAdapter, Update
+import numpy as np
+import orjson
+
+from pitwall.adapters.abstract import EOS, PitWallAdapter, Update
+from pitwall.capture.reader import read_capture
 from pitwall.events import Driver, SessionChange, SessionProgress, RaceControlMessage, \
     TimingDatum, DriverStatusUpdate, SectorTimingDatum, SegmentTimingDatum, SessionStatus, \
     StintChange, TrackStatus, Clock, QualifyingSessionProgress, DriverPositionUpdate, \
-    SessionConfig, LapSessionProgress
-from pitwall.events.timing import LapTimingDatum, LeaderTimingDatum, IntervalTimingDatum
+    SessionConfig, LapSessionProgress, Heartbeat
+from pitwall.events.timing import LapTimingDatum, LeaderTimingDatum, IntervalTimingDatum, TimingKind, TIMING_BATCH_DTYPE, \
+    PERSONAL_FASTEST, OVERALL_FASTEST
+from pitwall.events.telemetry import PositionBatch, CarDataBatch
+from pitwall.metrics import Metrics
+from pitwall.state import SessionState
+
+CAR_DATA_CHANNELS = ("0", "2", "3", "4", "5", "45")
+"""CarData.z channel ids for RPM, speed, gear, throttle, brake and DRS, in the order they're decoded"""
 
 class PitWallClient:
 
+    update_callbacks: List[Callable[[Update], None]]
     session_change_callbacks: List[Callable[[SessionChange], None]]
     driver_data_callbacks: List[Callable[[List[Driver]], None]]
     session_progress_callbacks: List[Callable[[SessionProgress], None]]
     race_control_update_callbacks: List[Callable[[List[RaceControlMessage]], None]]
     timing_data_callbacks: List[Callable[[TimingDatum], None]]
+    timing_batch_callbacks: List[Callable[[np.ndarray], None]]
     driver_status_update_callbacks: List[Callable[[DriverStatusUpdate], None]]
     driver_position_update_callbacks: List[Callable[[DriverPositionUpdate], None]]
     session_status_callbacks: List[Callable[[SessionStatus], None]]
     stint_change_callbacks: List[Callable[[StintChange], None]]
     track_status_callbacks: List[Callable[[TrackStatus], None]]
     clock_callbacks: List[Callable[[Clock], None]]
+    heartbeat_callbacks: List[Callable[[Heartbeat], None]]
     session_config_callbacks: List[Callable[[SessionConfig], None]]
+    position_batch_callbacks: List[Callable[[PositionBatch], None]]
+    car_data_batch_callbacks: List[Callable[[CarDataBatch], None]]
     silent: bool
-
+    state: SessionState | None
+    "Merged state of every topic, if `track_state` has been called"
+    metrics: Metrics | None
+    "Where parse and callback times are recorded, if `instrument` has been called"
 
     def __init__(self, adapter : PitWallAdapter = None):
         if adapter is not None:
@@ -38,104 +60,288 @@ class PitWallClient:
         self.session_progress_callbacks = list()
         self.race_control_update_callbacks = list()
         self.timing_data_callbacks = list()
+        self.timing_batch_callbacks = list()
         self.driver_status_update_callbacks = list()
         self.driver_position_update_callbacks = list()
         self.session_status_callbacks = list()
         self.stint_change_callbacks = list()
         self.track_status_callbacks = list()
         self.clock_callbacks = list()
+        self.heartbeat_callbacks = list()
         self.session_config_callbacks = list()
+        self.position_batch_callbacks = list()
+        self.car_data_batch_callbacks = list()
         self.silent = False
+        self.state = None
+        self.metrics = None
+        self._pending = list()
+        self._build_dispatch()
 
     async def go(self) -> None:
         self._logger.info("Starting")
-        await self.adapter.run()
+        try:
+            await self.adapter.run()
+            await self.adapter.drain()
+        finally:
+            self.adapter.close()
 
     async def load(self, updates: List[Update]) -> None:
         self.silent = True
         try:
             for update in updates:
-                await self._update(update)
+                self._process(update)
         finally:
             self.silent = False
 
+    def ingest(self, source: Iterable[Update] | str) -> int:
+        """
+        Synchronously processes every update from an iterable (or a capture file, if given a path),
+        firing callbacks as it goes, and returns the number of updates processed. Intended for offline
+        analysis, where there's nothing to gain from going through the event loop for each update.
+        """
+
+        if isinstance(source, str):
+            source = read_capture(source)
+
+        count = 0
+        process = self._process
+        for update in source:
+            process(update)
+            if len(self.update_callbacks) > 0:
+                self._fire_callbacks(self.update_callbacks, update)
+            if len(self._pending) > 0:
+                self._discard_pending()
+                raise TypeError("Coroutine callbacks can't be awaited by ingest(); use go() instead")
+            count += 1
+        return count
+
+    def track_state(self) -> SessionState:
+        """
+        Starts merging every update into `state`, so that the session as of the latest update can be read
+        directly instead of rebuilt from events. Off by default, since it means decoding every update.
+        """
+
+        if self.state is None:
+            self.state = SessionState()
+        return self.state
+
+    def instrument(self, metrics: Metrics) -> Metrics:
+        """
+        Starts recording how long each update takes to handle and how long each callback takes in
+        `metrics`, along with the adapter's update counts and queue depths. The measuring versions of
+        the hot path are swapped in here, so an uninstrumented client doesn't even check for them.
+        """
+
+        self.metrics = metrics
+        self._process = self._process_measured
+        self._fire_callbacks = self._fire_callbacks_measured
+        if hasattr(self, "adapter"):
+            self.adapter.instrument(metrics)
+        return metrics
+
+    def on_update(self, callback: Callable[[Update], None]) -> None:
+        """
+        Receives every update once the client has finished with it: after every event it fired has been
+        handled, including awaiting any coroutine callbacks
+        """
+        self._subscribe(self.update_callbacks, callback)
+
     def on_session_change(self, session_change_callback: Callable[[SessionChange], None]):
-        self.session_change_callbacks.append(session_change_callback)
+        self._subscribe(self.session_change_callbacks, session_change_callback)
 
     def on_driver_data(self, callback: Callable[[List[Driver]], None]) -> None:
-        self.driver_data_callbacks.append(callback)
+        self._subscribe(self.driver_data_callbacks, callback)
 
     def on_session_progress(self, callback: Callable[[SessionProgress], None]) -> None:
-        self.session_progress_callbacks.append(callback)
+        self._subscribe(self.session_progress_callbacks, callback)
 
     def on_race_control_update(self, callback: Callable[[List[RaceControlMessage]], None]) -> None:
-        self.race_control_update_callbacks.append(callback)
+        self._subscribe(self.race_control_update_callbacks, callback)
 
     def on_timing_datum(self, callback: Callable[[TimingDatum], None]) -> None:
-        self.timing_data_callbacks.append(callback)
+        self._subscribe(self.timing_data_callbacks, callback)
+
+    def on_timing_batch(self, callback: Callable[[np.ndarray], None]) -> None:
+        """
+        Receives everything a TimingData update would fire as timing data, as one structured array
+        laid out as `TIMING_BATCH_DTYPE`, for consumers that would rather vectorize than handle each datum
+        """
+        self._subscribe(self.timing_batch_callbacks, callback)
 
     def on_driver_status_update(self, callback: Callable[[DriverStatusUpdate], None]) -> None:
-        self.driver_status_update_callbacks.append(callback)
+        self._subscribe(self.driver_status_update_callbacks, callback)
 
     def on_driver_position_update(self, callback: Callable[[DriverPositionUpdate], None]) -> None:
-        self.driver_position_update_callbacks.append(callback)
+        self._subscribe(self.driver_position_update_callbacks, callback)
 
     def on_session_status(self, callback: Callable[[SessionStatus], None]) -> None:
-        self.session_status_callbacks.append(callback)
+        self._subscribe(self.session_status_callbacks, callback)
 
     def on_stint_change(self, callback: Callable[[StintChange], None]) -> None:
-        self.stint_change_callbacks.append(callback)
+        self._subscribe(self.stint_change_callbacks, callback)
 
     def on_track_status(self, callback: Callable[[TrackStatus], None]) -> None:
-        self.track_status_callbacks.append(callback)
+        self._subscribe(self.track_status_callbacks, callback)
 
     def on_clock(self, callback: Callable[[Clock], None]) -> None:
-        self.clock_callbacks.append(callback)
+        self._subscribe(self.clock_callbacks, callback)
+
+    def on_heartbeat(self, callback: Callable[[Heartbeat], None]) -> None:
+        self._subscribe(self.heartbeat_callbacks, callback)
 
     def on_session_config(self, callback: Callable[[SessionConfig], None]) -> None:
-        self.session_config_callbacks.append(callback)
+        self._subscribe(self.session_config_callbacks, callback)
+
+    def on_position_batch(self, callback: Callable[[PositionBatch], None]) -> None:
+        self._subscribe(self.position_batch_callbacks, callback)
+
+    def on_car_data_batch(self, callback: Callable[[CarDataBatch], None]) -> None:
+        self._subscribe(self.car_data_batch_callbacks, callback)
+
+    def _subscribe(self, callbacks: List[Callable[[Any], None]], callback: Callable[[Any], None]) -> None:
+        callbacks.append(callback)
+        self._build_dispatch()
+
+    def _build_dispatch(self) -> None:
+        """Rebuilds the topic -> handler table, leaving out any topic whose events nobody has subscribed to"""
+
+        handlers: Dict[str, Tuple[Callable[[Any], None], List[List[Callable[[Any], None]]]]] = {
+            "init": (self._handle_init, [self.driver_data_callbacks, self.session_change_callbacks, self.stint_change_callbacks,
+                                         self.driver_position_update_callbacks, self.session_progress_callbacks,
+                                         self.race_control_update_callbacks, self.session_config_callbacks,
+                                         self.position_batch_callbacks, self.car_data_batch_callbacks, self.heartbeat_callbacks]),
+            "SessionInfo": (lambda data: self._fire_callbacks(self.session_change_callbacks, self._parse_session(data)),
+                            [self.session_change_callbacks]),
+            "DriverList": (lambda data: self._fire_callbacks(self.driver_data_callbacks, self._parse_drivers(data)),
+                           [self.driver_data_callbacks]),
+            "SessionData": (self._parse_session_data, [self.session_progress_callbacks]),
+            "RaceControlMessages": (lambda data: self._parse_messages(data["Messages"]), [self.race_control_update_callbacks]),
+            "TimingData": (self._handle_timing_data, [self.timing_data_callbacks, self.driver_status_update_callbacks,
+                                                      self.driver_position_update_callbacks, self.timing_batch_callbacks]),
+            "SessionStatus": (lambda data: self._fire_callbacks(self.session_status_callbacks, SessionStatus(data["Status"])),
+                              [self.session_status_callbacks]),
+            "TimingAppData": (self._parse_stints, [self.stint_change_callbacks, self.driver_position_update_callbacks]),
+            "TimingStats": (self._parse_stints, [self.stint_change_callbacks, self.driver_position_update_callbacks]),
+            "TrackStatus": (lambda data: self._fire_callbacks(self.track_status_callbacks, TrackStatus(int(data["Status"]), data["Message"])),
+                            [self.track_status_callbacks]),
+            "ExtrapolatedClock": (lambda data: self._fire_callbacks(self.clock_callbacks, Clock(data["Remaining"])),
+                                  [self.clock_callbacks]),
+            "Position.z": (lambda data: self._fire_callbacks(self.position_batch_callbacks, self._parse_positions(data)),
+                           [self.position_batch_callbacks]),
+            "CarData.z": (lambda data: self._fire_callbacks(self.car_data_batch_callbacks, self._parse_car_data(data)),
+                          [self.car_data_batch_callbacks]),
+            "Heartbeat": (lambda data: self._fire_callbacks(self.heartbeat_callbacks, self._parse_heartbeat(data)),
+                          [self.heartbeat_callbacks]),
+            # WeatherData and TeamRadio aren't handled
+        }
+
+        self._dispatch = dict([(src, handler) for src, (handler, callbacks) in handlers.items() if any(callbacks)])
 
     async def _update(self, update: Update):
+        self._process(update)
+        if len(self._pending) > 0:
+            await self._await_pending()
+        if len(self.update_callbacks) > 0:
+            self._fire_callbacks(self.update_callbacks, update)
+            if len(self._pending) > 0:
+                await self._await_pending()
+
+    async def _await_pending(self) -> None:
+        """Awaits the coroutines returned by callbacks during the last update, in the order they were fired"""
+
+        (pending, self._pending) = (self._pending, list())
+        for i, coroutine in enumerate(pending):
+            try:
+                await coroutine
+            except EOS:
+                self._pending = pending[i + 1:]
+                self._discard_pending()
+                raise
+            except Exception:
+                self._logger.exception("Callback failed")
+
+    def _discard_pending(self) -> None:
+        for coroutine in self._pending:
+            coroutine.close()
+        self._pending = list()
+
+    def _process(self, update: Update) -> None:
+        if self.state is not None:
+            self.state.apply(update)
+        handler = self._dispatch.get(update.src)
+        if handler is not None:
+            handler(update.data)
+
+    def _process_measured(self, update: Update) -> None:
+        metrics = self.metrics
+        callback_time = metrics.callback_time
+        start = time.perf_counter()
+        PitWallClient._process(self, update)
+        elapsed = time.perf_counter() - start
+        metrics.parse_seconds[update.src].observe(elapsed - (metrics.callback_time - callback_time))
+
+    def _handle_init(self, data: Dict[str, Any]) -> None:
         # should this be an entirely separate event, rather than a magic string?
-        if update.src == "init":
-            self._fire_callbacks(self.driver_data_callbacks, self._parse_drivers(update.data["DriverList"]))
-            self._fire_callbacks(self.session_change_callbacks, self._parse_session(update.data["SessionInfo"]))
-            self._parse_stints(update.data["TimingAppData"])
-            self._parse_session_data(update.data["SessionData"])
-            # sometimes it's after the initial subscribe, but in the init format
-            if "RaceControlMessages" in update.data:
-                self._parse_messages(update.data["RaceControlMessages"]["Messages"])
-            self._parse_track_config(update.data["TimingData"])
-        elif update.src == "SessionInfo":
-            self._fire_callbacks(self.session_change_callbacks, self._parse_session(update.data))
-        elif update.src == "DriverList":
-            self._fire_callbacks(self.driver_data_callbacks, self._parse_drivers(update.data))
-        elif update.src == "SessionData":
-            self._parse_session_data(update.data)
-        elif update.src == "RaceControlMessages":
-            self._parse_messages(update.data["Messages"])
-        elif update.src == "TimingData":
-            self._handle_timing_data(update.data)
-        elif update.src == "SessionStatus":
-            self._fire_callbacks(self.session_status_callbacks, SessionStatus(update.data["Status"]))
-        elif update.src == "TimingAppData" or update.src == "TimingStats":
-            self._parse_stints(update.data)
-        elif update.src == "TrackStatus":
-            self._fire_callbacks(self.track_status_callbacks, TrackStatus(int(update.data["Status"]), update.data["Message"]))
-        elif update.src == "ExtrapolatedClock":
-            self._fire_callbacks(self.clock_callbacks, Clock(update.data["Remaining"]))
-        # elif update.src in ["Heartbeat", "WeatherData", "TeamRadio"]:
+        self._fire_callbacks(self.driver_data_callbacks, self._parse_drivers(data["DriverList"]))
+        self._fire_callbacks(self.session_change_callbacks, self._parse_session(data["SessionInfo"]))
+        self._parse_stints(data["TimingAppData"])
+        self._parse_session_data(data["SessionData"])
+        # sometimes it's after the initial subscribe, but in the init format
+        if "RaceControlMessages" in data:
+            self._parse_messages(data["RaceControlMessages"]["Messages"])
+        self._parse_track_config(data["TimingData"])
+        if "Position.z" in data and len(self.position_batch_callbacks) > 0:
+            self._fire_callbacks(self.position_batch_callbacks, self._parse_positions(data["Position.z"]))
+        if "CarData.z" in data and len(self.car_data_batch_callbacks) > 0:
+            self._fire_callbacks(self.car_data_batch_callbacks, self._parse_car_data(data["CarData.z"]))
+        if "Heartbeat" in data and len(self.heartbeat_callbacks) > 0:
+            self._fire_callbacks(self.heartbeat_callbacks, self._parse_heartbeat(data["Heartbeat"]))
 
     def _fire_callbacks(self, callbacks: List[Callable[[Any], None]], payload: Any) -> None:
         if self.silent:
             return
 
         for callback in callbacks:
-            callback(payload)
+            # one subscriber failing shouldn't stop the rest from hearing about it
+            try:
+                result = callback(payload)
+            except EOS:
+                # nothing will await what the callbacks before this one returned
+                self._discard_pending()
+                raise
+            except Exception:
+                self._logger.exception("Callback %r failed on %r", callback, payload)
+                continue
+
+            if isinstance(result, Coroutine):
+                self._pending.append(result)
+
+    def _fire_callbacks_measured(self, callbacks: List[Callable[[Any], None]], payload: Any) -> None:
+        if self.silent:
+            return
+
+        for callback in callbacks:
+            start = time.perf_counter()
+            try:
+                result = callback(payload)
+            except EOS:
+                self._discard_pending()
+                raise
+            except Exception:
+                self._logger.exception("Callback %r failed on %r", callback, payload)
+                continue
+            finally:
+                self.metrics.observe_callback(callback, time.perf_counter() - start)
+
+            if isinstance(result, Coroutine):
+                self._pending.append(result)
 
     def _parse_session(self, data: Dict[str, Any]) -> SessionChange:
         return SessionChange(data["Meeting"]["Name"], data["Name"], data["ArchiveStatus"]["Status"])
     
+    def _parse_heartbeat(self, data: Dict[str, Any]) -> Heartbeat:
+        return Heartbeat(int(_parse_utc([data["Utc"]])[0]))
+
     def _parse_drivers(self, driver_data) -> List[Driver]:
         drivers = list()
         if isinstance(driver_data, dict):
@@ -157,59 +363,90 @@ class PitWallClient:
         return drivers
 
     def _handle_timing_data(self, data) -> None:
-        """Handles TimingData, fires DriverPositionUpdate, DriverStatusUpdate, SectorTimingDatum, SegmentTimingDatum, and LapTimingDatum"""
+        """
+        Handles TimingData, fires DriverPositionUpdate, DriverStatusUpdate, SectorTimingDatum, SegmentTimingDatum, and LapTimingDatum,
+        plus a single timing batch with all of the timing data
+        """
 
-        for driver_id in data["Lines"].keys():
-            driver: Dict[str, Any] = data["Lines"][driver_id]
+        if self.silent:
+            return
+
+        # TimingData is most of the feed, so don't build any events that nobody's going to receive
+        positions = len(self.driver_position_update_callbacks) > 0
+        timing = len(self.timing_data_callbacks) > 0
+        statuses = len(self.driver_status_update_callbacks) > 0
+        batch = len(self.timing_batch_callbacks) > 0
+        rows = list()
 
+        for driver_id, driver in data["Lines"].items():
             if "Position" in driver:
-                self._fire_callbacks(self.driver_position_update_callbacks, DriverPositionUpdate(int(driver_id), int(driver["Position"])))
+                if positions:
+                    self._fire_callbacks(self.driver_position_update_callbacks, DriverPositionUpdate(int(driver_id), int(driver["Position"])))
+                continue
+
+            if not (timing or statuses or batch):
                 continue
-                
+
             if "LastLapTime" in driver and "NumberOfLaps" in driver: # the latter can still be false; it won't include the lap time either
-                self._fire_callbacks(self.timing_data_callbacks, LapTimingDatum(int(driver_id),
-                                                                               driver["NumberOfLaps"],
-                                                                               driver["LastLapTime"].get("PersonalFastest", False),
-                                                                               driver["LastLapTime"].get("OverallFastest", False),
-                                                                               driver["LastLapTime"]["Value"])) # bug: str, not a float
-            
+                lap = driver["LastLapTime"]
+                if timing:
+                    self._fire_callbacks(self.timing_data_callbacks, LapTimingDatum(int(driver_id),
+                                                                                   driver["NumberOfLaps"],
+                                                                                   lap.get("PersonalFastest", False),
+                                                                                   lap.get("OverallFastest", False),
+                                                                                   lap["Value"])) # bug: str, not a float
+                if batch:
+                    rows.append((int(driver_id), TimingKind.LAP, 0, 0, driver["NumberOfLaps"], _parse_lap_time(lap["Value"]),
+                                 _flags(lap.get("PersonalFastest", False), lap.get("OverallFastest", False))))
+
             if "Sectors" not in driver:
-                if "Status" in driver or "Stopped" in driver:
+                if statuses and ("Status" in driver or "Stopped" in driver):
                     self._fire_callbacks(self.driver_status_update_callbacks, DriverStatusUpdate(int(driver_id), None, driver.get("Retired", None), driver.get("Stopped", None), driver["Status"]))
-                
+
+                if not (timing or batch):
+                    continue
+
                 if "GapToLeader" in driver and driver["GapToLeader"] != "":
                     if str.startswith(driver["GapToLeader"], "LAP"):
                         time = 0
-                    elif str.endswith(driver["GapToLeader"], " L"):
-                        # TODO: it's "1 L" meaning lapped once, but I don't know how to represent that
+                    elif str.endswith(driver["GapToLeader"], "L"):
+                        # TODO: it's "1 L" (or "1L") meaning lapped once, but I don't know how to represent that
                         time = 999
                     else:
                         time = float(driver["GapToLeader"][1:])
-                    self._fire_callbacks(self.timing_data_callbacks, LeaderTimingDatum(int(driver_id), time))
+                    if timing:
+                        self._fire_callbacks(self.timing_data_callbacks, LeaderTimingDatum(int(driver_id), time))
+                    if batch:
+                        rows.append((int(driver_id), TimingKind.LEADER, 0, 0, 0, time, 0))
 
                 # sometimes it has a Catching bool property instead of a time, which I don't know the meaning of
-                if "IntervalToPositionAhead" in driver and "Value" in driver["IntervalToPositionAhead"]:
+                if "IntervalToPositionAhead" in driver and driver["IntervalToPositionAhead"].get("Value", "") != "":
                     if str.startswith(driver["IntervalToPositionAhead"]["Value"], "LAP"):
                         time = 0
+                    elif str.endswith(driver["IntervalToPositionAhead"]["Value"], "L"):
+                        time = 999
                     else:
                         time = float(driver["IntervalToPositionAhead"]["Value"][1:])
-                    self._fire_callbacks(self.timing_data_callbacks, IntervalTimingDatum(int(driver_id), time))
-                
+                    if timing:
+                        self._fire_callbacks(self.timing_data_callbacks, IntervalTimingDatum(int(driver_id), time))
+                    if batch:
+                        rows.append((int(driver_id), TimingKind.INTERVAL, 0, 0, 0, time, 0))
+
                 continue
 
             # happens at the start of the race to reset everyone, for some reason it's not a dict
             if isinstance(driver["Sectors"], list):
                 driver["Sectors"] = dict([(i, x) for i, x in enumerate(driver["Sectors"])])
 
-            for sector_id in driver["Sectors"].keys():
-                sector = driver["Sectors"][sector_id]
+            for sector_id, sector in driver["Sectors"].items():
                 sector_id = int(sector_id)
 
                 if "Stopped" in sector:
-                    self._fire_callbacks(self.driver_status_update_callbacks, DriverStatusUpdate(int(driver_id), sector_id + 1, False, True, None))
+                    if statuses:
+                        self._fire_callbacks(self.driver_status_update_callbacks, DriverStatusUpdate(int(driver_id), sector_id + 1, False, True, None))
                     continue
-                
-                elif "PreviousValue" in sector:
+
+                elif "PreviousValue" in sector or not (timing or batch):
                     continue
 
                 overall_fastest = "OverallFastest" in sector
@@ -219,27 +456,36 @@ class PitWallClient:
                     # print(f"\t{sector}")
                     if "Value" in sector and sector["Value"] != "":
                         # if not, I think it's JUST OverallFastest=false to clear someone's previous True?
-                        self._fire_callbacks(self.timing_data_callbacks, SectorTimingDatum(int(driver_id),
-                                                                                          sector_id + 1,
-                                                                                          personal_fastest,
-                                                                                          overall_fastest,
-                                                                                          float(sector["Value"])))
+                        if timing:
+                            self._fire_callbacks(self.timing_data_callbacks, SectorTimingDatum(int(driver_id),
+                                                                                              sector_id + 1,
+                                                                                              personal_fastest,
+                                                                                              overall_fastest,
+                                                                                              float(sector["Value"])))
+                        if batch:
+                            rows.append((int(driver_id), TimingKind.SECTOR, sector_id + 1, 0, 0, float(sector["Value"]),
+                                         _flags(personal_fastest, overall_fastest)))
                     continue
-                
+
                 if isinstance(sector["Segments"], list): # same as the above one for driver[Sectors]
                     sector["Segments"] = dict([(i, x) for i, x in enumerate(sector["Segments"])])
 
-                for segment_id in sector["Segments"].keys(): # order these?
-                    segment = sector["Segments"][segment_id]
+                for segment_id, segment in sector["Segments"].items(): # order these?
                     segment_id = int(segment_id)
                     status: int = segment["Status"]
-                    self._fire_callbacks(self.timing_data_callbacks, SegmentTimingDatum(int(driver_id), sector_id + 1, segment_id + 1, status))
+                    if timing:
+                        self._fire_callbacks(self.timing_data_callbacks, SegmentTimingDatum(int(driver_id), sector_id + 1, segment_id + 1, status))
+                    if batch:
+                        rows.append((int(driver_id), TimingKind.SEGMENT, sector_id + 1, segment_id + 1, status, np.nan, 0))
+
+        if batch and len(rows) > 0:
+            self._fire_callbacks(self.timing_batch_callbacks, np.array(rows, dtype=TIMING_BATCH_DTYPE))
 
     def _parse_stints(self, data) -> None:
         for driver_id in data["Lines"].keys():
             driver_line = data["Lines"][driver_id]
 
-            if "Stints" in driver_line:
+            if "Stints" in driver_line and len(self.stint_change_callbacks) > 0:
                 for stint_number in driver_line["Stints"]:
                     if isinstance(stint_number, dict): # stint 0
                         self._fire_callbacks(self.stint_change_callbacks, StintChange(int(driver_id), 1, stint_number["Compound"]))
@@ -291,3 +537,66 @@ class PitWallClient:
                   2: len(sample["Sectors"][1]["Segments"]),
                   3: len(sample["Sectors"][2]["Segments"])}
         self._fire_callbacks(self.session_config_callbacks, SessionConfig(layout))
+
+    def _parse_positions(self, payload: str) -> PositionBatch:
+        drivers = list()
+        times = list()
+        counts = list()
+        samples = list()
+        for entry in _inflate(payload)["Position"]:
+            cars = entry["Entries"]
+            times.append(entry["Timestamp"])
+            counts.append(len(cars))
+            drivers.extend(cars.keys())
+            samples.extend([(car["X"], car["Y"], car["Z"], car["Status"] == "OnTrack") for car in cars.values()])
+
+        columns = np.array(samples, dtype=np.int32).reshape(-1, 4)
+        return PositionBatch(np.array(drivers, dtype=np.int16),
+                             np.repeat(_parse_utc(times), counts),
+                             columns[:, 0],
+                             columns[:, 1],
+                             columns[:, 2],
+                             columns[:, 3].astype(np.bool_))
+
+    def _parse_car_data(self, payload: str) -> CarDataBatch:
+        drivers = list()
+        times = list()
+        counts = list()
+        samples = list()
+        for entry in _inflate(payload)["Entries"]:
+            cars = entry["Cars"]
+            times.append(entry["Utc"])
+            counts.append(len(cars))
+            drivers.extend(cars.keys())
+            for car in cars.values():
+                channels = car["Channels"]
+                samples.append([channels.get(c, 0) for c in CAR_DATA_CHANNELS])
+
+        columns = np.array(samples, dtype=np.int32).reshape(-1, len(CAR_DATA_CHANNELS))
+        return CarDataBatch(np.array(drivers, dtype=np.int16),
+                            np.repeat(_parse_utc(times), counts),
+                            columns[:, 1].astype(np.int16),
+                            columns[:, 0],
+                            columns[:, 2].astype(np.int8),
+                            columns[:, 3].astype(np.int16),
+                            columns[:, 4].astype(np.int16),
+                            columns[:, 5].astype(np.int16))
+
+def _inflate(payload: str) -> Dict[str, Any]:
+    """Decodes the .z topics, which are base64-encoded raw deflate streams of the usual JSON"""
+    return orjson.loads(zlib.decompress(base64.b64decode(payload), -zlib.MAX_WBITS))
+
+def _parse_lap_time(value: str) -> float:
+    """Parses a lap time such as 1:23.456 into seconds"""
+
+    if value == "":
+        return np.nan
+    (minutes, _, seconds) = value.rpartition(":")
+    return int(minutes or 0) * 60 + float(seconds)
+
+def _flags(personal_fastest: bool, overall_fastest: bool) -> int:
+    return (PERSONAL_FASTEST if personal_fastest else 0) | (OVERALL_FASTEST if overall_fastest else 0)
+
+def _parse_utc(timestamps: List[str]) -> np.ndarray:
+    # numpy parses ISO-8601 itself, it just doesn't accept the trailing Z
+    return np.array([t.rstrip("Z") for t in timestamps], dtype="datetime64[ns]").astype(np.int64)
@@ -1,7 +1,9 @@
 from .session import SessionChange as SessionChange, SessionProgress as SessionProgress, RaceControlMessage as RaceControlMessage, \
-    SessionStatus as SessionStatus, TrackStatus as TrackStatus, Clock as Clock, QualifyingSessionProgress as QualifyingSessionProgress, \
+    SessionStatus as SessionStatus, TrackStatus as TrackStatus, Clock as Clock, Heartbeat as Heartbeat, QualifyingSessionProgress as QualifyingSessionProgress, \
     SessionConfig as SessionConfig, LapSessionProgress as LapSessionProgress
 from .drivers import Driver as Driver
 from .timing import TimingDatum as TimingDatum, LapTimingDatum as LapTimingDatum, SectorTimingDatum as SectorTimingDatum, \
                     SegmentTimingDatum as SegmentTimingDatum, DriverStatusUpdate as DriverStatusUpdate, StintChange as StintChange, \
-                    DriverPositionUpdate as DriverPositionUpdate, LeaderTimingDatum as LeaderTimingDatum, IntervalTimingDatum as IntervalTimingDatum
\ No newline at end of file
+                    DriverPositionUpdate as DriverPositionUpdate, LeaderTimingDatum as LeaderTimingDatum, IntervalTimingDatum as IntervalTimingDatum, \
+                    TimingKind as TimingKind, TIMING_BATCH_DTYPE as TIMING_BATCH_DTYPE
+from .telemetry import PositionBatch as PositionBatch, CarDataBatch as CarDataBatch
\ No newline at end of file
@@ -40,6 +40,11 @@ class TrackStatus:
 class Clock:
     remaining: str
 
+@dataclass
+class Heartbeat:
+    utc: int
+    "The feed server's clock, in Unix time (ns)"
+
 @dataclass
 class SessionConfig:
     layout: Dict[int, int]
\ No newline at end of file
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+@dataclass
+class PositionBatch:
+    """
+    Every car position sample from one Position.z message, as parallel arrays with one row per
+    driver per sample
+    """
+
+    driver_id: np.ndarray
+    "int16 racing numbers"
+    timestamp: np.ndarray
+    "int64 sample times, in Unix ns"
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    "int32 track coordinates, in what appear to be decimetres"
+    on_track: np.ndarray
+    "bool, False when the car's Status is OffTrack"
+
+    def __len__(self) -> int:
+        return len(self.driver_id)
+
+@dataclass
+class CarDataBatch:
+    """Every car telemetry sample from one CarData.z message, laid out like PositionBatch"""
+
+    driver_id: np.ndarray
+    timestamp: np.ndarray
+    speed: np.ndarray
+    "int16, km/h"
+    rpm: np.ndarray
+    "int32"
+    gear: np.ndarray
+    "int8, 0 for neutral"
+    throttle: np.ndarray
+    "int16, 0-100 (sometimes reported as 104)"
+    brake: np.ndarray
+    "int16, 0 or 100"
+    drs: np.ndarray
+    """
+    int16 DRS state. Guesses:
+    - 0/1: Off
+    - 8: Eligible in the next zone
+    - 10/12/14: Open
+    """
+
+    def __len__(self) -> int:
+        return len(self.driver_id)
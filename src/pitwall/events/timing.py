@@ -1,4 +1,7 @@
 from dataclasses import dataclass
+from enum import IntEnum
+
+import numpy as np
 
 type TimingDatum = SegmentTimingDatum | SectorTimingDatum | LapTimingDatum | IntervalTimingDatum | LeaderTimingDatum
 
@@ -45,6 +48,33 @@ class LeaderTimingDatum:
     driver_id: int
     time_to_leader: float
 
+class TimingKind(IntEnum):
+    """Which TimingDatum a row of a timing batch stands for"""
+
+    SEGMENT = 0
+    SECTOR = 1
+    LAP = 2
+    INTERVAL = 3
+    LEADER = 4
+
+PERSONAL_FASTEST = 1
+OVERALL_FASTEST = 2
+"Bits of a timing batch row's flags"
+
+TIMING_BATCH_DTYPE = np.dtype([("driver_id", np.int16),
+                               ("kind", np.uint8),
+                               ("sector", np.int8),
+                               ("segment", np.int8),
+                               ("status", np.int32),
+                               ("time", np.float64),
+                               ("flags", np.uint8)])
+"""
+Row layout of the structured arrays passed to `on_timing_batch`, with one row per TimingDatum that the
+update would have fired. Sectors and segments are numbered from 1 and are 0 where they don't apply;
+`status` is the segment status for segments and the lap number for laps; `time` is in seconds (NaN if
+the feed left it blank).
+"""
+
 @dataclass
 class DriverStatusUpdate:
     driver_id: int
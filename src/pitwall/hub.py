@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+
+from pitwall.adapters.abstract import PitWallAdapter, Update
+from pitwall.capture.format import MAGIC, RECORD_HEADER, TOPIC_DEFINITION
+from pitwall.state import SessionState
+
+class HubClient:
+    """A connected consumer, fed through a queue so that a slow one can't hold up the rest"""
+
+    id: int
+    "Number the hub gave the client when it connected, unique for the hub's lifetime"
+    queue: asyncio.Queue
+    writer: asyncio.StreamWriter
+    task: asyncio.Task | None
+    dropped: bool
+    "Whether the hub cancelled the task because it fell too far behind"
+
+    def __init__(self, id: int, writer: asyncio.StreamWriter, buffer: int):
+        self.id = id
+        self.queue = asyncio.Queue(buffer)
+        self.writer = writer
+        self.task = None
+        self.dropped = False
+
+    def __repr__(self) -> str:
+        return f"HubClient({self.id}, {self.writer.get_extra_info('peername')!r}, {self.queue.qsize()} queued)"
+
+class HubServer:
+    """
+    Serves the updates from one adapter to any number of local consumers (see HubAdapter), so that they
+    can all share a single upstream connection.
+
+    Updates are sent in the binary capture format, encoded once and written to every client. A client
+    that connects partway through first receives the merged session state, then the live updates from
+    that point on. A client that falls more than `buffer` updates behind is disconnected.
+    """
+
+    clients: List[HubClient]
+    state: SessionState
+    _adapter: PitWallAdapter
+    _buffer: int
+    _topics: Dict[str, int]
+    _server: asyncio.Server | None
+    _last_ts: int
+    _connected: int
+    "Number of clients that have ever connected, for numbering them"
+
+    def __init__(self, adapter: PitWallAdapter, buffer: int = 10000):
+        self._adapter = adapter
+        self._adapter.on_message(self._on_message)
+        self._buffer = buffer
+        self._topics = dict()
+        self._server = None
+        self._last_ts = 0
+        self._connected = 0
+        self.clients = list()
+        self.state = SessionState()
+        self._log = logging.getLogger(__name__)
+
+    async def serve(self, address: str) -> None:
+        """Listens on the given address (`unix:///path/to/socket` or `tcp://host:port`) and forwards updates until the adapter finishes"""
+
+        await self.start(address)
+        await self.run()
+
+    async def start(self, address: str) -> None:
+        (scheme, location) = parse_address(address)
+        if scheme == "unix":
+            if os.path.exists(location):
+                os.remove(location)
+            self._server = await asyncio.start_unix_server(self._on_connect, location)
+        else:
+            self._server = await asyncio.start_server(self._on_connect, *location)
+        self._log.info("Listening on %s", address)
+
+    async def run(self) -> None:
+        try:
+            await self._adapter.run()
+        finally:
+            self._server.close()
+            for client in list(self.clients):
+                self._disconnect(client)
+            await self._server.wait_closed()
+            self._log.info("Upstream finished")
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Records waiting to be sent to each client, for Metrics.watch"""
+
+        # numbered rather than named by peer, since every unix socket peer is ''
+        return dict((f"HubServer.client[{client.id}]", client.queue.qsize()) for client in self.clients)
+
+    async def _on_message(self, update: Update) -> None:
+        self.state.apply(update)
+        self._last_ts = update.ts
+
+        if len(self.clients) == 0:
+            return
+
+        backlog = self._broadcast(self._encode(update))
+
+        # a source that never suspends (like a capture file) would otherwise fill every queue before any
+        # client gets to run, so give them a turn; one that's still falling behind is only slow
+        if backlog > self._buffer // 2:
+            await asyncio.sleep(0)
+
+    def _broadcast(self, data: bytes) -> int:
+        """Queues data for every client, disconnecting any that are too far behind, and returns the longest queue"""
+
+        backlog = 0
+        for client in list(self.clients):
+            try:
+                client.queue.put_nowait(data)
+                backlog = max(backlog, client.queue.qsize())
+            except asyncio.QueueFull:
+                self._log.warning("%r fell too far behind, disconnecting it", client)
+                self._disconnect(client)
+        return backlog
+
+    def _encode(self, update: Update) -> bytes:
+        topic_id = self._topics.get(update.src)
+        if topic_id is None:
+            # new topics are defined as part of the record, so every client learns about them in order
+            return self._define(update.src) + _record(self._topics[update.src], update.ts, update.raw)
+        return _record(topic_id, update.ts, update.raw)
+
+    def _define(self, src: str) -> bytes:
+        topic_id = self._topics[src] = len(self._topics)
+        return _topic_definition(src, topic_id)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = HubClient(self._connected, writer, self._buffer)
+        self._connected += 1
+        client.task = asyncio.current_task()
+
+        # build the catch-up and register in one go, without yielding, so that nothing falls between them
+        records = list()
+        for update in self.state.catch_up(self._last_ts):
+            if update.src not in self._topics:
+                # the clients already connected need the definition too, in case the topic turns up live later
+                self._broadcast(self._define(update.src))
+            records.append(_record(self._topics[update.src], update.ts, update.raw))
+        header = [MAGIC]
+        for src, topic_id in self._topics.items():
+            header.append(_topic_definition(src, topic_id))
+        client.queue.put_nowait(b"".join(header + records))
+        self.clients.append(client)
+        self._log.info("%r connected", client)
+
+        try:
+            while (record := await client.queue.get()) is not None:
+                records = [record]
+                # send everything that's waiting in one write
+                while not client.queue.empty() and (record := client.queue.get_nowait()) is not None:
+                    records.append(record)
+                writer.write(b"".join(records))
+                await writer.drain()
+                if record is None:
+                    break
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # _disconnect cancels a client it couldn't queue the end for; anything else is passed on
+            if not client.dropped:
+                raise
+            asyncio.current_task().uncancel()
+        finally:
+            if client in self.clients:
+                self.clients.remove(client)
+            writer.close()
+            self._log.info("%r disconnected", client)
+
+    def _disconnect(self, client: HubClient) -> None:
+        self.clients.remove(client)
+        try:
+            # let it finish sending what it already has if there's room, otherwise just drop it
+            client.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            client.dropped = True
+            client.task.cancel()
+
+def parse_address(address: str) -> Tuple[str, str | Tuple[str, int]]:
+    """Splits a hub address into its scheme and either a socket path or a (host, port) pair"""
+
+    url = urlparse(address)
+    if url.scheme == "unix":
+        return ("unix", url.path)
+    elif url.scheme == "tcp":
+        return ("tcp", (url.hostname, url.port))
+    raise ValueError(f"Unsupported hub address {address}; use unix:///path or tcp://host:port")
+
+def is_hub_address(address: str) -> bool:
+    return address.startswith("unix://") or address.startswith("tcp://")
+
+def _topic_definition(src: str, topic_id: int) -> bytes:
+    name = src.encode("utf-8")
+    return RECORD_HEADER.pack(len(name), TOPIC_DEFINITION, topic_id) + name
+
+def _record(topic_id: int, ts: int, payload: bytes) -> bytes:
+    return RECORD_HEADER.pack(len(payload), topic_id, ts) + payload
@@ -0,0 +1,157 @@
+import asyncio
+import bisect
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Protocol, Tuple
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+"""Histogram bucket bounds in seconds; handling an update usually takes tens of microseconds, so they start well below Prometheus's defaults"""
+
+class QueueOwner(Protocol):
+    def queue_depths(self) -> Dict[str, int]:
+        ...
+
+class Histogram:
+    """Counts of observations by bucket, laid out the way Prometheus expects"""
+
+    buckets: Tuple[float, ...]
+    counts: List[int]
+    "Observations in each bucket (not cumulative), with the last counting those above every bound"
+    sum: float
+    count: int
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """
+    Counters for the hot path, for telling whether a lagging consumer is held up by parsing, by callbacks
+    or by a backed-up queue. Nothing is measured unless a client or adapter is instrumented with it
+    (see `PitWallClient.instrument`), and an uninstrumented one pays nothing for it.
+
+    `render` produces the Prometheus text format, and `serve` makes it available over HTTP.
+    """
+
+    messages: Dict[str, int]
+    "Updates dispatched by the instrumented adapter, by topic"
+
+    bytes: Dict[str, int]
+    "Size of those updates' JSON payloads, by topic, for the ones that arrived as JSON rather than already decoded"
+
+    parse_seconds: Dict[str, Histogram]
+    "Time the client spent decoding and handling each update, by topic, not counting its callbacks"
+
+    callback_seconds: Dict[str, Histogram]
+    "Time spent in each event callback, by name; coroutine callbacks only count up to their first await"
+
+    callback_time: float
+    "Total of callback_seconds, kept running so that callbacks can be taken out of the parse time"
+
+    def __init__(self):
+        self.messages = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.parse_seconds = defaultdict(Histogram)
+        self.callback_seconds = defaultdict(Histogram)
+        self.callback_time = 0.0
+        self._queue_owners = list()
+        self._log = logging.getLogger(__name__)
+
+    def watch(self, owner: QueueOwner) -> None:
+        """Reports the depth of an adapter's (or anything else's) queues, read whenever metrics are rendered"""
+
+        if owner not in self._queue_owners:
+            self._queue_owners.append(owner)
+
+    def count(self, src: str, size: int | None) -> None:
+        self.messages[src] += 1
+        if size is not None:
+            self.bytes[src] += size
+
+    def observe_callback(self, callback: Callable[[Any], Any], seconds: float) -> None:
+        self.callback_seconds[callback_name(callback)].observe(seconds)
+        self.callback_time += seconds
+
+    def queue_depths(self) -> Dict[str, int]:
+        depths = dict()
+        for owner in self._queue_owners:
+            depths.update(owner.queue_depths())
+        return depths
+
+    def render(self) -> str:
+        lines = list()
+        _counter(lines, "pitwall_messages_total", "Updates received, by topic", "topic", self.messages)
+        _counter(lines, "pitwall_message_bytes_total", "Payload bytes received, by topic", "topic", self.bytes)
+        _histogram(lines, "pitwall_parse_seconds", "Time spent handling an update, excluding callbacks", "topic", self.parse_seconds)
+        _histogram(lines, "pitwall_callback_seconds", "Time spent in an event callback", "callback", self.callback_seconds)
+
+        lines.append("# HELP pitwall_queue_depth Updates waiting in a queue")
+        lines.append("# TYPE pitwall_queue_depth gauge")
+        for name, depth in self.queue_depths().items():
+            lines.append(f"pitwall_queue_depth{{queue=\"{_escape(name)}\"}} {depth}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port: int, host: str = "127.0.0.1") -> asyncio.Server:
+        """Starts serving `render`'s output at http://host:port/metrics, returning the server so that it can be closed"""
+
+        server = await asyncio.start_server(self._on_connect, host, port)
+        self._log.info("Serving metrics on http://%s:%d/metrics", host, port)
+        return server
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await reader.readline()
+            # the headers don't matter, but have to be read before responding
+            while (await reader.readline()).strip() != b"":
+                pass
+
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                (status, body) = ("200 OK", self.render().encode("utf-8"))
+            else:
+                (status, body) = ("404 Not Found", b"Not found\n")
+
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+def callback_name(callback: Callable[[Any], Any]) -> str:
+    """Names a callback for metrics: its qualified name if it has one (e.g. TimingTower._on_timing_datum)"""
+
+    name = getattr(callback, "__qualname__", None)
+    if name is None:
+        name = type(callback).__qualname__
+    return name
+
+def _counter(lines: List[str], name: str, description: str, label: str, values: Dict[str, int]) -> None:
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} counter")
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{{{label}=\"{_escape(key)}\"}} {value}")
+
+def _histogram(lines: List[str], name: str, description: str, label: str, histograms: Dict[str, Histogram]) -> None:
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(histograms.items()):
+        key = _escape(key)
+        total = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            total += count
+            lines.append(f"{name}_bucket{{{label}=\"{key}\",le=\"{bound}\"}} {total}")
+        lines.append(f"{name}_bucket{{{label}=\"{key}\",le=\"+Inf\"}} {histogram.count}")
+        lines.append(f"{name}_sum{{{label}=\"{key}\"}} {histogram.sum}")
+        lines.append(f"{name}_count{{{label}=\"{key}\"}} {histogram.count}")
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
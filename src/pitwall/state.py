@@ -0,0 +1,200 @@
+from typing import Any, Dict, List
+
+import orjson
+
+from pitwall.adapters.abstract import Update
+
+INIT_TOPICS = ("SessionInfo", "DriverList", "TimingAppData", "SessionData", "TimingData")
+"""Topics PitWallClient expects every init message to contain"""
+
+class SessionState:
+    """
+    Merged state of every topic seen so far, kept up to date by applying each delta in place.
+
+    The feed sends a full copy of each topic in `init` (or in a message marked `_kf`), then partial
+    deltas: nested dicts to merge, `_deleted` lists naming keys to remove, and dicts keyed by index
+    that patch or extend a list (such as `Sectors`, `Segments` or `Messages`). Lists in a delta replace
+    the existing value outright. Subtrees are copied out of the delta rather than shared, so merging
+    never modifies data another consumer may still hold.
+    """
+
+    topics: Dict[str, Any]
+    "Current value of each topic"
+
+    def __init__(self, topics: Dict[str, Any] | None = None):
+        self.topics = topics if topics is not None else dict()
+
+    def __contains__(self, topic: str) -> bool:
+        return topic in self.topics
+
+    def __getitem__(self, topic: str) -> Any:
+        return self.topics[topic]
+
+    def apply(self, update: Update) -> None:
+        self.apply_data(update.src, update.data)
+
+    def apply_data(self, src: str, data: Any) -> None:
+        if src == "init":
+            for topic, value in data.items():
+                self.topics[topic] = _copy(value)
+            return
+
+        current = self.topics.get(src)
+        if isinstance(data, dict) and isinstance(current, (dict, list)) and not data.get("_kf", False):
+            self.topics[src] = merge(current, data)
+        else:
+            self.topics[src] = _copy(data)
+
+    def get(self, topic: str, *path: str | int, default: Any = None) -> Any:
+        """
+        Returns the current value at a path inside a topic, such as `get("TimingData", "Lines", "44", "Position")`,
+        or `default` if any part of it doesn't exist yet. The value is live; copy it if it needs to outlive the next update.
+        """
+
+        value = self.topics.get(topic, default)
+        for key in path:
+            if isinstance(value, dict):
+                value = value.get(str(key), default)
+            elif isinstance(value, list) and 0 <= int(key) < len(value):
+                value = value[int(key)]
+            else:
+                return default
+        return value
+
+    def snapshot(self) -> bytes:
+        """Serializes the whole state in the `init` format"""
+
+        return orjson.dumps(self.topics, option=orjson.OPT_NON_STR_KEYS)
+
+    def to_update(self, ts: int) -> Update:
+        """Returns the state as an `init` update, which brings a fresh client up to date in one step"""
+
+        return Update("init", None, ts, self.snapshot())
+
+    def can_init(self) -> bool:
+        "Whether the state has every topic an init message needs"
+        return all(topic in self.topics for topic in INIT_TOPICS)
+
+    def catch_up(self, ts: int) -> List[Update]:
+        """
+        Returns updates that bring a fresh client up to date: a single init message if possible, otherwise
+        each topic as its own update (the merged value of a topic is also a valid delta against nothing)
+        """
+
+        if self.can_init():
+            positions = self.positions(ts)
+            return [self.to_update(ts)] if positions is None else [self.to_update(ts), positions]
+        return [Update(topic, None, ts, orjson.dumps(value)) for topic, value in self.topics.items()]
+
+    def positions(self, ts: int) -> Update | None:
+        """
+        Returns a TimingData update carrying every line's current position, in running order, or None if
+        there are none yet. An init only tells a client the positions in TimingAppData, which are the
+        grid (or last qualifying) order, so this has to follow it for the running order to be right.
+        """
+
+        lines = [(driver, line) for driver, line in self.get("TimingData", "Lines", default=dict()).items()
+                 if isinstance(line, dict) and "Position" in line]
+        if len(lines) == 0:
+            return None
+
+        lines.sort(key=lambda x: int(x[1]["Position"]))
+        delta = dict()
+        for driver, line in lines:
+            delta[driver] = dict((key, line[key]) for key in ("Position", "Line") if key in line)
+        return Update("TimingData", {"Lines": delta}, ts)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: bytes) -> "SessionState":
+        return cls(orjson.loads(snapshot))
+
+def merge(target: Dict[str, Any] | List[Any], delta: Dict[str, Any]) -> Dict[str, Any] | List[Any]:
+    """Merges a delta into `target` in place, and returns the result (which is only a different object if `target` had to change type)"""
+
+    if isinstance(target, list):
+        return _merge_list(target, delta)
+
+    for key, value in delta.items():
+        if key == "_kf":
+            continue
+        elif key == "_deleted":
+            for deleted in value:
+                target.pop(str(deleted), None)
+            continue
+
+        key = str(key)
+        current = target.get(key)
+        if isinstance(value, dict) and isinstance(current, (dict, list)) and not value.get("_kf", False):
+            target[key] = merge(current, value)
+        else:
+            target[key] = _copy(value)
+    return target
+
+def diff(old: Any, new: Any) -> Any:
+    """
+    Returns a delta that turns `old` into `new` when merged, in the feed's own format (nested dicts,
+    `_deleted` keys and index patches for lists that only grew or changed), or None if they're equal
+    """
+
+    delta = _diff(old, new)
+    return None if delta is _UNCHANGED else delta
+
+def _diff(old: Any, new: Any) -> Any:
+    if isinstance(old, dict) and isinstance(new, dict):
+        delta = dict()
+        for key, value in new.items():
+            key = str(key)
+            if key == "_kf":
+                continue
+            elif key not in old:
+                delta[key] = value
+            elif (changed := _diff(old[key], value)) is not _UNCHANGED:
+                delta[key] = changed
+        deleted = [key for key in old if key not in new]
+        if len(deleted) > 0:
+            delta["_deleted"] = deleted
+        return delta if len(delta) > 0 else _UNCHANGED
+
+    if isinstance(old, list) and isinstance(new, list) and len(new) >= len(old):
+        delta = dict()
+        for i, value in enumerate(new):
+            if i >= len(old):
+                delta[str(i)] = value
+            elif (changed := _diff(old[i], value)) is not _UNCHANGED:
+                delta[str(i)] = changed
+        return delta if len(delta) > 0 else _UNCHANGED
+
+    # anything else (including a list that shrank) is replaced outright
+    if old == new:
+        return _UNCHANGED
+    elif isinstance(new, dict) and isinstance(old, (dict, list)):
+        # otherwise it would be merged into what's there
+        return {**new, "_kf": True}
+    return new
+
+def _merge_list(target: List[Any], delta: Dict[str, Any]) -> List[Any] | Dict[str, Any]:
+    if not all(isinstance(k, int) or (isinstance(k, str) and k.isdigit()) for k in delta.keys() if k not in ("_kf", "_deleted")):
+        # not an index patch after all, so the list was really a stand-in for an (empty) dict
+        return merge(dict([(str(i), x) for i, x in enumerate(target)]), delta)
+
+    for key, value in delta.items():
+        if key in ("_kf", "_deleted"):
+            continue
+        index = int(key)
+        while len(target) <= index:
+            target.append(None)
+        current = target[index]
+        if isinstance(value, dict) and isinstance(current, (dict, list)) and not value.get("_kf", False):
+            target[index] = merge(current, value)
+        else:
+            target[index] = _copy(value)
+    return target
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return dict([(str(k), _copy(v)) for k, v in value.items() if k not in ("_kf", "_deleted")])
+    elif isinstance(value, list):
+        return [_copy(x) for x in value]
+    return value
+
+_UNCHANGED = object()
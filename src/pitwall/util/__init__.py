@@ -1 +1,5 @@
-from .timing_tower import TimingTower as TimingTower
\ No newline at end of file
+from .timing_tower import TimingTower as TimingTower
+from .telemetry_store import TelemetryStore as TelemetryStore
+from .corpus import CorpusResult as CorpusResult, final_order as final_order, run_capture as run_capture, run_corpus as run_corpus, \
+    subscribe_all as subscribe_all
+from .lag_tracker import LagAlert as LagAlert, LagTracker as LagTracker
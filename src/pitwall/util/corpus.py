@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List
+
+from pitwall.adapters.abstract import EOS
+from pitwall.capture.reader import read_capture
+from pitwall.client import PitWallClient
+from pitwall.util.timing_tower import TimingTower
+
+type Consumer = Callable[[PitWallClient], Callable[[], Any]]
+"""
+Sets up whatever should watch a capture on a fresh client, and returns a function that's called once
+the capture is finished to produce the result. Must be defined at module level, so that it can be
+sent to a worker process.
+"""
+
+@dataclass
+class CorpusResult:
+    """Outcome of running one capture through a consumer"""
+
+    filename: str
+
+    updates: int
+    "Number of updates processed"
+
+    seconds: float
+    "Time spent processing the capture, in its worker"
+
+    result: Any
+    "Whatever the consumer's finishing function returned, or None if processing failed"
+
+    error: str | None
+    "Traceback of the exception processing failed with, if it did"
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def run_corpus(filenames: Iterable[str], consumer: Consumer, workers: int | None = None, quiet: bool = True) -> List[CorpusResult]:
+    """
+    Runs every capture through its own client and consumer, spread across a pool of `workers` processes
+    (one per core by default), and returns the results in the order the files were given. A capture that
+    fails doesn't stop the others; its result carries the error instead. Unless `quiet` is turned off,
+    anything printed in the workers (such as TimingTower's commentary) is discarded.
+    """
+
+    filenames = list(filenames)
+    # the biggest go first, so that one doesn't start last and hold everything up on its own
+    order = sorted(range(len(filenames)), key=lambda i: _size(filenames[i]), reverse=True)
+    results: List[CorpusResult | None] = [None] * len(filenames)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_silence if quiet else None) as pool:
+        futures = [(i, pool.submit(run_capture, filenames[i], consumer)) for i in order]
+        for (i, future) in futures:
+            results[i] = future.result()
+    return results
+
+def run_capture(filename: str, consumer: Consumer) -> CorpusResult:
+    """Runs one capture through a consumer in this process; what each of run_corpus's workers does"""
+
+    start = time.perf_counter()
+    client = PitWallClient()
+    count = 0
+
+    def counted():
+        # counted as they're read, so that a failure still says how far it got
+        nonlocal count
+        for update in read_capture(filename):
+            count += 1
+            yield update
+
+    try:
+        finish = consumer(client)
+        try:
+            client.ingest(counted())
+        except EOS:
+            # a consumer can stop early, like watch.py's --to
+            pass
+        return CorpusResult(filename, count, time.perf_counter() - start, finish(), None)
+    except Exception:
+        return CorpusResult(filename, count, time.perf_counter() - start, None, traceback.format_exc())
+
+def subscribe_all(client: PitWallClient) -> None:
+    """Registers a callback for every event, so that every topic the client understands gets parsed"""
+
+    for name in dir(client):
+        if name.startswith("on_"):
+            getattr(client, name)(_ignore)
+
+def final_order(client: PitWallClient) -> Callable[[], List[int]]:
+    """Consumer that parses everything and returns the driver numbers in their final running order"""
+
+    subscribe_all(client)
+    timing = TimingTower(client)
+    return lambda: [line.driver_number for line in timing.results]
+
+def _silence() -> None:
+    sys.stdout = open(os.devnull, "w")
+
+def _ignore(_) -> None:
+    pass
+
+def _size(filename: str) -> int:
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
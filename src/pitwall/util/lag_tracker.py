@@ -0,0 +1,95 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Set, Tuple
+
+from pitwall.adapters.abstract import Update
+from pitwall.client import PitWallClient
+from pitwall.events import Heartbeat
+
+@dataclass
+class LagAlert:
+    """Raised when a lag goes over its threshold, and again when it comes back under"""
+
+    kind: str
+    "`upstream` (the feed server to us) or `local` (receiving an update to being done with it)"
+
+    topic: str
+    "Topic the lag was measured on"
+
+    lag: float
+    "The lag that crossed the threshold, in seconds"
+
+    lagging: bool
+    "Whether the lag is now over the threshold"
+
+class LagTracker:
+    """
+    Keeps track of how far behind the live broadcast a client is, in two parts:
+
+    - upstream lag, from the feed server's clock (carried by each Heartbeat) to when the update
+      carrying it was received, as recorded in `Update.ts`
+    - local lag, from when an update was received to when the client and every callback were done
+      with it, for each topic
+
+    Both are only meaningful for a live feed; a replay's updates were received long ago. Lag going over
+    `upstream_threshold` or `local_threshold` seconds raises a LagAlert, as does recovering from it.
+    """
+
+    _client: PitWallClient
+    upstream: float | None
+    "Latest upstream lag in seconds, or None before the first Heartbeat"
+    local: Dict[str, float]
+    "Latest local lag for each topic, in seconds"
+    upstream_threshold: float
+    local_threshold: float
+    _clock: Callable[[], int]
+    _server_time: int | None
+    "Server time from a Heartbeat in the update being processed, waiting for the update to finish"
+    _lagging: Set[Tuple[str, str]]
+    _on_lag_callbacks: List[Callable[[LagAlert], None]]
+
+    def __init__(self, client: PitWallClient, upstream_threshold: float = 5.0, local_threshold: float = 1.0,
+                 clock: Callable[[], int] = time.time_ns):
+        self._client = client
+        self._client.on_heartbeat(self._on_heartbeat)
+        self._client.on_update(self._on_update)
+        self.upstream = None
+        self.local = dict()
+        self.upstream_threshold = upstream_threshold
+        self.local_threshold = local_threshold
+        self._clock = clock
+        self._server_time = None
+        self._lagging = set()
+        self._on_lag_callbacks = list()
+
+    def on_lag(self, callback: Callable[[LagAlert], None]):
+        self._on_lag_callbacks.append(callback)
+
+    def _on_heartbeat(self, heartbeat: Heartbeat):
+        # the update's receive time isn't known here, so it's measured once the update is done
+        self._server_time = heartbeat.utc
+
+    def _on_update(self, update: Update):
+        # the init snapshot carries the last Heartbeat sent, which is stale by the time it's received
+        if self._server_time is not None and update.src == "Heartbeat":
+            self.upstream = (update.ts - self._server_time) / 1000000000
+            self._check("upstream", update.src, self.upstream, self.upstream_threshold)
+        self._server_time = None
+
+        lag = (self._clock() - update.ts) / 1000000000
+        self.local[update.src] = lag
+        self._check("local", update.src, lag, self.local_threshold)
+
+    def _check(self, kind: str, topic: str, lag: float, threshold: float):
+        key = (kind, topic)
+        lagging = lag > threshold
+        if lagging == (key in self._lagging):
+            return
+
+        if lagging:
+            self._lagging.add(key)
+        else:
+            self._lagging.remove(key)
+        alert = LagAlert(kind, topic, lag, lagging)
+        for callback in self._on_lag_callbacks:
+            callback(alert)
@@ -0,0 +1,134 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+from pitwall.client import PitWallClient
+from pitwall.events import CarDataBatch, PositionBatch
+
+CAR_CHANNELS = ("speed", "rpm", "gear", "throttle", "brake", "drs")
+POSITION_CHANNELS = ("x", "y", "z")
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of timestamped samples with several channels each.
+
+    Every sample is written to two slots, `capacity` apart, so the most recent N samples (for any
+    N up to the capacity) are always contiguous and can be returned as a view instead of a copy.
+    """
+
+    capacity: int
+    count: int
+    "Total number of samples ever appended"
+
+    def __init__(self, capacity: int, channels: int):
+        self.capacity = capacity
+        self.count = 0
+        self._times = np.zeros(capacity * 2, dtype=np.int64)
+        self._values = np.zeros((capacity * 2, channels), dtype=np.int32)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> None:
+        """Appends a batch of samples; `values` has one column per channel"""
+
+        if len(times) > self.capacity:
+            self.count += len(times) - self.capacity
+            times = times[-self.capacity:]
+            values = values[-self.capacity:]
+
+        slots = (self.count + np.arange(len(times))) % self.capacity
+        self._times[slots] = times
+        self._times[slots + self.capacity] = times
+        self._values[slots] = values
+        self._values[slots + self.capacity] = values
+        self.count += len(times)
+
+    def last(self, samples: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns views of the most recent samples' timestamps and values, oldest first"""
+
+        available = len(self)
+        samples = available if samples is None else min(samples, available)
+        end = (self.count - 1) % self.capacity + 1 + self.capacity if self.count > 0 else self.capacity
+        return (self._times[end - samples:end], self._values[end - samples:end])
+
+    def since(self, ts: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns views of every retained sample at or after the given timestamp"""
+
+        (times, values) = self.last()
+        start = np.searchsorted(times, ts, side="left")
+        return (times[start:], values[start:])
+
+class TelemetryStore:
+    """
+    Keeps the most recent car telemetry and positions for each driver in fixed-size ring buffers,
+    so memory stays flat however long the session runs. Windows are returned as NumPy views into
+    the buffers: read them straight away, or copy them if they need to outlive the next update.
+    """
+
+    _client: PitWallClient
+    capacity: int
+    car_data: Dict[int, RingBuffer]
+    positions: Dict[int, RingBuffer]
+
+    def __init__(self, client: PitWallClient, capacity: int = 4096):
+        """`capacity` is per driver and per stream; both arrive at roughly 4 Hz, so the default is about 17 minutes"""
+
+        self._client = client
+        self._client.on_car_data_batch(self._on_car_data)
+        self._client.on_position_batch(self._on_positions)
+        self.capacity = capacity
+        self.car_data = dict()
+        self.positions = dict()
+
+    def window(self, driver_id: int, channel: str, seconds: float | None = None, samples: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (timestamps, values) for one driver and channel, covering either the last `seconds`
+        (relative to that driver's most recent sample) or the last `samples` samples
+        """
+
+        (buffers, column) = self._locate(channel)
+        buffer = buffers.get(driver_id)
+        if buffer is None or len(buffer) == 0:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32))
+
+        if seconds is not None:
+            (times, values) = buffer.last()
+            (times, values) = buffer.since(times[-1] - int(seconds * 1000000000))
+        else:
+            (times, values) = buffer.last(samples)
+
+        return (times, values[:, column])
+
+    def latest(self, driver_id: int, channel: str) -> Tuple[int, int] | None:
+        """Returns the timestamp and value of a driver's most recent sample of a channel"""
+
+        (times, values) = self.window(driver_id, channel, samples=1)
+        if len(times) == 0:
+            return None
+        return (int(times[0]), int(values[0]))
+
+    def _locate(self, channel: str) -> Tuple[Dict[int, RingBuffer], int]:
+        if channel in CAR_CHANNELS:
+            return (self.car_data, CAR_CHANNELS.index(channel))
+        elif channel in POSITION_CHANNELS:
+            return (self.positions, POSITION_CHANNELS.index(channel))
+        raise KeyError(f"Unknown telemetry channel {channel}")
+
+    def _on_car_data(self, batch: CarDataBatch):
+        values = np.column_stack((batch.speed, batch.rpm, batch.gear, batch.throttle, batch.brake, batch.drs))
+        self._append(self.car_data, batch.driver_id, batch.timestamp, values, len(CAR_CHANNELS))
+
+    def _on_positions(self, batch: PositionBatch):
+        values = np.column_stack((batch.x, batch.y, batch.z))
+        self._append(self.positions, batch.driver_id, batch.timestamp, values, len(POSITION_CHANNELS))
+
+    def _append(self, buffers: Dict[int, RingBuffer], driver_ids: np.ndarray, times: np.ndarray, values: np.ndarray, channels: int):
+        # group the batch by driver without looping over its samples
+        order = np.argsort(driver_ids, kind="stable")
+        (drivers, starts) = np.unique(driver_ids[order], return_index=True)
+        for driver_id, rows in zip(drivers, np.split(order, starts[1:])):
+            buffer = buffers.get(int(driver_id))
+            if buffer is None:
+                buffer = buffers[int(driver_id)] = RingBuffer(self.capacity, channels)
+            buffer.extend(times[rows], values[rows])
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Tuple
 from colorist import Color
 from pitwall.client import PitWallClient
 from pitwall.events import Driver, DriverPositionUpdate
@@ -23,7 +23,10 @@ class TimingLine:
 class TimingTower:
     _client: PitWallClient
     drivers: Dict[int, TimingLine]
-    results: List[TimingLine]
+    _by_position: List[TimingLine | None]
+    "Line at each position, indexed by position (so slot 0 is never used)"
+    _results: List[TimingLine] | None
+    "Lines in position order, or None when they've moved since it was last built"
     _on_position_change_callbacks: List[Callable[[TimingLine], None]]
 
     def __init__(self, client: PitWallClient):
@@ -32,8 +35,18 @@ class TimingTower:
         self._client.on_driver_position_update(self._on_driver_position_update)
         self._client.on_timing_datum(self._on_timing_datum)
         self.drivers = dict()
+        self._by_position = [None]
+        self._results = None
         self._on_position_change_callbacks = list()
 
+    @property
+    def results(self) -> List[TimingLine]:
+        """Every line in position order, built on demand rather than after every position change"""
+
+        if self._results is None:
+            self._results = list(sorted(self.drivers.values(), key=lambda d: d.position))
+        return self._results
+
     def on_position_change(self, callback: Callable[[TimingLine], None]):
         self._on_position_change_callbacks.append(callback)
 
@@ -48,43 +61,55 @@ class TimingTower:
         for callback in self._on_position_change_callbacks:
             callback(line)
 
+    def _at(self, position: int) -> TimingLine | None:
+        return self._by_position[position] if position < len(self._by_position) else None
+
+    def _move(self, moves: List[Tuple[TimingLine, int]]):
+        """Gives each line its new position, clearing every old slot before filling the new ones so that they can overlap"""
+
+        for line, _ in moves:
+            if self._at(line.position) is line:
+                self._by_position[line.position] = None
+        for line, position in moves:
+            line.position = position
+            if position >= len(self._by_position):
+                self._by_position.extend([None] * (position + 1 - len(self._by_position)))
+            self._by_position[position] = line
+        self._results = None
+
     def _on_driver_position_update(self, update: DriverPositionUpdate):
         driver = self.drivers[update.driver_id]
         if driver.position == 99:
-            driver.position = update.position
+            self._move([(driver, update.position)])
             self._call_position_update_callbacks(driver)
             return
 
-        # TODO: refactor this when my brain has more capacity for mathing
         if abs(driver.position - update.position) == 1:
-            try:
-                swap_with = next(filter(lambda d: d.position == update.position, self.drivers.values()))
-            except StopIteration:
+            swap_with = self._at(update.position)
+            if swap_with is None:
                 raise Exception(f"Can't find driver at position {update.position}")
-                #for d in sorted(self.drivers.values(), key=lambda d: d.position):
-                #    print(f"\t{d} in {d.position}")
 
             print(f"{Color.MAGENTA}\t{driver} {"overtook" if driver.position > update.position else "lost position to"} {swap_with}{Color.OFF}")
-            swap_with.position = driver.position
+            self._move([(swap_with, driver.position), (driver, update.position)])
             self._call_position_update_callbacks(swap_with)
         elif driver.position > update.position: # overtake
-            losses = [x for x in self.drivers.values() if update.position <= x.position < driver.position]
+            losses = [x for x in self._by_position[update.position:driver.position] if x is not None]
             for d in losses:
                 print(f"{Color.MAGENTA}\t{driver} overtook {d}{Color.OFF}")
-                d.position += 1
+            self._move([(d, d.position + 1) for d in losses] + [(driver, update.position)])
+            for d in losses:
                 self._call_position_update_callbacks(d)
 
         elif driver.position < update.position:
-            gains = [x for x in self.drivers.values() if driver.position < x.position <= update.position]
+            gains = [x for x in self._by_position[driver.position + 1:update.position + 1] if x is not None]
             for d in gains:
                 print(f"{Color.MAGENTA}\t{driver} lost position to {d}{Color.OFF}")
-                d.position -= 1
+            self._move([(d, d.position - 1) for d in gains] + [(driver, update.position)])
+            for d in gains:
                 self._call_position_update_callbacks(d)
 
-        driver.position = update.position
         self._call_position_update_callbacks(driver)
-        self.results = list(sorted(self.drivers.values(), key=lambda d: d.position))
-    
+
     def _on_timing_datum(self, datum: TimingDatum):
         if isinstance(datum, LapTimingDatum):
             self.drivers[datum.driver_id].lap_time = datum.time
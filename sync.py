@@ -1,11 +1,10 @@
 import asyncio
-import copy
 import logging
 import re
 import easyocr
 import time
 
-from typing import Dict
+from typing import Dict, List, Tuple
 from asyncio import run, gather
 
 from pitwall.client import PitWallClient
@@ -23,8 +22,12 @@ class SyncClient:
     _adapter: BufferingAdapter
     _client: PitWallClient
     _sequence: int
-    _snapshots: Dict[int, Dict[int, float]]
-    _last_snapshot: Dict[int, float]
+    _intervals: Dict[Tuple[int, float], List[List[int | None]]]
+    """
+    Every [start, end) range of sequences during which a driver had a given interval to the car ahead,
+    keyed by (driver, interval); the end is None while it's still current
+    """
+    _current: Dict[int, float]
 
     def __init__(self, adapter: BufferingAdapter):
         super().__init__()
@@ -38,8 +41,8 @@ class SyncClient:
         self._client.on_driver_data(self._on_driver_data)
 
         self._sequence = 0
-        self._snapshots = dict()
-        self._last_snapshot = None
+        self._intervals = dict()
+        self._current = dict()
 
     def _inner_message(self, u: Update):
         self._sequence = u.seq
@@ -48,16 +51,22 @@ class SyncClient:
         if not isinstance(point, IntervalTimingDatum):
             return
 
-        if self._last_snapshot is None:
-            new = dict()
-        else:
-            new = copy.copy(self._last_snapshot)
+        driver_id = point.driver_id
+        value = point.time_to_driver_ahead
+        if driver_id in self._current:
+            previous = self._current[driver_id]
+            if previous == value:
+                return
 
-        new[point.driver_id] = point.time_to_driver_ahead
-        # if multiple timing updates fired from a single message, this will overwrite the previous update
-        # and be eventually consistent with the contents of the message (but is probably inefficient until then)
-        self._snapshots[self._sequence] = new
-        self._last_snapshot = new
+            ranges = self._intervals[(driver_id, previous)]
+            if ranges[-1][0] == self._sequence:
+                # changed again within the same message, so the previous value was never visible
+                ranges.pop()
+            else:
+                ranges[-1][1] = self._sequence
+
+        self._current[driver_id] = value
+        self._intervals.setdefault((driver_id, value), list()).append([self._sequence, None])
 
     def _on_driver_data(self, data):
         if not any(data): # this seems to happen way more often than it should
@@ -69,21 +78,30 @@ class SyncClient:
     async def run(self):
         await self._client.go()
 
-    def find(self, intervals: Dict[str, float]) -> int:
-        print(f"Searching {len(self._snapshots)} snapshots")
+    def find(self, intervals: Dict[str, float]) -> Tuple[int, int]:
+        """Returns the earliest sequence matching the most drivers' intervals, and how many it matched"""
+
+        # each matching range contributes +1 where it starts and -1 where it ends, so sweeping the
+        # boundaries in order gives the number of matches at every sequence where it can change
+        boundaries = list()
+        for driver_id, value in intervals.items():
+            for (start, end) in self._intervals.get((driver_id, value), ()):
+                boundaries.append((start, 1))
+                if end is not None:
+                    boundaries.append((end, -1))
+
+        print(f"Searching {len(boundaries)} range boundaries")
+        boundaries.sort()
 
+        matches = 0
         most_matches = 0
         best_sequence = None
-
-        for sequence, snapshot in self._snapshots.items():
-            matches = [True for driver_id in intervals.keys() if driver_id in snapshot and snapshot[driver_id] == intervals[driver_id]]
-            if len(matches) > most_matches:
-                most_matches = len(matches)
+        for i, (sequence, change) in enumerate(boundaries):
+            matches += change
+            if (i + 1 == len(boundaries) or boundaries[i + 1][0] != sequence) and matches > most_matches:
+                most_matches = matches
                 best_sequence = sequence
 
-            if most_matches == len(intervals):
-                break
-
         if best_sequence is None:
             raise Exception("No match found")
 
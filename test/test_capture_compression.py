@@ -0,0 +1,75 @@
+import gzip
+import lzma
+import shutil
+
+import pytest
+
+from pitwall.adapters import CaptureAdapter
+from pitwall.capture import CaptureWriter, read_capture
+
+class TestCompressedCapture:
+    async def collect_updates(self, filename: str, start: str | None = None):
+        updates = list()
+        adapter = CaptureAdapter(filename, start)
+        adapter.on_message(lambda u: updates.append((u.src, u.ts, u.raw)))
+        await adapter.run()
+        return updates
+
+    def compress(self, compression: str, output: str):
+        if compression == "gzip":
+            opener = gzip.open
+        elif compression == "xz":
+            opener = lzma.open
+        else:
+            opener = pytest.importorskip("zstandard").open
+
+        with open("data/2024_brazil_sprint.txt", "rb") as in_file, opener(output, "wb") as out_file:
+            shutil.copyfileobj(in_file, out_file)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("compression", ["gzip", "xz", "zstd"])
+    async def test_read_compressed_text(self, tmp_path, compression):
+        output = str(tmp_path / "capture.txt.compressed")
+        self.compress(compression, output)
+
+        expected = await self.collect_updates("data/2024_brazil_sprint.txt")
+        assert await self.collect_updates(output) == expected
+        assert [(u.src, u.ts, u.raw) for u in read_capture(output)] == expected
+
+    @pytest.mark.asyncio
+    async def test_seek_compressed(self, tmp_path):
+        output = str(tmp_path / "capture.txt.gz")
+        self.compress("gzip", output)
+
+        assert await self.collect_updates(output, "20") == await self.collect_updates("data/2024_brazil_sprint.txt", "20")
+
+    @pytest.mark.asyncio
+    async def test_write_compressed_binary(self, tmp_path):
+        output = str(tmp_path / "capture.pwc.gz")
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+
+        writer = CaptureWriter(output, binary=True, compression="gzip")
+        for u in updates[:1000]:
+            writer.write(u.ts, u.src, u.raw)
+        writer.close()
+        # restarting never appends to a compressed part, in case it was cut off
+        writer = CaptureWriter(output, binary=True, compression="gzip")
+        for u in updates[1000:]:
+            writer.write(u.ts, u.src, u.raw)
+        writer.close()
+
+        first = await self.collect_updates(output)
+        second = await self.collect_updates(str(tmp_path / "capture.1.pwc.gz"))
+        assert first + second == [(u.src, u.ts, u.raw) for u in updates]
+
+    @pytest.mark.asyncio
+    async def test_truncated(self, tmp_path):
+        output = str(tmp_path / "capture.txt.gz")
+        self.compress("gzip", output)
+        with open(output, "r+b") as f:
+            f.truncate(f.seek(0, 2) // 2)
+
+        updates = await self.collect_updates(output)
+        expected = await self.collect_updates("data/2024_brazil_sprint.txt")
+        assert 0 < len(updates) < len(expected)
+        assert updates == expected[:len(updates)]
@@ -0,0 +1,125 @@
+import pytest
+
+from pitwall import PitWallClient
+from pitwall.adapters import CaptureAdapter
+from pitwall.adapters.abstract import Update
+from pitwall.capture import BinaryCaptureReader, BinaryCaptureWriter, convert_text_capture, read_capture, read_footer
+
+class TestBinaryCapture:
+    async def collect_updates(self, filename: str):
+        updates = list()
+        adapter = CaptureAdapter(filename)
+        adapter.on_message(lambda u: updates.append((u.src, u.data, u.ts)))
+        await adapter.run()
+        return updates
+
+    @pytest.mark.asyncio
+    async def test_convert_brazil_2024_sprint(self, tmp_path):
+        output = str(tmp_path / "2024_brazil_sprint.pwc")
+        count = convert_text_capture("data/2024_brazil_sprint.txt", output)
+
+        text = await self.collect_updates("data/2024_brazil_sprint.txt")
+        binary = await self.collect_updates(output)
+
+        assert len(binary) == count
+        assert binary == text
+
+        with open(output, "rb") as f:
+            (_, index) = read_footer(f)
+        assert index["records"] == count
+        assert "init" in index["topics"].values()
+
+    @pytest.mark.asyncio
+    async def test_client_reads_binary(self, tmp_path):
+        output = str(tmp_path / "2024_brazil_sprint.pwc")
+        convert_text_capture("data/2024_brazil_sprint.txt", output)
+
+        client = PitWallClient(CaptureAdapter(output))
+        configs = list()
+        client.on_session_config(configs.append)
+        await client.go()
+
+        assert [c.layout for c in configs] == [{1: 7, 2: 8, 3: 5}]
+
+    def test_append_after_unclean_close(self, tmp_path):
+        output = str(tmp_path / "capture.pwc")
+        writer = BinaryCaptureWriter.open(output)
+        writer.write("SessionStatus", b'{"Status":"Started"}', 1)
+        writer.close()
+
+        writer = BinaryCaptureWriter.open(output)
+        writer.write("TrackStatus", b'{"Status":"1"}', 2)
+        writer.flush()
+        # simulate being killed partway through a record, before the footer is written
+        writer._file.write(b"\x10\x00")
+        writer._file.close()
+
+        writer = BinaryCaptureWriter.open(output)
+        writer.write("SessionStatus", b'{"Status":"Finished"}', 3)
+        writer.close()
+
+        reader = BinaryCaptureReader()
+        with open(output, "rb") as f:
+            updates = reader.feed(f.read())
+
+        assert reader.done
+        assert [(u.src, u.data, u.ts) for u in updates] == [("SessionStatus", {"Status": "Started"}, 1),
+                                                             ("TrackStatus", {"Status": "1"}, 2),
+                                                             ("SessionStatus", {"Status": "Finished"}, 3)]
+
+    def test_append_rebuilds_index(self, tmp_path):
+        records = [("TimingData", b'{"Lines":{"1":{"Position":"%d"}}}' % (i % 20 + 1), i) for i in range(3000)]
+        clean = str(tmp_path / "clean.pwc")
+        writer = BinaryCaptureWriter.open(clean)
+        for record in records:
+            writer.write(*record)
+        writer.close()
+
+        output = str(tmp_path / "capture.pwc")
+        writer = BinaryCaptureWriter.open(output)
+        for record in records[:2500]:
+            writer.write(*record)
+        # killed before the footer is written
+        writer._file.close()
+        writer = BinaryCaptureWriter.open(output)
+        for record in records[2500:]:
+            writer.write(*record)
+        writer.close()
+
+        with open(clean, "rb") as f:
+            (_, expected) = read_footer(f)
+        with open(output, "rb") as f:
+            (_, index) = read_footer(f)
+        assert index == expected
+        assert len(index["entries"]) == 3
+
+    def test_feed_split_records(self, tmp_path):
+        output = str(tmp_path / "capture.pwc")
+        writer = BinaryCaptureWriter.open(output)
+        for i in range(100):
+            writer.write_update(Update("TimingData", {"Lines": {"1": {"Position": str(i)}}}, i))
+        writer.close()
+
+        with open(output, "rb") as f:
+            contents = f.read()
+
+        reader = BinaryCaptureReader()
+        updates = list()
+        for i in range(0, len(contents), 7):
+            updates.extend(reader.feed(contents[i:i + 7]))
+
+        assert [u.ts for u in updates] == list(range(100))
+        assert updates[-1].data == {"Lines": {"1": {"Position": "99"}}}
+
+    def test_payloads_decoded_on_demand(self):
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+        client = PitWallClient()
+        client.on_driver_position_update(lambda _: None)
+        client.ingest(updates)
+
+        assert all(not u.decoded for u in updates if u.src in ("Heartbeat", "WeatherData", "TeamRadio"))
+        assert all(u.decoded for u in updates if u.src == "TimingData")
+
+        with open("data/2024_brazil_sprint.txt", "rb") as f:
+            lines = f.read().splitlines()
+        assert [f"{u.ts}:{u.src}:".encode() + u.raw for u in updates] == lines
@@ -0,0 +1,62 @@
+import os
+import shutil
+import pytest
+
+from pitwall import PitWallClient
+from pitwall.adapters import CaptureAdapter
+from pitwall.capture import CaptureIndex, convert_text_capture
+from pitwall.events import LapSessionProgress
+from pitwall.util import TimingTower
+
+class TestCaptureIndex:
+    @pytest.fixture
+    def capture(self, tmp_path):
+        filename = str(tmp_path / "2024_brazil_sprint.txt")
+        shutil.copy("data/2024_brazil_sprint.txt", filename)
+        return filename
+
+    def test_index_is_cached(self, capture):
+        index = CaptureIndex.load(capture)
+        assert [p.lap for p in index.laps] == list(range(2, 25))
+        assert [p.status for p in index.statuses] == ["Started", "Finished", "Finalised"]
+        assert index.init_offset == 0
+        # only written when asked for
+        assert not os.path.exists(CaptureIndex.path_for(capture))
+
+        CaptureIndex.load(capture, save=True)
+        assert os.path.exists(CaptureIndex.path_for(capture))
+        cached = CaptureIndex.load(capture)
+        assert cached.laps == index.laps
+        assert cached.times == index.times
+
+    def test_rewritten_capture_is_reindexed(self, capture):
+        CaptureIndex.load(capture, save=True)
+
+        # the same size, but with the last lap's records gone
+        size = os.path.getsize(capture)
+        with open(capture, "rb") as f:
+            kept = b"".join(f.readlines()[:-3000])
+        with open(capture, "wb") as f:
+            f.write(kept + b"\n" * (size - len(kept)))
+
+        index = CaptureIndex.load(capture)
+        assert index.statuses[-1].status != "Finalised"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("binary", [False, True])
+    async def test_start_at_lap(self, capture, binary):
+        if binary:
+            filename = capture[:-4] + ".pwc"
+            convert_text_capture(capture, filename)
+            capture = filename
+
+        client = PitWallClient(CaptureAdapter(capture, "20"))
+        timing = TimingTower(client)
+        laps = list()
+        client.on_session_progress(lambda p: laps.append(p.lap) if isinstance(p, LapSessionProgress) else None)
+
+        await client.go()
+
+        # the snapshot's lap, then straight to the requested one
+        assert laps[:3] == [1, 20, 21]
+        assert [d.driver_number for d in timing.results] == [4, 81, 1, 16, 55, 63, 10, 11, 30, 23, 44, 43, 31, 50, 22, 77, 24, 14, 18, 27]
@@ -0,0 +1,49 @@
+import os
+
+from pitwall.capture import CaptureWriter, read_capture
+
+class TestCaptureWriter:
+    def test_text_round_trip(self, tmp_path):
+        output = str(tmp_path / "capture.txt")
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+
+        writer = CaptureWriter(output, commit_bytes=1 << 16, commit_interval=60)
+        for u in updates:
+            writer.write(u.ts, u.src, u.raw)
+        writer.close()
+
+        with open("data/2024_brazil_sprint.txt", "rb") as expected, open(output, "rb") as actual:
+            assert actual.read() == expected.read()
+
+    def test_binary_rotation(self, tmp_path):
+        output = str(tmp_path / "capture.pwc")
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+
+        writer = CaptureWriter(output, binary=True, fsync="never", max_bytes=1 << 20)
+        for u in updates:
+            writer.write(u.ts, u.src, u.raw)
+        writer.close()
+
+        count = len(os.listdir(tmp_path))
+        parts = ["capture.pwc"] + [f"capture.{i}.pwc" for i in range(1, count)]
+        assert count > 1
+        assert sorted(os.listdir(tmp_path)) == sorted(parts)
+
+        written = [u for part in parts for u in read_capture(str(tmp_path / part))]
+        assert [(u.src, u.ts, u.raw) for u in written] == [(u.src, u.ts, u.raw) for u in updates]
+
+    def test_resume_after_crash(self, tmp_path):
+        output = str(tmp_path / "capture.txt")
+        with open(output, "wb") as f:
+            f.write(b'1:SessionStatus:{"Status":"Started"}\n2:TrackStatus:{"Stat')
+
+        writer = CaptureWriter(output)
+        writer.write(3, "TrackStatus", b'{"Status":"1"}')
+        writer.end()
+        # dropped, since nothing is open
+        writer.write(4, "TrackStatus", b'{"Status":"2"}')
+        writer.open(output)
+        writer.write(5, "SessionStatus", b'{"Status":"Finished"}')
+        writer.close()
+
+        assert [(u.src, u.ts) for u in read_capture(output)] == [("SessionStatus", 1), ("TrackStatus", 3), ("SessionStatus", 5)]
@@ -0,0 +1,23 @@
+from pitwall import PitWallClient
+from pitwall.util import final_order, run_capture, run_corpus
+
+def broken(client: PitWallClient):
+    return lambda: 1 / 0
+
+class TestCorpus:
+    def test_run_corpus(self):
+        results = run_corpus(["data/missing.txt", "data/2024_brazil_sprint.txt"], final_order, workers=2)
+
+        assert [r.filename for r in results] == ["data/missing.txt", "data/2024_brazil_sprint.txt"]
+        assert not results[0].ok
+        assert "FileNotFoundError" in results[0].error
+        assert results[1].ok
+        assert results[1].updates == 21334
+        assert results[1].result == [4, 81, 1, 16, 55, 63, 10, 11, 30, 23, 44, 43, 31, 50, 22, 77, 24, 14, 18, 27]
+
+    def test_consumer_failure(self):
+        result = run_capture("data/2024_brazil_sprint.txt", broken)
+
+        assert not result.ok
+        assert "ZeroDivisionError" in result.error
+        assert result.updates == 21334
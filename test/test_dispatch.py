@@ -0,0 +1,134 @@
+import asyncio
+import inspect
+from typing import List
+
+import pytest
+
+from pitwall import PitWallClient
+from pitwall.adapters import CaptureAdapter
+from pitwall.adapters.abstract import EOS, PitWallAdapter, Update
+from pitwall.events import SessionProgress, SessionStatus
+
+class ListAdapter(PitWallAdapter):
+    def __init__(self, updates: List[Update]):
+        super().__init__()
+        self.updates = updates
+
+    async def run(self) -> None:
+        for update in self.updates:
+            await self._message(update)
+
+def statuses(*names: str) -> List[Update]:
+    return [Update("SessionStatus", {"Status": name}, i) for i, name in enumerate(names)]
+
+@pytest.mark.asyncio
+class TestDispatch:
+    async def test_callbacks_are_awaited_in_order(self):
+        seen = list()
+
+        async def slow(update: Update):
+            await asyncio.sleep(0.01 if update.seq == 0 else 0)
+            seen.append(("slow", update.seq))
+
+        adapter = ListAdapter(statuses("Inactive", "Started", "Finished"))
+        adapter.on_message(slow)
+        adapter.on_message(lambda u: seen.append(("sync", u.seq)))
+        await adapter.run()
+
+        assert seen == [("slow", 0), ("sync", 0), ("slow", 1), ("sync", 1), ("slow", 2), ("sync", 2)]
+
+    async def test_failures_are_isolated(self):
+        seen = list()
+
+        def broken(update: Update):
+            raise ValueError("broken")
+
+        adapter = ListAdapter(statuses("Inactive", "Started"))
+        adapter.on_message(broken)
+        adapter.on_message(lambda u: seen.append(u.seq))
+        await adapter.run()
+
+        assert seen == [0, 1]
+
+    async def test_buffered_subscribers_are_bounded(self):
+        seen = list()
+        depths = list()
+
+        async def slow(update: Update):
+            depths.append(adapter.subscribers[0].queue.qsize())
+            await asyncio.sleep(0.001)
+            seen.append(update.seq)
+
+        adapter = ListAdapter(statuses(*["Started"] * 50))
+        adapter.on_message(slow, buffer=4)
+        client = PitWallClient(adapter)
+        await client.go()
+
+        assert seen == list(range(50))
+        assert max(depths) <= 4
+        assert adapter.subscribers[0].workers == []
+
+    async def test_eos_from_a_callback_ends_the_stream(self):
+        seen = list()
+
+        def stop(status: SessionStatus):
+            seen.append(status.status)
+            if status.status == "Finished":
+                raise EOS()
+
+        client = PitWallClient(ListAdapter(statuses("Started", "Finished", "Finalised")))
+        client.on_session_status(stop)
+        with pytest.raises(EOS):
+            await client.go()
+
+        assert seen == ["Started", "Finished"]
+
+    async def test_eos_ends_a_capture_cleanly(self):
+        client = PitWallClient(CaptureAdapter("data/2024_brazil_sprint.txt"))
+        laps = list()
+
+        def stop(progress: SessionProgress):
+            laps.append(progress.lap)
+            if progress.lap == 5:
+                raise EOS()
+
+        client.on_session_progress(stop)
+        await client.go()
+        assert laps[-1] == 5
+
+    async def test_eos_discards_pending_coroutines(self):
+        returned = list()
+
+        async def wait():
+            pass
+
+        def first(status: SessionStatus):
+            returned.append(wait())
+            return returned[-1]
+
+        def second(status: SessionStatus):
+            raise EOS()
+
+        client = PitWallClient(ListAdapter(statuses("Started")))
+        client.on_session_status(first)
+        client.on_session_status(second)
+        with pytest.raises(EOS):
+            await client.go()
+
+        # closed rather than left to be garbage collected, which warns that it was never awaited
+        assert [inspect.getcoroutinestate(c) for c in returned] == [inspect.CORO_CLOSED]
+
+    async def test_client_awaits_coroutine_callbacks(self):
+        seen = list()
+
+        async def on_status(status: SessionStatus):
+            await asyncio.sleep(0)
+            seen.append(status.status)
+
+        client = PitWallClient(ListAdapter(statuses("Started", "Finished")))
+        client.on_session_status(on_status)
+        await client.go()
+        assert seen == ["Started", "Finished"]
+
+        with pytest.raises(TypeError):
+            client.ingest(statuses("Finalised"))
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+from typing import Callable, List, Tuple
+
+import pytest
+
+# ha_writer.py needs the homeassistant extra
+ha_writer = pytest.importorskip("ha_writer")
+
+class FakeHomeAssistant:
+    """Records every state set, after calling `before` with it, which can raise to make the request fail"""
+
+    def __init__(self, before: Callable[[str, str], None] = lambda entity_id, state: None):
+        self.before = before
+        self.attempts = 0
+        self.states: List[Tuple[str, str]] = list()
+
+    async def async_set_state(self, state):
+        self.attempts += 1
+        await asyncio.sleep(0)
+        self.before(state.entity_id, state.state)
+        self.states.append((state.entity_id, state.state))
+
+@contextlib.asynccontextmanager
+async def running(sink):
+    task = asyncio.create_task(sink.run())
+    try:
+        yield task
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+@pytest.mark.asyncio
+class TestHomeAssistantSink:
+    async def test_burst_is_coalesced(self):
+        ha = FakeHomeAssistant()
+        sink = ha_writer.HomeAssistantSink(ha, interval=0.05)
+        async with running(sink):
+            for driver in ("Verstappen", "Norris", "Russell", "Norris"):
+                sink.set("sensor.f1_leader", driver)
+            await asyncio.sleep(0.01)
+            assert ha.states == [("sensor.f1_leader", "Norris")]
+
+            # and anything else within the interval waits for the end of it
+            sink.set("sensor.f1_leader", "Russell")
+            sink.set("sensor.f1_leader", "Verstappen")
+            await asyncio.sleep(0.01)
+            assert len(ha.states) == 1
+            await asyncio.sleep(0.06)
+
+        assert ha.states == [("sensor.f1_leader", "Norris"), ("sensor.f1_leader", "Verstappen")]
+
+    async def test_change_and_change_back_is_dropped(self):
+        ha = FakeHomeAssistant()
+        sink = ha_writer.HomeAssistantSink(ha, interval=0.01)
+        sink.set("sensor.f1_session", "Started")
+        await sink.flush()
+
+        sink.set("sensor.f1_session", "Aborted")
+        sink.set("sensor.f1_session", "Started")
+        await sink.flush()
+
+        assert ha.states == [("sensor.f1_session", "Started")]
+        assert ha.attempts == 1
+
+    async def test_failure_is_retried_unless_superseded(self):
+        def before(entity_id: str, state: str):
+            if ha.attempts == 1:
+                raise ConnectionError("unreachable")
+
+        ha = FakeHomeAssistant(before)
+        sink = ha_writer.HomeAssistantSink(ha, interval=0.01)
+        sink.set("sensor.f1_session", "Started")
+        await sink.flush()
+        assert ha.states == [("sensor.f1_session", "Started")]
+
+        def superseding(entity_id: str, state: str):
+            if state == "Finished":
+                # a newer value arrives while the failing request is out
+                sink.set("sensor.f1_session", "Finalised")
+                raise ConnectionError("unreachable")
+
+        ha.before = superseding
+        sink.set("sensor.f1_session", "Finished")
+        await sink.flush()
+        assert ha.states == [("sensor.f1_session", "Started"), ("sensor.f1_session", "Finalised")]
+
+    async def test_flush_gives_up(self):
+        def before(entity_id: str, state: str):
+            raise ConnectionError("unreachable")
+
+        ha = FakeHomeAssistant(before)
+        sink = ha_writer.HomeAssistantSink(ha, interval=0.01)
+        sink.set("sensor.f1_session", "Started")
+        await asyncio.wait_for(sink.flush(attempts=3), 5)
+        assert ha.attempts == 3
+
+        # and it's been dropped, rather than left for next time
+        await sink.flush()
+        assert ha.attempts == 3
+        assert ha.states == []
+
+    async def test_cancelled_push_is_flushed(self):
+        released = asyncio.Event()
+
+        async def block(state):
+            ha.attempts += 1
+            await released.wait()
+            ha.states.append((state.entity_id, state.state))
+
+        ha = FakeHomeAssistant()
+        ha.async_set_state = block
+        sink = ha_writer.HomeAssistantSink(ha, interval=0.01)
+        async with running(sink):
+            sink.set("sensor.f1_session", "Finalised")
+            while ha.attempts == 0:
+                await asyncio.sleep(0.001)
+        # the push was cancelled partway through, as main() does when the feed ends
+
+        released.set()
+        await sink.flush()
+        assert ha.states == [("sensor.f1_session", "Finalised")]
@@ -0,0 +1,100 @@
+import asyncio
+from typing import List
+
+import orjson
+import pytest
+
+from pitwall import PitWallClient
+from pitwall.adapters import HubAdapter
+from pitwall.adapters.abstract import PitWallAdapter, Update
+from pitwall.capture import read_capture
+from pitwall.hub import HubServer
+from pitwall.util import TimingTower
+
+class GatedAdapter(PitWallAdapter):
+    """Sends the first part of a capture, then waits to be let through before sending the rest"""
+
+    def __init__(self, updates: List[Update], split: int):
+        super().__init__()
+        self.updates = updates
+        self.split = split
+        self.halfway = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def run(self) -> None:
+        for i, update in enumerate(self.updates):
+            if i == self.split:
+                self.halfway.set()
+                await self.resume.wait()
+            await self._message(update)
+
+async def wait_for_clients(hub: HubServer, count: int):
+    while len(hub.clients) < count:
+        await asyncio.sleep(0.001)
+
+@pytest.mark.asyncio
+class TestHub:
+    async def test_late_clients_catch_up(self, tmp_path):
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+        upstream = GatedAdapter(updates, 12000)
+        hub = HubServer(upstream)
+        address = f"unix://{tmp_path}/hub.sock"
+        await hub.start(address)
+
+        early = PitWallClient(HubAdapter(address))
+        early.track_state()
+        early_task = asyncio.create_task(early.go())
+        await wait_for_clients(hub, 1)
+
+        serving = asyncio.create_task(hub.run())
+        await upstream.halfway.wait()
+
+        late = PitWallClient(HubAdapter(address))
+        late.track_state()
+        timing = TimingTower(late)
+        late_task = asyncio.create_task(late.go())
+        await wait_for_clients(hub, 2)
+        # both are on the same unix socket, so they can't be told apart by peer
+        assert hub.queue_depths().keys() == {"HubServer.client[0]", "HubServer.client[1]"}
+        upstream.resume.set()
+
+        await asyncio.wait_for(asyncio.gather(serving, early_task, late_task), 30)
+
+        assert early.adapter.last_sequence == len(updates)
+        assert late.adapter.last_sequence < len(updates) - 12000 + 5
+        assert orjson.dumps(early.state.topics) == orjson.dumps(hub.state.topics)
+        assert orjson.dumps(late.state.topics) == orjson.dumps(hub.state.topics)
+        assert [d.driver_number for d in timing.results] == [4, 81, 1, 16, 55, 63, 10, 11, 30, 23, 44, 43, 31, 50, 22, 77, 24, 14, 18, 27]
+
+    async def test_late_client_running_order(self, tmp_path):
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+        upstream = GatedAdapter(updates, 15000)
+        hub = HubServer(upstream)
+        address = f"unix://{tmp_path}/hub.sock"
+        await hub.start(address)
+
+        early = PitWallClient(HubAdapter(address))
+        early_timing = TimingTower(early)
+        early_task = asyncio.create_task(early.go())
+        await wait_for_clients(hub, 1)
+
+        serving = asyncio.create_task(hub.run())
+        await upstream.halfway.wait()
+        while early.adapter.last_sequence < 15000:
+            await asyncio.sleep(0.001)
+
+        late = PitWallClient(HubAdapter(address))
+        late_timing = TimingTower(late)
+        late_task = asyncio.create_task(late.go())
+        await wait_for_clients(hub, 2)
+        # the catch-up is an init followed by the running order
+        async with asyncio.timeout(5):
+            while late.adapter.last_sequence < 2:
+                await asyncio.sleep(0.001)
+
+        # the grid order in the init alone would put these apart
+        assert [d.driver_number for d in late_timing.results] == [d.driver_number for d in early_timing.results]
+
+        upstream.resume.set()
+        await asyncio.wait_for(asyncio.gather(serving, early_task, late_task), 30)
+        assert [d.driver_number for d in late_timing.results] == [d.driver_number for d in early_timing.results]
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from pitwall import PitWallClient
+from pitwall.adapters.abstract import Update
+from pitwall.util import LagTracker
+
+SERVER_TIME = 1730555234869392500
+"2024-11-02T13:47:14.8693925Z"
+
+def heartbeat(lag: float) -> Update:
+    return Update("Heartbeat", {"Utc": "2024-11-02T13:47:14.8693925Z"}, SERVER_TIME + int(lag * 1000000000))
+
+class TestLagTracker:
+    def test_capture(self):
+        client = PitWallClient()
+        now = [0]
+        # every update finishes 100ms after it was received
+        client.on_update(lambda u: now.__setitem__(0, u.ts + 100000000))
+        tracker = LagTracker(client, clock=lambda: now[0])
+        alerts = list()
+        tracker.on_lag(alerts.append)
+
+        client.ingest("data/2024_brazil_sprint.txt")
+
+        assert 0 < tracker.upstream < 1
+        assert tracker.local["TimingData"] == pytest.approx(0.1)
+        assert tracker.local["Heartbeat"] == pytest.approx(0.1)
+        assert alerts == []
+
+    def test_alerts(self):
+        client = PitWallClient()
+        delay = [0]
+        now = [0]
+        client.on_update(lambda u: now.__setitem__(0, u.ts + int(delay[0] * 1000000000)))
+        tracker = LagTracker(client, upstream_threshold=5, local_threshold=1, clock=lambda: now[0])
+        alerts = list()
+        tracker.on_lag(alerts.append)
+
+        client.ingest([heartbeat(6), heartbeat(6)])
+        assert [(a.kind, a.topic, a.lagging) for a in alerts] == [("upstream", "Heartbeat", True)]
+        assert alerts[0].lag == pytest.approx(6)
+
+        client.ingest([heartbeat(0.5)])
+        assert [(a.kind, a.topic, a.lagging) for a in alerts[1:]] == [("upstream", "Heartbeat", False)]
+
+        delay[0] = 2.5
+        client.ingest([heartbeat(0.5), Update("TrackStatus", {"Status": "1", "Message": "AllClear"}, SERVER_TIME)])
+        assert [(a.kind, a.topic, a.lagging) for a in alerts[2:]] == [("local", "Heartbeat", True), ("local", "TrackStatus", True)]
+        assert alerts[2].lag == pytest.approx(2.5)
+        assert tracker.upstream == pytest.approx(0.5)
+
+    @pytest.mark.asyncio
+    async def test_update_callbacks_wait_for_coroutines(self):
+        client = PitWallClient()
+        order = list()
+
+        async def slow(heartbeat):
+            await asyncio.sleep(0.01)
+            order.append("heartbeat")
+
+        client.on_heartbeat(slow)
+        client.on_update(lambda u: order.append("update"))
+        await client._update(heartbeat(0))
+
+        assert order == ["heartbeat", "update"]
@@ -0,0 +1,81 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from pitwall import Metrics, PitWallClient
+from pitwall.adapters import CaptureAdapter
+from pitwall.adapters.abstract import PitWallAdapter, Update
+from pitwall.capture import read_capture
+from pitwall.util import TimingTower
+
+class DecodedAdapter(PitWallAdapter):
+    """Dispatches updates that are already decoded, as a websocket does"""
+
+    async def run(self) -> None:
+        for i in range(3):
+            await self._message(Update("SessionStatus", {"Status": "Started"}, i))
+
+class TestMetrics:
+    @pytest.mark.asyncio
+    async def test_instrumented_client(self):
+        client = PitWallClient(CaptureAdapter("data/2024_brazil_sprint.txt"))
+        TimingTower(client)
+        client.adapter.on_message(lambda _: None, buffer=100)
+        metrics = client.instrument(Metrics())
+        await client.go()
+
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+        assert metrics.messages == Counter(u.src for u in updates)
+        assert sum(metrics.bytes.values()) == sum(len(u.raw) for u in updates)
+        assert dict((src, h.count) for src, h in metrics.parse_seconds.items()) == metrics.messages
+        assert metrics.callback_seconds["TimingTower._on_timing_datum"].count > 0
+        assert metrics.callback_time == pytest.approx(sum(h.sum for h in metrics.callback_seconds.values()))
+
+        text = metrics.render()
+        assert 'pitwall_messages_total{topic="TimingData"} ' in text
+        assert f'pitwall_parse_seconds_count{{topic="TimingData"}} {metrics.messages["TimingData"]}' in text
+        assert 'pitwall_queue_depth{queue="CaptureAdapter.subscriber[0]"} 0\n' in text
+
+    @pytest.mark.asyncio
+    async def test_decoded_updates_are_not_encoded(self):
+        adapter = DecodedAdapter()
+        metrics = Metrics()
+        adapter.instrument(metrics)
+        await adapter.run()
+
+        # there were no bytes to measure, and encoding them would cost more than the dispatch being measured
+        assert metrics.messages == {"SessionStatus": 3}
+        assert metrics.bytes == {}
+        assert 'pitwall_messages_total{topic="SessionStatus"} 3\n' in metrics.render()
+
+    def test_uninstrumented_client(self):
+        client = PitWallClient()
+        TimingTower(client)
+        client.ingest("data/2024_brazil_sprint.txt")
+
+        # the measuring versions are only swapped in by instrument()
+        assert "_process" not in vars(client)
+        assert "_fire_callbacks" not in vars(client)
+
+    @pytest.mark.asyncio
+    async def test_serve(self):
+        metrics = Metrics()
+        metrics.count("TimingData", 100)
+        server = await metrics.serve(0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def get(path: str) -> bytes:
+            (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii"))
+            response = await reader.read()
+            writer.close()
+            return response
+
+        response = await get("/metrics")
+        assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+        assert b'pitwall_message_bytes_total{topic="TimingData"} 100\n' in response
+        assert (await get("/")).startswith(b"HTTP/1.1 404")
+
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+from typing import Callable, List
+
+import aio_pika
+import pytest
+from aio_pika.exceptions import DeliveryError
+from pamqp.commands import Basic
+
+from pitwall.adapters.abstract import Update
+from rabbit_writer import RabbitSink
+
+class FakeExchange:
+    """Confirms every message after `delay`, unless `fail` says otherwise by raising"""
+
+    def __init__(self, connected: asyncio.Event, fail: Callable[[int], None] = lambda i: None, delay: float = 0.01):
+        self.connected = connected
+        self.fail = fail
+        self.delay = delay
+        self.attempts = 0
+        self.outstanding = 0
+        self.most_outstanding = 0
+        self.published: List[str] = list()
+
+    async def publish(self, message: aio_pika.Message, routing_key: str, mandatory: bool):
+        attempt = self.attempts
+        self.attempts += 1
+        self.outstanding += 1
+        self.most_outstanding = max(self.most_outstanding, self.outstanding)
+        try:
+            await asyncio.sleep(self.delay)
+            self.fail(attempt)
+            self.published.append(message.body.decode("utf-8"))
+        finally:
+            self.outstanding -= 1
+
+class FakeConnection:
+    def __init__(self, exchange: FakeExchange):
+        self.connected = exchange.connected
+        self.exchange = exchange
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def channel(self, publisher_confirms: bool):
+        return self
+
+    async def declare_exchange(self, name: str, kind: aio_pika.ExchangeType) -> FakeExchange:
+        return self.exchange
+
+def updates(count: int) -> List[Update]:
+    return [Update("Heartbeat", None, i, str(i).encode("utf-8")) for i in range(count)]
+
+@contextlib.asynccontextmanager
+async def running(sink: RabbitSink, exchange: FakeExchange, monkeypatch):
+    async def connect_robust(url: str):
+        return FakeConnection(exchange)
+
+    monkeypatch.setattr(aio_pika, "connect_robust", connect_robust)
+    task = asyncio.create_task(sink.run())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+def connected() -> asyncio.Event:
+    event = asyncio.Event()
+    event.set()
+    return event
+
+@pytest.mark.asyncio
+class TestRabbitSink:
+    async def test_confirm_window(self, monkeypatch):
+        exchange = FakeExchange(connected())
+        sink = RabbitSink("amqp://", window=3)
+        async with running(sink, exchange, monkeypatch):
+            for update in updates(20):
+                sink.publish(update)
+            await sink.flush(5)
+
+        assert sorted(exchange.published, key=int) == [str(i) for i in range(20)]
+        assert exchange.most_outstanding == 3
+
+    async def test_retried_in_order_after_reconnect(self, monkeypatch):
+        def fail(attempt: int):
+            if attempt == 2:
+                exchange.connected.clear()
+                raise ConnectionError("connection reset")
+
+        exchange = FakeExchange(connected(), fail)
+        sink = RabbitSink("amqp://", window=1)
+        async with running(sink, exchange, monkeypatch):
+            for update in updates(6):
+                sink.publish(update)
+            while exchange.attempts < 3:
+                await asyncio.sleep(0.01)
+            # nothing more is sent until the connection is back
+            await asyncio.sleep(0.05)
+            assert exchange.attempts == 3
+            exchange.connected.set()
+            await sink.flush(5)
+
+        assert exchange.published == [str(i) for i in range(6)]
+        assert sink.dropped == 0
+
+    async def test_refused_messages_are_dropped(self, monkeypatch):
+        def fail(attempt: int):
+            if attempt == 1:
+                raise DeliveryError(None, Basic.Nack(1))
+
+        exchange = FakeExchange(connected(), fail)
+        sink = RabbitSink("amqp://", window=1)
+        async with running(sink, exchange, monkeypatch):
+            for update in updates(3):
+                sink.publish(update)
+            await sink.flush(5)
+
+        assert exchange.published == ["0", "2"]
+        assert sink.dropped == 1
+
+    async def test_flush_gives_up(self, monkeypatch):
+        exchange = FakeExchange(asyncio.Event())
+        sink = RabbitSink("amqp://")
+        async with running(sink, exchange, monkeypatch):
+            for update in updates(3):
+                sink.publish(update)
+            await asyncio.wait_for(sink.flush(0.1), 5)
+
+        assert exchange.published == []
+        assert sink.dropped == 3
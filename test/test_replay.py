@@ -0,0 +1,120 @@
+import asyncio
+import math
+import time
+from typing import List
+
+import orjson
+import pytest
+
+from pitwall import PitWallClient, SessionState
+from pitwall.adapters import CaptureAdapter
+from pitwall.adapters.abstract import PitWallAdapter, Update
+from pitwall.util import TimingTower
+from replay import BufferingAdapter, RealtimeReplayAdapter
+
+class TestBufferingAdapter:
+    @pytest.mark.asyncio
+    async def test_resume_from_keyframe(self):
+        adapter = BufferingAdapter(CaptureAdapter("data/2024_brazil_sprint.txt"), keyframe_interval=1000)
+        await adapter.run()
+
+        (to_replay, _) = await adapter.resume_from(15500)
+        assert len(to_replay) == 502
+        assert to_replay[0].src == "init"
+        assert to_replay[-1] is adapter._history[15499]
+
+        resumed = SessionState()
+        for update in to_replay:
+            resumed.apply(update)
+        replayed = SessionState()
+        for update in adapter._history[0:15500]:
+            replayed.apply(update)
+        assert orjson.dumps(resumed.topics) == orjson.dumps(replayed.topics)
+
+        # a client picking up from a keyframe gets the same running order as one that saw everything
+        for sequence in (5500, 10500, 15500, 20500):
+            (to_replay, _) = await adapter.resume_from(sequence)
+            resumed = PitWallClient()
+            resumed_timing = TimingTower(resumed)
+            resumed.ingest(to_replay)
+            replayed = PitWallClient()
+            replayed_timing = TimingTower(replayed)
+            replayed.ingest(adapter._history[0:sequence])
+            assert [d.driver_number for d in resumed_timing.results] == [d.driver_number for d in replayed_timing.results], sequence
+
+class ListAdapter(PitWallAdapter):
+    def __init__(self, updates: List[Update]):
+        super().__init__()
+        self.updates = updates
+
+    async def run(self) -> None:
+        for update in self.updates:
+            await self._message(update)
+
+def ticks(count: int, interval: float) -> List[Update]:
+    return [Update("Heartbeat", {"Utc": str(i)}, int(i * interval * 1000000000)) for i in range(count)]
+
+@pytest.mark.asyncio
+class TestRealtimeReplayAdapter:
+    async def test_timeline_does_not_drift(self):
+        # 2s of updates every 10ms at 20x should take 0.1s, however long each callback takes
+        adapter = RealtimeReplayAdapter(ListAdapter(ticks(201, 0.01)), 20)
+        released = list()
+        adapter.on_message(lambda u: released.append((u.ts, time.monotonic())))
+
+        start = time.monotonic()
+        await adapter.run()
+
+        assert [ts for ts, _ in released] == [u.ts for u in ticks(201, 0.01)]
+        assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+        # nothing is released before it's due
+        assert all(at - released[0][1] >= ts / 20 / 1000000000 - 0.001 for ts, at in released)
+
+    async def test_gaps_are_capped(self):
+        updates = [Update("Heartbeat", {}, 0), Update("Heartbeat", {}, 3600 * 1000000000), Update("Heartbeat", {}, 3601 * 1000000000)]
+        adapter = RealtimeReplayAdapter(ListAdapter(updates), 100, max_gap=1)
+        released = list()
+        adapter.on_message(released.append)
+
+        start = time.monotonic()
+        await adapter.run()
+
+        assert len(released) == 3
+        assert time.monotonic() - start == pytest.approx(0.02, abs=0.05)
+
+    async def test_speed_control(self):
+        adapter = RealtimeReplayAdapter(ListAdapter(ticks(101, 0.1)), 1)
+        released = list()
+
+        def on_message(update: Update):
+            released.append(update)
+            if len(released) == 1:
+                adapter.pause()
+                asyncio.get_running_loop().call_later(0.05, adapter.resume)
+            elif len(released) == 2:
+                adapter.set_speed(math.inf)
+
+        adapter.on_message(on_message)
+        start = time.monotonic()
+        await adapter.run()
+
+        assert len(released) == 101
+        # paused for 0.05s, then 0.1s for the second update at 1x, then the rest at once
+        assert time.monotonic() - start == pytest.approx(0.15, abs=0.05)
+
+    async def test_resume_while_playing(self):
+        adapter = RealtimeReplayAdapter(ListAdapter(ticks(11, 0.1)), 1)
+        released = list()
+
+        def on_message(update: Update):
+            released.append(update)
+            if len(released) == 6:
+                adapter.resume()
+
+        adapter.on_message(on_message)
+        start = time.monotonic()
+        await adapter.run()
+
+        assert len(released) == 11
+        # resuming something that isn't paused leaves playback where it was
+        assert time.monotonic() - start == pytest.approx(1.0, abs=0.05)
@@ -2,12 +2,13 @@ import pytest
 
 from pitwall import PitWallClient
 from pitwall.adapters import CaptureAdapter
+from pitwall.adapters.abstract import Update
 from pitwall.events import SessionConfig
 
-@pytest.mark.asyncio
 class TestSessionResults:
     session_config: SessionConfig | None = None
 
+    @pytest.mark.asyncio
     async def test_hungary_2025(self):
         client = PitWallClient(CaptureAdapter("data/2025_hungary_race.txt"))
         client.on_session_config(self.on_session_config)
@@ -21,4 +22,32 @@ class TestSessionResults:
         assert self.session_config.layout[3] == 6
     
     def on_session_config(self, config):
-        self.session_config = config
\ No newline at end of file
+        self.session_config = config
+
+    def test_unsubscribed_topics_are_skipped(self):
+        # neither of these could be parsed, so they'd raise if their handlers ran
+        malformed = [Update("TrackStatus", {}, 0), Update("SessionStatus", {}, 0)]
+
+        positions_only = list()
+        client = PitWallClient()
+        client.on_driver_position_update(positions_only.append)
+        client.ingest(malformed)
+        client.ingest("data/2024_brazil_sprint.txt")
+
+        statuses = list()
+        client = PitWallClient()
+        client.on_track_status(statuses.append)
+        with pytest.raises(KeyError):
+            client.ingest(malformed)
+
+        # and skipping them changes nothing for the topics that are handled
+        positions = list()
+        timing = list()
+        client = PitWallClient()
+        client.on_driver_position_update(positions.append)
+        client.on_timing_datum(timing.append)
+        client.ingest("data/2024_brazil_sprint.txt")
+
+        assert len(timing) > 0
+        assert len(positions_only) > 0
+        assert positions_only == positions
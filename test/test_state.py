@@ -0,0 +1,74 @@
+import orjson
+
+from pitwall import PitWallClient, SessionState
+from pitwall.adapters.abstract import Update
+from pitwall.capture import read_capture
+from pitwall.util import TimingTower
+
+class TestSessionState:
+    def test_merges_deltas(self):
+        state = SessionState()
+        state.apply(Update("init", {"TimingData": {"Lines": {"4": {"Position": "1", "Sectors": [{"Value": ""}, {"Value": ""}]}}},
+                                    "RaceControlMessages": {"Messages": [{"Message": "GREEN LIGHT"}]}}, 0))
+
+        delta = {"Lines": {"4": {"Sectors": {"1": {"Value": "31.2", "Segments": {"0": {"Status": 2049}}}},
+                                 "BestLapTime": {"Value": "", "_deleted": ["Lap"]}}}}
+        state.apply(Update("TimingData", delta, 1))
+        state.apply(Update("RaceControlMessages", {"Messages": {"1": {"Message": "CHEQUERED FLAG"}}}, 2))
+
+        assert state.get("TimingData", "Lines", 4, "Position") == "1"
+        assert state.get("TimingData", "Lines", "4", "Sectors", 1) == {"Value": "31.2", "Segments": {"0": {"Status": 2049}}}
+        assert state.get("TimingData", "Lines", "4", "BestLapTime") == {"Value": ""}
+        assert [m["Message"] for m in state["RaceControlMessages"]["Messages"]] == ["GREEN LIGHT", "CHEQUERED FLAG"]
+        assert state.get("TimingData", "Lines", "44", "Position") is None
+
+        # the state owns its copy, so later merges mustn't reach back into the delta
+        state.apply(Update("TimingData", {"Lines": {"4": {"Sectors": {"1": {"Segments": {"0": {"Status": 2051}}}}}}}, 3))
+        assert delta["Lines"]["4"]["Sectors"]["1"]["Segments"]["0"]["Status"] == 2049
+
+    def test_keyframes_and_deletions(self):
+        state = SessionState()
+        state.apply(Update("SessionData", {"Series": [{"Lap": 1}], "StatusSeries": []}, 0))
+        state.apply(Update("SessionData", {"Series": {"1": {"Lap": 2}}}, 1))
+        assert state.get("SessionData", "Series", 1, "Lap") == 2
+
+        state.apply(Update("SessionData", {"Series": [], "_kf": True}, 2))
+        assert state["SessionData"] == {"Series": []}
+
+        state.apply(Update("TimingAppData", {"Lines": {"4": {"Line": 1}, "81": {"Line": 2}}}, 3))
+        state.apply(Update("TimingAppData", {"Lines": {"_deleted": ["81"]}}, 4))
+        assert list(state["TimingAppData"]["Lines"].keys()) == ["4"]
+
+        assert SessionState.from_snapshot(state.snapshot()).topics == state.topics
+
+    def test_client_state_matches_final_classification(self):
+        client = PitWallClient()
+        state = client.track_state()
+        client.ingest("data/2024_brazil_sprint.txt")
+
+        lines = state["TimingData"]["Lines"]
+        by_position = sorted(lines.keys(), key=lambda x: int(lines[x]["Position"]))
+        assert [int(x) for x in by_position] == [4, 81, 1, 16, 55, 63, 10, 11, 30, 23, 44, 43, 31, 50, 22, 77, 24, 14, 18, 27]
+        assert state.get("SessionStatus", "Status") == "Finalised"
+
+        # and a fresh client can pick the session up from the snapshot alone
+        restored = PitWallClient()
+        restored.track_state()
+        restored.ingest([Update("init", None, 0, state.snapshot())])
+        assert orjson.dumps(restored.state.topics) == orjson.dumps(state.topics)
+
+    def test_catch_up_running_order(self):
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+        for split in (5000, 10000, 15000, 20000):
+            state = SessionState()
+            for update in updates[:split]:
+                state.apply(update)
+
+            # a client joining at split should see the same order as one that was there all along
+            joined = PitWallClient()
+            joined_timing = TimingTower(joined)
+            joined.ingest(state.catch_up(0))
+            full = PitWallClient()
+            full_timing = TimingTower(full)
+            full.ingest(updates[:split])
+            assert [d.driver_number for d in joined_timing.results] == [d.driver_number for d in full_timing.results], split
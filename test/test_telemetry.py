@@ -0,0 +1,87 @@
+import base64
+import zlib
+
+import numpy as np
+import orjson
+
+from pitwall import PitWallClient
+from pitwall.adapters.abstract import Update
+from pitwall.util import TelemetryStore
+
+def deflate(payload) -> str:
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return base64.b64encode(compressor.compress(orjson.dumps(payload)) + compressor.flush()).decode()
+
+class TestTelemetry:
+    def test_car_data(self):
+        payload = {"Entries": [{"Utc": "2025-08-31T13:00:00.1234567Z",
+                                "Cars": {"1": {"Channels": {"0": 11000, "2": 301, "3": 8, "4": 100, "5": 0, "45": 12}},
+                                         "81": {"Channels": {"0": 9000, "2": 120, "3": 3, "4": 0, "5": 100, "45": 1}}}},
+                               {"Utc": "2025-08-31T13:00:00.3934567Z",
+                                "Cars": {"1": {"Channels": {"0": 11100, "2": 303, "3": 8, "4": 100, "5": 0, "45": 12}}}}]}
+        batches = list()
+        client = PitWallClient()
+        client.on_car_data_batch(batches.append)
+        client.ingest([Update("CarData.z", deflate(payload), 0)])
+
+        assert len(batches) == 1
+        batch = batches[0]
+        assert len(batch) == 3
+        assert batch.driver_id.tolist() == [1, 81, 1]
+        assert batch.speed.tolist() == [301, 120, 303]
+        assert batch.rpm.tolist() == [11000, 9000, 11100]
+        assert batch.gear.tolist() == [8, 3, 8]
+        assert batch.brake.tolist() == [0, 100, 0]
+        assert batch.drs.tolist() == [12, 1, 12]
+        assert batch.timestamp[0] == batch.timestamp[1]
+        assert batch.timestamp[2] - batch.timestamp[0] == 270000000
+        assert batch.timestamp[0] == np.datetime64("2025-08-31T13:00:00.1234567", "ns").astype(np.int64)
+
+    def test_positions(self):
+        payload = {"Position": [{"Timestamp": "2025-08-31T13:00:00.5Z",
+                                 "Entries": {"4": {"Status": "OnTrack", "X": 1, "Y": -2, "Z": 3},
+                                             "16": {"Status": "OffTrack", "X": 4, "Y": 5, "Z": 6}}}]}
+        batches = list()
+        client = PitWallClient()
+        client.on_position_batch(batches.append)
+        client.ingest([Update("Position.z", deflate(payload), 0)])
+
+        batch = batches[0]
+        assert batch.driver_id.tolist() == [4, 16]
+        assert batch.x.tolist() == [1, 4]
+        assert batch.y.tolist() == [-2, 5]
+        assert batch.z.tolist() == [3, 6]
+        assert batch.on_track.tolist() == [True, False]
+
+    def test_not_decoded_without_subscribers(self):
+        client = PitWallClient()
+        client.on_driver_position_update(lambda _: None)
+        update = Update("CarData.z", None, 0, b'"not base64"')
+        client.ingest([update])
+        assert not update.decoded
+
+class TestTelemetryStore:
+    def test_windows_stay_bounded(self):
+        client = PitWallClient()
+        store = TelemetryStore(client, capacity=8)
+        start = np.datetime64("2025-08-31T13:00:00", "ns")
+        entries = [{"Utc": str(start + np.timedelta64(i * 250, "ms")) + "Z",
+                    "Cars": {"4": {"Channels": {"0": 10000 + i, "2": 200 + i, "3": 7, "4": 100, "5": 0, "45": 0}},
+                             "81": {"Channels": {"0": 9000, "2": 100, "3": 4, "4": 50, "5": 0, "45": 0}}}}
+                   for i in range(20)]
+        client.ingest([Update("CarData.z", deflate({"Entries": entries[:5]}), 0),
+                       Update("CarData.z", deflate({"Entries": entries[5:]}), 0)])
+
+        buffer = store.car_data[4]
+        assert len(buffer) == 8
+        assert buffer.count == 20
+
+        (times, speed) = store.window(4, "speed", seconds=1)
+        assert speed.tolist() == [215, 216, 217, 218, 219]
+        assert times[-1] - times[0] == 1000000000
+        assert np.shares_memory(speed, buffer._values)
+
+        (_, rpm) = store.window(4, "rpm")
+        assert rpm.tolist() == list(range(10012, 10020))
+        assert store.latest(81, "gear")[1] == 4
+        assert store.latest(44, "speed") is None
@@ -0,0 +1,39 @@
+import numpy as np
+
+from pitwall import PitWallClient
+from pitwall.adapters.abstract import Update
+from pitwall.events import TimingKind
+from pitwall.events.timing import PERSONAL_FASTEST, OVERALL_FASTEST
+
+class TestTimingBatch:
+    def test_one_array_per_update(self):
+        batches = list()
+        client = PitWallClient()
+        client.on_timing_batch(batches.append)
+        client.ingest([Update("TimingData", {"Lines": {
+            "4": {"Sectors": {"2": {"Value": "28.104", "PersonalFastest": True, "OverallFastest": True}},
+                  "LastLapTime": {"Value": "1:12.345", "PersonalFastest": True}, "NumberOfLaps": 17},
+            "81": {"Sectors": {"0": {"Segments": {"3": {"Status": 2049}, "4": {"Status": 2048}}}}},
+            "16": {"GapToLeader": "+3.2", "IntervalToPositionAhead": {"Value": "1L"}},
+            "1": {"Position": "2"}}}, 0)])
+
+        assert len(batches) == 1
+        batch = batches[0]
+        assert batch["driver_id"].tolist() == [4, 4, 81, 81, 16, 16]
+        assert batch["kind"].tolist() == [TimingKind.LAP, TimingKind.SECTOR, TimingKind.SEGMENT, TimingKind.SEGMENT,
+                                          TimingKind.LEADER, TimingKind.INTERVAL]
+        assert batch["status"][0] == 17
+        assert batch["time"][0] == 72.345
+        assert batch["flags"].tolist()[:2] == [PERSONAL_FASTEST, PERSONAL_FASTEST | OVERALL_FASTEST]
+        assert batch["sector"].tolist() == [0, 3, 1, 1, 0, 0]
+        assert batch["segment"].tolist() == [0, 0, 4, 5, 0, 0]
+        assert batch["status"][2:4].tolist() == [2049, 2048]
+        assert np.isnan(batch["time"][2])
+        assert batch["time"][4:].tolist() == [3.2, 999]
+
+    def test_position_only_updates_send_nothing(self):
+        batches = list()
+        client = PitWallClient()
+        client.on_timing_batch(batches.append)
+        client.ingest([Update("TimingData", {"Lines": {"1": {"Position": "2"}}}, 0)])
+        assert batches == []
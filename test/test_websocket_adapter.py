@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+from typing import Any, Dict, List, Tuple
+
+import orjson
+import pytest
+from aiohttp import WSMsgType, web
+from pysignalr.client import SignalRClient
+
+from pitwall import PitWallClient, SessionState
+from pitwall.adapters import WebsocketAdapter
+from pitwall.adapters.abstract import Update
+from pitwall.capture import read_capture
+from pitwall.util import TimingTower
+
+class FakeSignalRServer:
+    """
+    Just enough of a SignalR hub for pysignalr: answers each connection's Subscribe with the next
+    snapshot, streams the updates that go with it, then drops the connection unless it's the last one
+    """
+
+    def __init__(self, connections: List[Tuple[Dict[str, Any], List[Update]]]):
+        self.connections = connections
+        self.connected = 0
+        self._runner = None
+        self._sockets = list()
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/signalr/negotiate", self._negotiate)
+        app.router.add_get("/signalr", self._websocket)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        return f"ws://127.0.0.1:{self._runner.addresses[0][1]}/signalr"
+
+    async def stop(self) -> None:
+        # otherwise shutting down waits for the client to hang up
+        for ws in self._sockets:
+            await ws.close()
+        await self._runner.cleanup()
+
+    async def _negotiate(self, request: web.Request) -> web.Response:
+        return web.json_response({"connectionId": "test", "negotiateVersion": 0})
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.append(ws)
+        (snapshot, updates) = self.connections[self.connected]
+        self.connected += 1
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                break
+            for record in message.data.split("\x1e"):
+                if len(record) == 0:
+                    continue
+                request = orjson.loads(record)
+                if "protocol" in request:
+                    await ws.send_str("{}\x1e")
+                elif request.get("target") == "Subscribe":
+                    await ws.send_str(_record({"type": 3, "invocationId": request["invocationId"], "result": snapshot}))
+                    for update in updates:
+                        await ws.send_str(_record({"type": 1, "target": "feed", "arguments": [update.src, update.data, ""]}))
+                    if self.connected < len(self.connections):
+                        await ws.close()
+        return ws
+
+def _record(message: Dict[str, Any]) -> str:
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode("utf-8") + "\x1e"
+
+def state_after(updates: List[Update]) -> SessionState:
+    state = SessionState()
+    for update in updates:
+        state.apply(update)
+    # a copy as it would come off the wire, sharing nothing with the updates
+    return SessionState.from_snapshot(state.snapshot())
+
+class TestWebsocketAdapter:
+    @pytest.mark.asyncio
+    async def test_reconnect(self):
+        updates = list(read_capture("data/2024_brazil_sprint.txt"))
+        # the connection drops after update 6000, and is back by 9000
+        server = FakeSignalRServer([(state_after(updates[:5000]).topics, updates[5000:6000]),
+                                    (state_after(updates[:9000]).topics, updates[9000:10000] + [Update("Finished", {}, 0)])])
+        url = await server.start()
+
+        adapter = WebsocketAdapter(SignalRClient(url))
+        received = list()
+        adapter.on_message(lambda u: received.append(u))
+        client = PitWallClient(adapter)
+        timing = TimingTower(client)
+        task = asyncio.create_task(client.go())
+
+        try:
+            async with asyncio.timeout(30):
+                while len(received) == 0 or received[-1].src != "Finished":
+                    await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            await server.stop()
+
+        assert server.connected == 2
+        received = received[:-1]
+        assert received[0].src == "init"
+        resync = received[1001:-1000]
+        assert 0 < len(resync) < len(received[0].data) - 1
+        assert "SessionInfo" not in [u.src for u in resync]
+        assert "Heartbeat" not in [u.src for u in resync]
+
+        # everyone downstream ends up with the same state as if nothing had been missed
+        expected = state_after(updates[:10000]).topics
+        mirrored = state_after(received).topics
+        assert mirrored.keys() == expected.keys()
+        for topic in expected:
+            if topic != "Heartbeat":
+                assert mirrored[topic] == expected[topic], topic
+        assert adapter.state.topics["TimingData"] == expected["TimingData"]
+
+        # and the running order is the same as for a connection that never dropped
+        ingested = PitWallClient()
+        ingested_timing = TimingTower(ingested)
+        ingested.ingest([state_after(updates[:5000]).to_update(0)] + updates[5000:10000])
+        assert [line.driver_number for line in timing.results] == [line.driver_number for line in ingested_timing.results]
@@ -13,11 +13,14 @@ from colorist import Color
 from pysignalr.client import SignalRClient
 
 from pitwall import PitWallClient
-from pitwall.adapters import CaptureAdapter
+from pitwall.adapters import CaptureAdapter, HubAdapter
+from pitwall.adapters.abstract import EOS
 from pitwall.adapters.websocketadapter import WebsocketAdapter
 from pitwall.events import SessionChange, Driver, SessionProgress, RaceControlMessage, TimingDatum, DriverStatusUpdate, \
                            SectorTimingDatum, SegmentTimingDatum, StintChange, QualifyingSessionProgress, \
                            LapTimingDatum, SessionStatus, SessionConfig
+from pitwall.hub import is_hub_address
+from pitwall.metrics import Metrics
 from pitwall.util import TimingTower
 
 logging.basicConfig(
@@ -44,8 +47,8 @@ lap = 1
 track_layout = {1: 0, 2: 0, 3: 0}
 timing_tower: TimingTower
 
-class Cancel(Exception):
-    ...
+class Cancel(EOS):
+    """Ends the stream early, raised from a callback"""
 
 def driver_filter(func):
     def wrapper(obj):
@@ -61,6 +64,8 @@ def main():
     # TODO: guess what
     if str.startswith(args.input, "ws://") or str.startswith(args.input, "wss://"):
         adapter = WebsocketAdapter(SignalRClient(args.input))
+    elif is_hub_address(args.input):
+        adapter = HubAdapter(args.input)
     else:
         if args.input != "-":
             for i in range(20):
@@ -72,7 +77,7 @@ def main():
             if not os.path.exists(args.input):
                 print(f"{args.input} didn't exist within 20 seconds")
                 sys.exit(255)
-        adapter = CaptureAdapter(args.input)
+        adapter = CaptureAdapter(args.input, args.start, args.save_index)
     
     client = PitWallClient(adapter)
     configure_client(client)
@@ -80,7 +85,7 @@ def main():
     timing_tower = TimingTower(client)
 
     try:
-        asyncio.run(client.go())
+        asyncio.run(run(client))
     except Cancel:
         ...
         
@@ -89,6 +94,11 @@ def main():
     for driver in sorted(timing_tower.drivers.values(), key=lambda d: d.position):
         print(f"{driver.position}: {drivers[driver.driver_number]}")
 
+async def run(client: PitWallClient):
+    if args.metrics_port is not None:
+        await client.instrument(Metrics()).serve(args.metrics_port)
+    await client.go()
+
 def configure_client(client: PitWallClient):
     client.on_session_change(on_session_change)
     client.on_session_progress(on_session_progress)
@@ -137,8 +147,8 @@ def on_race_control_update(updates: List[RaceControlMessage]) -> None:
     #     raise Cancel()
 
 def init_drivers(data: List[Driver]):
-    # don't wipe out the existing data if the websocket reconnects
-    # mid-session and re-fires the initial subscription data
+    # only the first driver list is complete; later ones (like a resync
+    # after the websocket reconnects) just carry what changed
     if len(drivers) > 0:
         return
     
@@ -222,9 +232,11 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input", default="-")
-    parser.add_argument("-f", "--from", default=0)
+    parser.add_argument("-f", "--from", dest="start", help="lap number, ISO-8601 time or session status to start from")
+    parser.add_argument("--save-index", action="store_true", help="cache the index used by --from next to the capture")
     parser.add_argument("-t", "--to", default=0, type=int)
     parser.add_argument("-d", "--driver", type=int)
+    parser.add_argument("-m", "--metrics-port", type=int, help="serve Prometheus metrics on this local port")
     args = parser.parse_args()
 
     try: